@@ -1,19 +1,26 @@
+from contextlib import aclosing
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import json
 import logging
-from services.embedding_service import EmbeddingService
-from services.pinecone_service import PineconeService
-from openai import OpenAI
+import time
+from services.chat_cache import ChatResponseCache
+from services.container import get_services
+from services.vector_store import VectorMatch
 from config.main import config
-from constants.prompts import GENERAL_PROMPT, CONTEXT_PROMPT
+from utils.metrics import LLM_TOKENS, STAGE_SECONDS
+from utils.tokens import count_tokens
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-embedding_service = EmbeddingService()
-pinecone_service = PineconeService()
-openai_client = OpenAI(api_key=config.OPENAI_API_KEY)
+services = get_services()
+
+CHAT_MODEL = "gpt-4o-mini-2024-07-18"
+ERROR_RESPONSE = "I encountered an error while processing your request. Please try again or rephrase your question."
 
 class ChatMessage(BaseModel):
     role: str
@@ -23,91 +30,192 @@ class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     max_tokens: int = 1000
     temperature: float = 0.7
+    # Optional retrieval filters
+    pdf_name: Optional[str] = None
+    section: Optional[str] = None
+    page: Optional[int] = None
 
 class ChatResponse(BaseModel):
     response: str
 
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+    max_tokens: int = 1000
+    temperature: float = 0.7
+    # Optional retrieval filters, applied to every question
+    pdf_name: Optional[str] = None
+    section: Optional[str] = None
+    page: Optional[int] = None
+
+def request_filter(request) -> Dict[str, Any]:
+    """Retrieval filters set on a chat or batch request"""
+    return {
+        key: value
+        for key, value in (("pdf_name", request.pdf_name), ("section", request.section), ("page", request.page))
+        if value is not None
+    }
+
+def relevant_candidates(matches: List[VectorMatch]) -> List[VectorMatch]:
+    """Convert score from [-1,1] to [0,1] range and keep relevant candidates"""
+    return [match for match in matches if (1 + match.score) / 2 >= 0.5]
+
+async def attach_chunk_text(matches: List[VectorMatch]):
+    """
+    Vectors carry only IDs and small fields; look the chunk text up in one batch.
+    Vectors written before the chunk store keep their text in metadata
+    """
+    chunk_store = await services.get("chunk_store")
+    texts = await asyncio.to_thread(chunk_store.get_many, list(dict.fromkeys(match.id for match in matches)))
+    for match in matches:
+        if match.id in texts:
+            match.metadata["text"] = texts[match.id]
+
+async def assemble_prompt(user_query: str, conversation: List[Dict[str, str]],
+                          candidates: List[VectorMatch], pipeline: str = "chat") -> Dict:
+    """
+    Rerank candidates into the context token budget and build the completion messages
+    Returns:
+        Dict: "messages", "sources" and "prompt_stats" of the completion
+    """
+    reranker = await services.get("reranker")
+    prompt_builder = await services.get("prompt_builder")
+    with STAGE_SECONDS.time(pipeline, "rerank"):
+        selected = reranker.rerank(
+            user_query, candidates, token_budget=prompt_builder.available_context_tokens(conversation)
+        )
+
+    # Format context from relevant chunks
+    context_chunks = []
+    sources = []
+    for match in selected:
+        # Vectors stored before layout-aware extraction have no page or section
+        location = {key: match.metadata[key] for key in ("page", "page_end", "section") if key in match.metadata}
+        context_chunks.append({
+            "text": match.metadata.get("text", ""),
+            "pdf_name": match.metadata.get("pdf_name", ""),
+            "chunk_index": match.metadata.get("chunk_index", 0),
+            **location
+        })
+        sources.append({
+            "pdf_name": match.metadata.get("pdf_name", ""),
+            "chunk_index": match.metadata.get("chunk_index", 0),
+            **location,
+            "relevance_score": match.score
+        })
+    if context_chunks:
+        logger.info("Using PDF context for response")
+    else:
+        logger.info("No relevant context found, using general conversation mode")
+
+    # Fit context and conversation history into the prompt token budget
+    with STAGE_SECONDS.time(pipeline, "prompt"):
+        prompt = await prompt_builder.build(conversation, context_chunks)
+
+    return {"messages": prompt.messages, "sources": sources, "prompt_stats": prompt.stats}
+
+async def prepare_chat(request: ChatRequest) -> Dict:
+    """
+    Retrieve context for the latest user message and build the completion messages
+    Args:
+        request (ChatRequest): Incoming chat request
+    Returns:
+        Dict: "cached" holds a cached answer entry if one matched; otherwise
+        "messages", "sources", "query_embedding" and "prompt_stats" describe the completion
+        to run, "cacheable" tells whether its answer may be cached and "cache_context"
+        identifies the earlier turns, generation parameters and corpus version it depends on
+    """
+    # Get the user's latest message
+    user_query = request.messages[-1].content
+    logger.info(f"Processing chat query: {user_query}")
+    conversation = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+
+    # Answers are cached per question, so filtered questions bypass the cache
+    search_filter = request_filter(request)
+    cacheable = config.CHAT_CACHE_ENABLED and not search_filter
+    cache_context = None
+
+    # Reuse the answer to a repeated question
+    if cacheable:
+        chat_cache = await services.get("chat_cache")
+        cache_context = chat_cache.context_key(conversation[:-1], request.max_tokens, request.temperature)
+        cached = chat_cache.get_exact(user_query, cache_context)
+        if cached:
+            logger.info("Returning cached answer (exact match)")
+            return {"cached": cached}
+
+    # Search relevant chunks from PDFs
+    with STAGE_SECONDS.time("chat", "embed"):
+        query_embedding = await (await services.get("embedding_service")).create_embedding(user_query)
+    logger.info("Created query embedding")
+
+    # Reuse the answer to a near-identical question
+    if cacheable:
+        cached = chat_cache.get_semantic(query_embedding, cache_context)
+        if cached:
+            logger.info("Returning cached answer (semantic match)")
+            return {"cached": cached}
+
+    # Over-fetch candidates, then rerank them into the context token budget
+    hybrid_search = await services.get("hybrid_search")
+    with STAGE_SECONDS.time("chat", "retrieve"):
+        matches = await hybrid_search.search(
+            query=user_query,
+            query_embedding=query_embedding,
+            top_k=config.RERANK_CANDIDATES,
+            filter=search_filter or None,
+            include_values=True
+        )
+        logger.info(f"Found {len(matches)} candidate chunks")
+        candidates = relevant_candidates(matches)
+        await attach_chunk_text(candidates)
+
+    return {
+        "cached": None,
+        "user_query": user_query,
+        "query_embedding": query_embedding,
+        "cacheable": cacheable,
+        "cache_context": cache_context,
+        **await assemble_prompt(user_query, conversation, candidates)
+    }
+
 @router.post("/chat-completions")
 async def chat_with_pdfs(request: ChatRequest) -> ChatResponse:
     """
     Chat endpoint that uses PDF knowledge base for context-aware responses
     """
     try:
-        # Get the user's latest message
-        user_query = request.messages[-1].content
-        logger.info(f"Processing chat query: {user_query}")
-
         try:
-            # Search relevant chunks from PDFs
-            query_embedding = await embedding_service.create_embedding(user_query)
-            logger.info("Created query embedding")
-            search_results = pinecone_service.index.query(
-                vector=query_embedding,
-                top_k=4,
-                include_metadata=True,
-            )
-            logger.info(f"Found {len(search_results.matches)} relevant chunks")
-            print(search_results.matches)
-            # Format context from relevant chunks
-            context_chunks = []
-            sources = []
-            for match in search_results.matches:
-                normalized_score = (1 + match.score) / 2
-                logger.info(f"Raw score: {match.score}")
-                # Convert score from [-1,1] to [0,1] range
-                normalized_score = (1 + match.score) / 2
-                logger.info(f"Normalized score: {normalized_score}")
-                if normalized_score >= 0.5:
-                    context_chunks.append(match.metadata.get("text", ""))
-                    sources.append({
-                        "pdf_name": match.metadata.get("pdf_name", ""),
-                        "chunk_index": match.metadata.get("chunk_index", 0),
-                        "relevance_score": match.score
-                    })
-
-            messages = []
-            
-            if context_chunks:
-                # If relevant chunks found, use them as context
-                context_text = "\n\n".join(context_chunks)
-                system_prompt = CONTEXT_PROMPT.format(context=context_text)
-                messages.append({"role": "system", "content": system_prompt})
-                logger.info("Using PDF context for response")
-                used_context = True
-            else:
-                # If no relevant chunks found, use a general conversation prompt
-                messages.append({
-                    "role": "system",
-                    "content": GENERAL_PROMPT
-                })
-                logger.info("No relevant context found, using general conversation mode")
-                used_context = False
-
-            # Add conversation history (last 5 messages)
-            history_messages = request.messages[-5:]
-            for msg in history_messages:
-                messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
+            start = time.perf_counter()
+            chat = await prepare_chat(request)
+            if chat["cached"]:
+                STAGE_SECONDS.observe(time.perf_counter() - start, "chat", "total")
+                return ChatResponse(response=chat["cached"]["answer"])
 
             logger.info("Sending request to OpenAI")
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini-2024-07-18",
-                messages=messages,
-                max_tokens=request.max_tokens,
-                temperature=request.temperature
-            )
+            openai_client = await services.get("openai_client")
+            with STAGE_SECONDS.time("chat", "llm"):
+                response = await openai_client.create_chat_completion(
+                    model=CHAT_MODEL,
+                    messages=chat["messages"],
+                    max_tokens=request.max_tokens,
+                    temperature=request.temperature
+                )
+
+            answer = response.choices[0].message.content
+            record_tokens(chat["prompt_stats"]["prompt_tokens"], answer, getattr(response, "usage", None))
+            if chat["cacheable"]:
+                (await services.get("chat_cache")).put(chat["user_query"], chat["cache_context"],
+                                                       chat["query_embedding"], answer, chat["sources"])
+            STAGE_SECONDS.observe(time.perf_counter() - start, "chat", "total")
 
             return ChatResponse(
-                response=response.choices[0].message.content
+                response=answer
             )
 
         except Exception as e:
             logger.error(f"Error during chat processing: {str(e)}")
             return ChatResponse(
-                response="I encountered an error while processing your request. Please try again or rephrase your question.",
-                sources=[]
+                response=ERROR_RESPONSE
             )
 
     except Exception as e:
@@ -116,3 +224,228 @@ async def chat_with_pdfs(request: ChatRequest) -> ChatResponse:
             status_code=500,
             detail=f"Error processing chat request: {str(e)}"
         )
+
+def record_tokens(prompt_tokens: int, answer: str, usage=None):
+    """Count the chat model's input and output tokens, preferring the usage the API reports"""
+    if usage and usage.prompt_tokens:
+        prompt_tokens = usage.prompt_tokens
+    completion_tokens = usage.completion_tokens if usage and usage.completion_tokens else count_tokens(answer)
+    LLM_TOKENS.inc("in", amount=prompt_tokens)
+    LLM_TOKENS.inc("out", amount=completion_tokens)
+
+def sse_event(event: str, data) -> str:
+    """Format a server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat-completions/stream")
+async def stream_chat_with_pdfs(request: ChatRequest) -> StreamingResponse:
+    """
+    Streaming variant of the chat endpoint. Emits server-sent events: "sources"
+    as soon as retrieval finishes, "token" for each piece of the answer as the
+    model produces it, then "done" (or "error"). The upstream completion is
+    cancelled if the client disconnects
+    """
+    async def event_stream() -> AsyncIterator[str]:
+        start = time.perf_counter()
+        first_token_at: Optional[float] = None
+        try:
+            chat = await prepare_chat(request)
+            if chat["cached"]:
+                STAGE_SECONDS.observe(time.perf_counter() - start, "chat", "total")
+                yield sse_event("sources", chat["cached"]["sources"])
+                yield sse_event("token", {"content": chat["cached"]["answer"]})
+                yield sse_event("done", {"cached": True})
+                return
+
+            yield sse_event("sources", chat["sources"])
+
+            logger.info("Streaming request to OpenAI")
+            openai_client = await services.get("openai_client")
+            llm_start = time.perf_counter()
+            answer_parts = []
+            # Starlette cancels this generator when the client disconnects;
+            # aclosing then closes the upstream stream so OpenAI stops generating
+            async with aclosing(openai_client.stream_chat_completion(
+                model=CHAT_MODEL,
+                messages=chat["messages"],
+                max_tokens=request.max_tokens,
+                temperature=request.temperature
+            )) as tokens:
+                async for content in tokens:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        STAGE_SECONDS.observe(first_token_at - llm_start, "chat", "llm_first_token")
+                        logger.info(f"Time to first token: {(first_token_at - start) * 1000:.1f}ms")
+                    answer_parts.append(content)
+                    yield sse_event("token", {"content": content})
+
+            answer = "".join(answer_parts)
+            STAGE_SECONDS.observe(time.perf_counter() - llm_start, "chat", "llm")
+            record_tokens(chat["prompt_stats"]["prompt_tokens"], answer)
+            if chat["cacheable"]:
+                (await services.get("chat_cache")).put(chat["user_query"], chat["cache_context"],
+                                                       chat["query_embedding"], answer, chat["sources"])
+            STAGE_SECONDS.observe(time.perf_counter() - start, "chat", "total")
+            logger.info(f"Streamed answer in {(time.perf_counter() - start) * 1000:.1f}ms")
+            yield sse_event("done", {"cached": False, "prompt": chat["prompt_stats"]})
+
+        except Exception as e:
+            logger.error(f"Error during streaming chat processing: {str(e)}")
+            yield sse_event("error", {"message": ERROR_RESPONSE})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def iter_batch_answers(request: BatchChatRequest) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Answer a batch of questions, yielding a ("result", ...) or ("error", ...)
+    event per question as soon as it is ready. Repeated questions are answered
+    once and served from the chat cache where possible; the rest are embedded in one batched call and retrieved together, and
+    their completions run concurrently, at most CHAT_BATCH_CONCURRENCY at a time
+    and within the OpenAI client's concurrency and rate limits
+    """
+    search_filter = request_filter(request)
+    cacheable = config.CHAT_CACHE_ENABLED and not search_filter
+    # Questions that differ only in case or whitespace are answered once
+    positions: Dict[str, List[int]] = {}
+    for index, question in enumerate(request.questions):
+        positions.setdefault(ChatResponseCache.normalize_query(question), []).append(index)
+    representative = {key: request.questions[indices[0]] for key, indices in positions.items()}
+
+    def events(question: str, event: str, data: Dict) -> List[Tuple[str, Dict]]:
+        return [
+            (event, {"index": index, "question": request.questions[index], **data})
+            for index in positions[ChatResponseCache.normalize_query(question)]
+        ]
+
+    def cached_result(entry: Dict) -> Dict:
+        return {"answer": entry["answer"], "sources": entry["sources"], "cached": True}
+
+    pending = list(representative.values())
+    chat_cache = await services.get("chat_cache") if cacheable else None
+    if cacheable:
+        # Each question is a single-turn conversation with the batch's generation parameters
+        cache_context = chat_cache.context_key([], request.max_tokens, request.temperature)
+        remaining = []
+        for question in pending:
+            cached = chat_cache.get_exact(question, cache_context)
+            if cached:
+                for event in events(question, "result", cached_result(cached)):
+                    yield event
+            else:
+                remaining.append(question)
+        pending = remaining
+    if not pending:
+        return
+
+    with STAGE_SECONDS.time("batch", "embed"):
+        embeddings = await (await services.get("embedding_service")).create_embeddings(pending)
+    if cacheable:
+        remaining = []
+        for question, query_embedding in zip(pending, embeddings):
+            cached = chat_cache.get_semantic(query_embedding, cache_context)
+            if cached:
+                for event in events(question, "result", cached_result(cached)):
+                    yield event
+            else:
+                remaining.append(question)
+        if len(remaining) < len(pending):
+            embeddings = embeddings[[pending.index(question) for question in remaining]]
+            pending = remaining
+    if not pending:
+        return
+
+    # Chunks that several questions retrieved are looked up once
+    hybrid_search = await services.get("hybrid_search")
+    with STAGE_SECONDS.time("batch", "retrieve"):
+        matches = await hybrid_search.search_many(
+            pending, embeddings, top_k=config.RERANK_CANDIDATES, filter=search_filter or None, include_values=True
+        )
+        candidates = [relevant_candidates(question_matches) for question_matches in matches]
+        await attach_chunk_text([match for question_candidates in candidates for match in question_candidates])
+    logger.info(f"Retrieved context for {len(pending)} batch questions")
+
+    semaphore = asyncio.Semaphore(config.CHAT_BATCH_CONCURRENCY)
+    openai_client = await services.get("openai_client")
+
+    async def answer(question: str, query_embedding, question_candidates: List[VectorMatch]):
+        try:
+            async with semaphore:
+                conversation = [{"role": "user", "content": question}]
+                chat = await assemble_prompt(question, conversation, question_candidates, pipeline="batch")
+                with STAGE_SECONDS.time("batch", "llm"):
+                    response = await openai_client.create_chat_completion(
+                        model=CHAT_MODEL,
+                        messages=chat["messages"],
+                        max_tokens=request.max_tokens,
+                        temperature=request.temperature
+                    )
+            answer = response.choices[0].message.content
+            record_tokens(chat["prompt_stats"]["prompt_tokens"], answer, getattr(response, "usage", None))
+            if cacheable:
+                chat_cache.put(question, cache_context, query_embedding.copy(), answer, chat["sources"])
+            return question, {"answer": answer, "sources": chat["sources"], "cached": False}
+        except Exception as e:
+            logger.error(f"Error answering batch question: {str(e)}")
+            return question, None
+
+    tasks = [
+        asyncio.create_task(answer(question, query_embedding, question_candidates))
+        for question, query_embedding, question_candidates in zip(pending, embeddings, candidates)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            question, result = await next_done
+            if result is None:
+                for event in events(question, "error", {"message": ERROR_RESPONSE}):
+                    yield event
+            else:
+                for event in events(question, "result", result):
+                    yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@router.post("/chat-completions/batch")
+async def batch_chat_with_pdfs(request: BatchChatRequest) -> StreamingResponse:
+    """
+    Answer many questions about the same documents in one request. Emits
+    server-sent events: "result" with the answer and sources of each question,
+    tagged with its index, as soon as it is ready, "error" for a question that
+    could not be answered, then "done". Pending completions are cancelled if
+    the client disconnects
+    """
+    if not 1 <= len(request.questions) <= config.CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch must have between 1 and {config.CHAT_BATCH_MAX_QUESTIONS} questions"
+        )
+
+    async def event_stream() -> AsyncIterator[str]:
+        start = time.perf_counter()
+        answered = failed = 0
+        try:
+            async with aclosing(iter_batch_answers(request)) as events:
+                async for event, data in events:
+                    if event == "result":
+                        answered += 1
+                    else:
+                        failed += 1
+                    yield sse_event(event, data)
+        except Exception as e:
+            logger.error(f"Error during batch chat processing: {str(e)}")
+            yield sse_event("error", {"message": ERROR_RESPONSE})
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - start, "batch", "total")
+        logger.info(f"Answered {answered} of {len(request.questions)} batch questions "
+                    f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+        yield sse_event("done", {"questions": len(request.questions), "answered": answered, "failed": failed})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,29 @@
+"""
+This file contains the liveness and readiness endpoints
+"""
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from services.container import get_services
+
+router = APIRouter()
+
+@router.get("/live")
+async def liveness():
+    """
+    The process is up and serving requests
+    """
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness():
+    """
+    Whether the services chat and uploads depend on are available. Services
+    that have not been built yet are built here; responds 503 until all are up
+    """
+    components = await get_services().readiness()
+    ready = all(status == "ok" for status in components.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "components": components}
+    )
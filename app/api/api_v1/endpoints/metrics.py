@@ -0,0 +1,21 @@
+"""
+This file contains the Prometheus metrics endpoint
+"""
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import REGISTRY
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Stage latency histograms, request latencies, token counts, queue depths and
+    cache hit counts in the Prometheus text exposition format
+    """
+    # Callback metrics such as the queue depths query SQLite
+    text = await asyncio.to_thread(REGISTRY.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
@@ -1,61 +1,216 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Request
-from typing import List
+from fastapi.responses import JSONResponse
+from typing import List, Tuple
 from pathlib import Path
-from services.pdf_extracter import PDFExtractorService
-from services.text_processor import TextProcessorService
+from config.main import config
+from services.container import get_services
+from utils.metrics import REGISTRY, STAGE_SECONDS, CallbackMetric
+import asyncio
+import hashlib
 import logging
+import os
+import tempfile
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-pdf_service = PDFExtractorService()
-text_processor = TextProcessorService()
+services = get_services()
 
 # Configure upload directory
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Bytes of upload requests currently being received or saved, across all requests
+_bytes_in_flight = 0
+REGISTRY.register(CallbackMetric(
+    "pdfchat_upload_bytes_in_flight", "Bytes of upload requests currently being received or saved", "gauge", (),
+    lambda: {(): _bytes_in_flight}
+))
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that enforces the upload size limits while a request body
+    arrives, before the multipart form is parsed and spooled: 413 once a POST
+    under path_prefix declares or sends more than MAX_UPLOAD_REQUEST_BYTES, and
+    503 when the uploads in progress would exceed MAX_UPLOAD_GLOBAL_BYTES
+    """
+
+    def __init__(self, app, path_prefix: str = "/upload"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        global _bytes_in_flight
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        counted = int(declared) if declared.isdigit() else 0
+        if counted > config.MAX_UPLOAD_REQUEST_BYTES:
+            await self._reject(scope, receive, send, 413, f"Upload exceeds {config.MAX_UPLOAD_REQUEST_BYTES} bytes")
+            return
+        if _bytes_in_flight + counted > config.MAX_UPLOAD_GLOBAL_BYTES:
+            await self._reject(scope, receive, send, 503, "Too many uploads in progress, please retry shortly")
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            global _bytes_in_flight
+            nonlocal received, counted, rejected
+            message = await receive()
+            if message["type"] != "http.request" or rejected:
+                return message
+            received += len(message.get("body", b""))
+            # Bodies without a Content-Length are counted as they arrive
+            if received > counted:
+                _bytes_in_flight += received - counted
+                counted = received
+            if received > config.MAX_UPLOAD_REQUEST_BYTES:
+                rejected = True
+                await self._reject(scope, receive, send, 413, f"Upload exceeds {config.MAX_UPLOAD_REQUEST_BYTES} bytes")
+                # The application stops reading the body as if the client had gone away
+                return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            # Once rejected, the application's own error response is dropped
+            if not rejected:
+                await send(message)
+
+        _bytes_in_flight += counted
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        finally:
+            _bytes_in_flight -= counted
+
+    @staticmethod
+    async def _reject(scope, receive, send, status_code: int, detail: str):
+        logger.warning(f"Rejected upload with {status_code}: {detail}")
+        await JSONResponse(status_code=status_code, content={"detail": detail})(scope, receive, send)
+
+async def save_upload(file: UploadFile, file_path: Path) -> Tuple[Path, str]:
+    """
+    Copy an upload to disk in UPLOAD_CHUNK_SIZE pieces, hashing it on the way,
+    so memory use does not depend on the file size. The file is written under
+    a unique temporary name next to file_path, for the caller to rename into
+    place; copying stops with 413 once it exceeds MAX_UPLOAD_FILE_BYTES, and a
+    failed or cancelled copy removes the temporary file
+    Returns:
+        Tuple[Path, str]: The temporary file and the SHA-256 of its content
+    """
+    digest = hashlib.sha256()
+    fd, tmp_name = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".part")
+    tmp_path = Path(tmp_name)
+    # mkstemp creates files readable only by their owner
+    os.fchmod(fd, 0o644)
+    size = 0
+    try:
+        with STAGE_SECONDS.time("upload", "save"), os.fdopen(fd, "wb") as buffer:
+            while chunk := await file.read(config.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > config.MAX_UPLOAD_FILE_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File {file.filename} exceeds {config.MAX_UPLOAD_FILE_BYTES} bytes"
+                    )
+                digest.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path, digest.hexdigest()
+
+async def save_uploads(files: List[UploadFile], file_paths: List[Path]) -> List[Tuple[Path, str]]:
+    """
+    Save uploads to temporary files concurrently. If one fails, the others are
+    cancelled and every temporary file is removed, so a failed request leaves
+    nothing on disk
+    """
+    tasks = [asyncio.create_task(save_upload(file, file_path)) for file, file_path in zip(files, file_paths)]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for task in tasks:
+            if not task.cancelled() and task.exception() is None:
+                task.result()[0].unlink(missing_ok=True)
+        raise
+
 @router.post("/")
 async def upload_files(files: List[UploadFile] = File(...)):
     """
-    Endpoint to handle PDF file uploads and text extraction
+    Endpoint to handle PDF file uploads and text extraction. Request and global
+    size limits are enforced by UploadLimitMiddleware as the body arrives
     """
     try:
-        processed_files = []
-        
+        names = set()
         for file in files:
             if not file.filename.lower().endswith('.pdf'):
                 raise HTTPException(
                     status_code=400,
                     detail=f"File {file.filename} is not a PDF"
                 )
-            
-            # Create safe filename
-            file_path = UPLOAD_DIR / file.filename
-            print(file_path)
-            
-            # Save file
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            
-            # Process PDF and extract text, and create chunks
-            result = await pdf_service.process_pdf(file_path)
-            processed_files.append(result)
+            if file.size is not None and file.size > config.MAX_UPLOAD_FILE_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File {file.filename} exceeds {config.MAX_UPLOAD_FILE_BYTES} bytes"
+                )
+            # Files are saved under their name, so two with the same name would overwrite each other
+            name = Path(file.filename).name
+            if name in names:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File {name} appears more than once in the upload"
+                )
+            names.add(name)
+
+        # Every file is saved before any is renamed into place or queued, so a
+        # request that fails leaves nothing on disk or in the queue
+        pdf_service = await services.get("pdf_service")
+        file_paths = [UPLOAD_DIR / Path(file.filename).name for file in files]
+        saved = await save_uploads(files, file_paths)
+        for file, file_path, (tmp_path, _) in zip(files, file_paths, saved):
+            os.replace(tmp_path, file_path)
+            logger.info(f"Saved upload {file_path} ({file.size} bytes)")
+
+        # Process PDFs and queue embedding in the background
+        processed_files = await asyncio.gather(*(
+            pdf_service.process_pdf(file_path, file_hash=file_hash)
+            for file_path, (_, file_hash) in zip(file_paths, saved)
+        ))
         
         return {
             "message": "Files processed successfully",
             "processed_files": processed_files
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error processing files: {str(e)}"
         )
 
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """
+    Get the status and progress of a background ingestion job
+    """
+    job = (await services.get("job_queue")).get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job {job_id} not found"
+        )
+    return job
+
 @router.get("/text/{filename}")
 async def get_processed_text(filename: str, include_chunks: bool = False):
     """
@@ -63,6 +218,7 @@ async def get_processed_text(filename: str, include_chunks: bool = False):
     """
     try:
         logger.info(f"Text retrieval called for file: {filename}")
+        pdf_service = await services.get("pdf_service")
         result = await pdf_service.get_text_by_filename(filename)
         
         if result["status"] == "error":
@@ -1,14 +1,11 @@
-from fastapi import APIRouter, Request
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter
 
-from api.api_v1.endpoints import chatbot, upload, chat
-from utils.interface import https_url_for
-
-templates = Jinja2Templates(directory="templates")
-templates.env.globals["https_url_for"] = https_url_for
+from api.api_v1.endpoints import chatbot, upload, chat, health, metrics
 
 api_router = APIRouter()
 
 api_router.include_router(chatbot.router, prefix="/chatbot", tags=["chatbot"])
 api_router.include_router(upload.router, prefix="/upload", tags=["upload"])
-api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
\ No newline at end of file
+api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
+api_router.include_router(health.router, prefix="/health", tags=["health"])
+api_router.include_router(metrics.router, tags=["metrics"])
\ No newline at end of file
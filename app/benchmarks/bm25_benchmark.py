@@ -0,0 +1,106 @@
+"""
+Benchmark build throughput and query latency of the on-disk BM25 index.
+
+Chunks are drawn from a Zipf-distributed vocabulary and each one carries a
+unique part number, so queries for a part number measure exact-match recall.
+Before timing, the index is checked not to reuse the doc IDs of deleted chunks
+after it is reopened.
+
+Run from the app directory:
+    python -m benchmarks.bm25_benchmark --chunks 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from services.bm25_index import BM25Index
+
+def part_number(i: int) -> str:
+    return f"PN-{i:07d}"
+
+def synthetic_chunks(count: int, words_per_chunk: int, vocabulary: int, rng: np.random.Generator):
+    """Yield (vector_id, pdf_name, text) tuples with Zipf-distributed words"""
+    words = np.array([f"term{i}" for i in range(vocabulary)])
+    for i in range(count):
+        ranks = np.minimum(rng.zipf(1.2, words_per_chunk), vocabulary) - 1
+        yield f"chunk_{i}", f"doc_{i // 1000}.pdf", f"{' '.join(words[ranks])} {part_number(i)}"
+
+def percentile(values, p: float) -> float:
+    return float(np.percentile(values, p) * 1000)
+
+def check_reopen_after_delete(tmp_dir: str):
+    """Chunks added after deletes and a reopen must not inherit the deleted chunks' postings"""
+    path = os.path.join(tmp_dir, "reopen.db")
+    index = BM25Index(path=path)
+    index.add_documents([("a", "doc.pdf", "apple"), ("b", "doc.pdf", "banana"),
+                         ("c", "doc.pdf", "zebra"), ("d", "doc.pdf", "zebra stripes")])
+    index.flush()
+    index.delete(["c", "d"])
+    index.conn.close()
+    index = BM25Index(path=path)
+    index.add_documents([("e", "doc.pdf", "cherry"), ("f", "doc.pdf", "grape")])
+    results = index.search("zebra", 10)
+    assert results == [], f"Deleted chunks' postings matched new chunks: {results}"
+    assert [vector_id for vector_id, _ in index.search("grape", 10)] == ["f"]
+    index.conn.close()
+    print("Reopened index does not reuse deleted doc IDs")
+
+def run(count: int, words_per_chunk: int, vocabulary: int, batch_size: int, num_queries: int, top_k: int):
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        check_reopen_after_delete(tmp_dir)
+        index = BM25Index(path=os.path.join(tmp_dir, "bm25.db"))
+        start = time.perf_counter()
+        batch = []
+        for document in synthetic_chunks(count, words_per_chunk, vocabulary, rng):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                index.add_documents(batch)
+                batch = []
+        if batch:
+            index.add_documents(batch)
+        index.flush()
+        build_time = time.perf_counter() - start
+        size_mb = sum(
+            os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)
+        ) / (1024 * 1024)
+        print(f"Indexed {count} chunks in {build_time:.2f}s ({count / build_time:.0f} chunks/s), "
+              f"{len(index.segments)} segments, {size_mb:.1f} MB on disk")
+
+        targets = rng.integers(0, count, num_queries)
+        keyword_latencies, mixed_latencies = [], []
+        hits = 0
+        for target in targets:
+            query = part_number(int(target))
+            start = time.perf_counter()
+            results = index.search(query, top_k)
+            keyword_latencies.append(time.perf_counter() - start)
+            hits += bool(results) and results[0][0] == f"chunk_{target}"
+
+            common = " ".join(f"term{i}" for i in rng.integers(0, 50, 3))
+            start = time.perf_counter()
+            index.search(f"{common} {query}", top_k)
+            mixed_latencies.append(time.perf_counter() - start)
+
+        print(f"{'query':>14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name, latencies in (("part number", keyword_latencies), ("common + part", mixed_latencies)):
+            print(f"{name:>14} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} "
+                  f"{percentile(latencies, 99):>8.2f}")
+        print(f"Exact part number ranked first: {hits / num_queries:.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--words-per-chunk", type=int, default=150)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=20)
+    args = parser.parse_args()
+    run(args.chunks, args.words_per_chunk, args.vocabulary, args.batch_size, args.queries, args.top_k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Answer a questionnaire against an uploaded document through the single-question
+chat endpoint, one request at a time as a client would today, and through the
+batch endpoint, using a local fake OpenAI server and the local vector store.
+Reports wall time, time to the first answer and the number of OpenAI requests,
+plus the cost of scoring the questions one query at a time against one batched
+query in the local vector store.
+
+Run from the app directory:
+    python -m benchmarks.chat_batch_benchmark --questions 100 --pages 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+def configure_environment(openai_port: int):
+    """Point the app at the fake OpenAI server and a throwaway local vector store"""
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_port}/v1"
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "fake-key"
+    os.environ["VECTOR_STORE"] = "local"
+    os.environ["DATA_DIR"] = tempfile.mkdtemp()
+    os.environ["CHAT_CACHE_ENABLED"] = "false"
+    os.environ["STARTUP_WARMUP"] = "false"
+
+async def run(num_questions: int, pages: int, latency: float, port: int, app_port: int):
+    configure_environment(port)
+    import httpx
+    from benchmarks.fake_openai import FakeServer, create_fake_openai_app, start_fake_server
+    from benchmarks.synthetic_pdf import generate_paragraph, generate_pdf
+    from main import app
+    from api.api_v1.endpoints.upload import UPLOAD_DIR
+    from services.container import get_services
+
+    fake_app = create_fake_openai_app(latency=latency, token_latency=0.001, answer_tokens=50)
+    server = await start_fake_server(fake_app, port)
+    rng = random.Random(1)
+    questions = [f"What does the contract say about {' '.join(generate_paragraph(rng, 1).split()[:6])}?"
+                 for _ in range(num_questions)]
+    pdf = generate_pdf(Path(tempfile.mkdtemp()) / "chat-batch-benchmark.pdf", pages)
+    try:
+        async with app.router.lifespan_context(app):
+            services = get_services()
+            await services.warm_up()
+            # Served over a socket: the ASGI test transport would buffer the streamed results
+            app_server = FakeServer(app, app_port)
+            await app_server.start()
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=None) as client:
+                response = await client.post("/upload/", files={"files": (pdf.name, pdf.read_bytes(), "application/pdf")})
+                job_id = response.json()["processed_files"][0]["job_id"]
+                while (await client.get(f"/upload/jobs/{job_id}")).json()["status"] not in ("completed", "failed"):
+                    await asyncio.sleep(0.05)
+
+                print(f"{num_questions} questions, {pages} pages, fake OpenAI latency {latency * 1000:.0f}ms")
+                print(f"{'mode':>12} {'wall s':>8} {'first ms':>9} {'OpenAI reqs':>12}")
+
+                requests_before = fake_app.state.stats.requests
+                start = time.perf_counter()
+                first = None
+                for question in questions:
+                    response = await client.post("/chat/chat-completions",
+                                                 json={"messages": [{"role": "user", "content": question}]})
+                    response.raise_for_status()
+                    first = first or time.perf_counter() - start
+                wall = time.perf_counter() - start
+                print(f"{'sequential':>12} {wall:>8.2f} {first * 1000:>9.0f} "
+                      f"{fake_app.state.stats.requests - requests_before:>12}")
+
+                # Fresh question texts so the embedding cache does not help the batch
+                batch_questions = [f"{question} (batch)" for question in questions]
+                requests_before = fake_app.state.stats.requests
+                start = time.perf_counter()
+                first = None
+                answered = 0
+                async with client.stream("POST", "/chat/chat-completions/batch",
+                                         json={"questions": batch_questions}) as response:
+                    async for line in response.aiter_lines():
+                        if line == "event: result":
+                            answered += 1
+                            first = first or time.perf_counter() - start
+                wall = time.perf_counter() - start
+                print(f"{'batch':>12} {wall:>8.2f} {first * 1000:>9.0f} "
+                      f"{fake_app.state.stats.requests - requests_before:>12}  ({answered} answered)")
+            await app_server.stop()
+
+            store = services.vector_store
+            queries = await services.embedding_service.create_embeddings(batch_questions)
+            start = time.perf_counter()
+            for query in queries:
+                await store.query(query, 20, include_values=True)
+            looped = time.perf_counter() - start
+            start = time.perf_counter()
+            await store.query_many(queries, 20, include_values=True)
+            batched = time.perf_counter() - start
+            print(f"\nLocal vector store, {len(queries)} queries over {len(store.id_to_row)} vectors: "
+                  f"{looped * 1000:.1f}ms one at a time, {batched * 1000:.1f}ms batched")
+    finally:
+        (UPLOAD_DIR / pdf.name).unlink(missing_ok=True)
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8793)
+    parser.add_argument("--app-port", type=int, default=8794)
+    args = parser.parse_args()
+    asyncio.run(run(args.questions, args.pages, args.latency, args.port, args.app_port))
+
+if __name__ == "__main__":
+    main()
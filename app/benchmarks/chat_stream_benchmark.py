@@ -0,0 +1,101 @@
+"""
+Measure time-to-first-token of the streaming chat endpoint against the
+buffered endpoint, using a local fake OpenAI server and the local vector store.
+Also checks that a client disconnect cancels the upstream completion.
+
+Run from the app directory:
+    python -m benchmarks.chat_stream_benchmark --requests 10 --tokens 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fake_openai import create_fake_openai_app, start_fake_server, FakeServer
+
+def configure_environment(openai_port: int):
+    """Point the app at the fake OpenAI server and a throwaway local vector store"""
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_port}/v1"
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "fake-key"
+    os.environ["VECTOR_STORE"] = "local"
+    os.environ["DATA_DIR"] = tempfile.mkdtemp()
+    os.environ["CHAT_CACHE_ENABLED"] = "false"
+
+async def measure_stream(client: httpx.AsyncClient, question: str):
+    """Return (time to sources, time to first token, total time) for one streamed answer"""
+    start = time.perf_counter()
+    sources_at = first_token_at = None
+    async with client.stream("POST", "/chat/chat-completions/stream",
+                             json={"messages": [{"role": "user", "content": question}]}) as response:
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                now = time.perf_counter()
+                if event == "sources" and sources_at is None:
+                    sources_at = now - start
+                elif event == "token" and first_token_at is None:
+                    first_token_at = now - start
+                elif event == "error":
+                    raise RuntimeError(json.loads(line[len("data: "):])["message"])
+    return sources_at, first_token_at, time.perf_counter() - start
+
+async def measure_buffered(client: httpx.AsyncClient, question: str) -> float:
+    start = time.perf_counter()
+    response = await client.post("/chat/chat-completions",
+                                 json={"messages": [{"role": "user", "content": question}]})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+async def run(num_requests: int, tokens: int, latency: float, token_latency: float,
+              openai_port: int, app_port: int):
+    fake_app = create_fake_openai_app(latency=latency, token_latency=token_latency, answer_tokens=tokens)
+    fake_server = await start_fake_server(fake_app, openai_port)
+    configure_environment(openai_port)
+    from main import app
+
+    app_server = FakeServer(app, app_port)
+    await app_server.start()
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{app_port}", timeout=60) as client:
+        streamed = [await measure_stream(client, f"Question {i}") for i in range(num_requests)]
+        buffered = [await measure_buffered(client, f"Question {i}") for i in range(num_requests)]
+
+        # Disconnect after the first token and check the upstream stream was cancelled
+        async with client.stream("POST", "/chat/chat-completions/stream",
+                                 json={"messages": [{"role": "user", "content": "Disconnect"}]}) as response:
+            async for line in response.aiter_lines():
+                if line == "event: token":
+                    break
+        await asyncio.sleep(max(0.5, token_latency * 5))
+
+    print(f"{'endpoint':>10} {'sources ms':>11} {'first token ms':>15} {'total ms':>9}")
+    print(f"{'stream':>10} {statistics.median(s[0] for s in streamed) * 1000:>11.1f} "
+          f"{statistics.median(s[1] for s in streamed) * 1000:>15.1f} "
+          f"{statistics.median(s[2] for s in streamed) * 1000:>9.1f}")
+    print(f"{'buffered':>10} {'-':>11} {statistics.median(buffered) * 1000:>15.1f} "
+          f"{statistics.median(buffered) * 1000:>9.1f}")
+    print(f"Upstream streams cancelled after client disconnect: {fake_app.state.stats.cancelled_streams}")
+
+    await app_server.stop()
+    await fake_server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--openai-port", type=int, default=8765)
+    parser.add_argument("--app-port", type=int, default=8766)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.tokens, args.latency, args.token_latency,
+                    args.openai_port, args.app_port))
+
+if __name__ == "__main__":
+    main()
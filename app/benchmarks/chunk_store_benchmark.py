@@ -0,0 +1,120 @@
+"""
+Measure how much moving chunk text out of vector metadata into the local chunk
+store shrinks upsert and query payloads, and what the chat path pays to look
+the text up again.
+
+Payload sizes are the JSON bodies of Pinecone's upsert request and of a query
+response with metadata, built for the same chunks with the previous metadata
+(text, timestamp and document stats on every vector) and the current metadata.
+
+Run from the app directory:
+    python -m benchmarks.chunk_store_benchmark --chunks 20000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from services.chunk_store import ChunkStore
+from services.local_vector_store import LocalVectorStore
+
+def synthetic_chunks(count: int, chunk_chars: int, rng: np.random.Generator):
+    """Chunk-sized texts built from random words"""
+    words = np.array([f"word{i}" for i in range(5000)])
+    return [
+        " ".join(words[rng.integers(0, len(words), chunk_chars // 8)])[:chunk_chars]
+        for _ in range(count)
+    ]
+
+def legacy_metadata(metadata: dict, chunk: str) -> dict:
+    """Vector metadata as it was written before the chunk store"""
+    return {
+        **metadata,
+        "text": chunk,
+        "timestamp": datetime.utcnow().isoformat(),
+        "total_chars": 2543210,
+        "total_words": 402117,
+        "total_paragraphs": 9310
+    }
+
+def upsert_bytes(vectors) -> int:
+    """Size of the upsert request body for (id, values, metadata) tuples"""
+    return len(json.dumps({"vectors": [
+        {"id": vector_id, "values": values, "metadata": metadata} for vector_id, values, metadata in vectors
+    ]}))
+
+def query_bytes(vectors, top_k: int) -> int:
+    """Size of a query response with metadata for the first top_k vectors"""
+    return len(json.dumps({"matches": [
+        {"id": vector_id, "score": 0.87654321, "values": [], "metadata": metadata}
+        for vector_id, _, metadata in vectors[:top_k]
+    ], "namespace": ""}))
+
+def percentile(values, p: float) -> float:
+    return float(np.percentile(values, p) * 1000)
+
+def run(count: int, dimension: int, chunk_chars: int, top_k: int, num_queries: int):
+    rng = np.random.default_rng(0)
+    chunks = synthetic_chunks(count, chunk_chars, rng)
+    embeddings = rng.standard_normal((count, dimension)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    vector_ids = [f"doc.pdf_chunk_{i:016x}" for i in range(count)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = LocalVectorStore(directory=os.path.join(tmp_dir, "vectors"), dimension=dimension)
+        current = store._prepare_vectors(embeddings, chunks, "doc.pdf", {}, vector_ids=vector_ids)
+        legacy = [(vector_id, values, legacy_metadata(metadata, chunk))
+                  for (vector_id, values, metadata), chunk in zip(current, chunks)]
+
+        # Payload sizes, sampled on a batch of 100 vectors for the upsert body
+        sample = 100
+        sizes = {}
+        for name, vectors in (("text in metadata", legacy), ("chunk store", current)):
+            listed = [(vector_id, values.tolist(), metadata) for vector_id, values, metadata in vectors[:sample]]
+            sizes[name] = (
+                upsert_bytes(listed) / sample,
+                sum(len(json.dumps(metadata)) for _, _, metadata in vectors) / count,
+                query_bytes(listed, top_k)
+            )
+        print(f"{count} chunks of ~{chunk_chars} chars, {dimension} dimensions")
+        print(f"{'layout':>18} {'upsert B/vector':>16} {'metadata B/vector':>18} {'query B (top ' + str(top_k) + ')':>18}")
+        for name, (upsert, metadata, query) in sizes.items():
+            print(f"{name:>18} {upsert:>16.0f} {metadata:>18.0f} {query:>18.0f}")
+        (legacy_upsert, legacy_metadata_size, legacy_query), (upsert, metadata_size, query) = sizes.values()
+        print(f"{'reduction':>18} {1 - upsert / legacy_upsert:>16.1%} {1 - metadata_size / legacy_metadata_size:>18.1%} "
+              f"{1 - query / legacy_query:>18.1%}")
+
+        chunk_store = ChunkStore(path=os.path.join(tmp_dir, "chunks.db"))
+        start = time.perf_counter()
+        for offset in range(0, count, 1000):
+            chunk_store.put_many("doc.pdf", [
+                (vector_ids[i], i, chunks[i]) for i in range(offset, min(offset + 1000, count))
+            ])
+        print(f"Wrote {count} chunks to the chunk store in {time.perf_counter() - start:.2f}s")
+
+        latencies = []
+        for _ in range(num_queries):
+            ids = [vector_ids[i] for i in rng.choice(count, top_k, replace=False)]
+            start = time.perf_counter()
+            texts = chunk_store.get_many(ids)
+            latencies.append(time.perf_counter() - start)
+            assert len(texts) == top_k
+        print(f"Chunk text lookup for {top_k} matches: p50 {percentile(latencies, 50):.2f}ms, "
+              f"p95 {percentile(latencies, 95):.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    run(args.chunks, args.dimension, args.chunk_chars, args.top_k, args.queries)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Throughput of text chunking: LangChain's RecursiveCharacterTextSplitter, which
+the text processor used before, against the offset-based TextChunker in
+utils.text_chunking, on synthetic documents of increasing size. Random texts
+and the synthetic documents are first checked to chunk identically under both,
+by characters and by tokens.
+
+Run from the app directory:
+    python -m benchmarks.chunking_benchmark --sizes 1 4 16
+"""
+import argparse
+import random
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from benchmarks.synthetic_pdf import generate_paragraph
+from utils.text_chunking import DEFAULT_SEPARATORS, TextChunker
+from utils.tokens import count_tokens
+
+# Fragments that exercise every separator, runs of whitespace and non-ASCII text
+FRAGMENTS = ["a", "b", "word", "Lorem", " ", "  ", "\n", "\n\n", ".", "!", "?", "\t", "é", " . ", "\n \n"]
+
+def langchain_splitter(chunk_size: int, chunk_overlap: int, tokens: bool) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=count_tokens if tokens else len,
+        separators=list(DEFAULT_SEPARATORS)
+    )
+
+def native_chunker(chunk_size: int, chunk_overlap: int, tokens: bool) -> TextChunker:
+    return TextChunker(chunk_size, chunk_overlap, length_function=count_tokens if tokens else None)
+
+def synthetic_document(megabytes: float, rng: random.Random) -> str:
+    """Cleaned document text: paragraphs of varying length, a few longer than a chunk"""
+    paragraphs = []
+    size = 0
+    while size < megabytes * 1e6:
+        paragraph = generate_paragraph(rng, rng.choice((2, 4, 8, 12, 40)))
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+def check_parity(trials: int, documents):
+    rng = random.Random(0)
+    for trial in range(trials):
+        text = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 400)))
+        chunk_size = rng.randint(1, 60)
+        chunk_overlap = rng.randint(0, chunk_size)
+        tokens = trial % 5 == 0
+        expected = langchain_splitter(chunk_size, chunk_overlap, tokens).split_text(text)
+        actual = native_chunker(chunk_size, chunk_overlap, tokens).split_text(text)
+        assert actual == expected, f"Chunks differ for {text!r} ({chunk_size}, {chunk_overlap}, tokens={tokens})"
+    for text in documents:
+        for tokens, chunk_size, chunk_overlap in ((False, 1000, 100), (True, 250, 25)):
+            expected = langchain_splitter(chunk_size, chunk_overlap, tokens).split_text(text)
+            assert native_chunker(chunk_size, chunk_overlap, tokens).split_text(text) == expected
+    print(f"{trials} random texts and {len(documents)} documents chunk identically")
+
+def megabytes_per_second(fn, text: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return len(text.encode("utf-8")) / best / 1e6
+
+def run(sizes, trials: int, repeats: int):
+    rng = random.Random(1)
+    documents = [synthetic_document(size, rng) for size in sizes]
+    check_parity(trials, [synthetic_document(0.1, rng) for _ in range(3)])
+
+    print(f"{'MB':>6} {'unit':>10} {'chunks':>8} {'langchain':>10} {'native':>8} {'spans':>8} {'speedup':>8}  (MB/s)")
+    for size, text in zip(sizes, documents):
+        for tokens, chunk_size, chunk_overlap in ((False, 1000, 100), (True, 250, 25)):
+            splitter = langchain_splitter(chunk_size, chunk_overlap, tokens)
+            chunker = native_chunker(chunk_size, chunk_overlap, tokens)
+            chunks = len(chunker.split_spans(text))
+            baseline = megabytes_per_second(splitter.split_text, text, repeats)
+            native = megabytes_per_second(chunker.split_text, text, repeats)
+            spans = megabytes_per_second(chunker.split_spans, text, repeats)
+            unit = "tokens" if tokens else "characters"
+            print(f"{size:>6g} {unit:>10} {chunks:>8} {baseline:>10.1f} {native:>8.1f} {spans:>8.1f} "
+                  f"{native / baseline:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Document sizes in MB")
+    parser.add_argument("--trials", type=int, default=3000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.trials, args.repeats)
+
+if __name__ == "__main__":
+    main()
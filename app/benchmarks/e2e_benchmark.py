@@ -0,0 +1,380 @@
+"""
+End-to-end benchmark of the upload and chat flows through the HTTP API, with
+local fakes for OpenAI and Pinecone so runs are reproducible and offline.
+
+The application is served by uvicorn in this process with its services warmed
+up. Synthetic PDFs of the requested size and layout are uploaded concurrently
+and followed until their ingestion jobs complete, then questions built from the
+same vocabulary are sent to the chat endpoint. For each phase the harness
+reports throughput, p50/p95/p99 latency of the requests and of every stage the
+application times (see utils.metrics), and the peak resident memory of the
+process. The fakes run in a helper process so their CPU and memory do not
+count towards the measurements.
+
+Results are written as JSON tagged with the git commit; pass an earlier result
+with --compare to print the change of every metric against it.
+
+Run from the app directory:
+    python -m benchmarks.e2e_benchmark --documents 4 --pages 50 --queries 100
+    python -m benchmarks.e2e_benchmark --layout structured --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.synthetic_pdf import generate_paragraph, generate_pdf, generate_structured_pdf
+
+def serve_fakes(openai_port: int, pinecone_port: int, openai_latency: float, token_latency: float,
+                answer_tokens: int, pinecone_latency: float, ready):
+    """Run the fake OpenAI and Pinecone servers until the process is terminated"""
+    from benchmarks.fake_openai import create_fake_openai_app, start_fake_server
+    from benchmarks.fake_pinecone import create_fake_pinecone_app
+
+    async def serve():
+        await start_fake_server(create_fake_openai_app(
+            latency=openai_latency, token_latency=token_latency, answer_tokens=answer_tokens
+        ), openai_port)
+        await start_fake_server(create_fake_pinecone_app(latency=pinecone_latency), pinecone_port)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+def configure_environment(args, data_dir: str):
+    """Point the app at the fakes and a throwaway data directory; must run before the app is imported"""
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.openai_port}/v1"
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "fake-key"
+    os.environ["VECTOR_STORE"] = args.vector_store
+    os.environ["PINECONE_INDEX_HOST"] = f"http://127.0.0.1:{args.pinecone_port}"
+    os.environ["PINECONE_API_KEY"] = os.environ.get("PINECONE_API_KEY") or "fake-key"
+    os.environ["CHAT_CACHE_ENABLED"] = "true" if args.chat_cache else "false"
+    os.environ["STARTUP_WARMUP"] = "false"
+
+class MemorySampler:
+    """Samples the resident memory of this process in a thread and keeps the peak since the last reset"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.peak = self.rss()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def rss(self) -> int:
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * self.page_size
+        except OSError:
+            # Lifetime peak in KiB on Linux; the best available where /proc is missing
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    def start(self):
+        self.thread.start()
+
+    def reset(self):
+        self.peak = self.rss()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Count, mean and p50/p95/p99/max in milliseconds of a list of durations in seconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered) * 1000,
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": ordered[-1] * 1000,
+    }
+
+def stage_summaries(pipeline: str) -> Dict[str, Dict[str, float]]:
+    """Summarize and clear the stage durations the application recorded for a pipeline"""
+    from utils.metrics import STAGE_SECONDS
+    with STAGE_SECONDS.lock:
+        recorded = STAGE_SECONDS.recorded
+        STAGE_SECONDS.recorded = {}
+    return {labels[1]: summarize(values) for labels, values in sorted(recorded.items()) if labels[0] == pipeline}
+
+def generate_documents(args, directory: Path) -> List[Path]:
+    files = []
+    for i in range(args.documents):
+        path = directory / f"e2e-benchmark-{i}.pdf"
+        if args.layout == "structured":
+            generate_structured_pdf(path, args.pages, seed=i)
+        else:
+            generate_pdf(path, args.pages, seed=i)
+        files.append(path)
+    return files
+
+def generate_questions(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(count):
+        words = generate_paragraph(rng, sentences=1).rstrip(".").split()
+        questions.append(f"What does the document say about {' '.join(words[:6])}?")
+    return questions
+
+async def run_uploads(client, files: List[Path], concurrency: int, poll_interval: float) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    request_latencies, ingest_latencies = [], []
+    totals = {"pages": 0, "chunks": 0, "failed": 0}
+
+    async def upload(path: Path):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(
+                "/upload/", files={"files": (path.name, path.read_bytes(), "application/pdf")}
+            )
+            response.raise_for_status()
+            request_latencies.append(time.perf_counter() - start)
+            result = response.json()["processed_files"][0]
+            if result["status"] != "success":
+                totals["failed"] += 1
+                return
+        while True:
+            job = (await client.get(f"/upload/jobs/{result['job_id']}")).json()
+            if job["status"] in ("completed", "failed"):
+                break
+            await asyncio.sleep(poll_interval)
+        ingest_latencies.append(time.perf_counter() - start)
+        if job["status"] == "failed":
+            totals["failed"] += 1
+        totals["pages"] += job["pages_extracted"]
+        totals["chunks"] += job["chunks_embedded"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(path) for path in files))
+    wall = time.perf_counter() - start
+    return {
+        "documents": len(files),
+        **totals,
+        "wall_seconds": wall,
+        "pages_per_second": totals["pages"] / wall,
+        "chunks_per_second": totals["chunks"] / wall,
+        "request_latency": summarize(request_latencies),
+        "ingest_latency": summarize(ingest_latencies),
+    }
+
+async def run_chat(client, questions: List[str], concurrency: int, stream: bool) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, first_token_latencies = [], []
+    errors = 0
+
+    async def ask(question: str):
+        nonlocal errors
+        body = {"messages": [{"role": "user", "content": question}]}
+        async with semaphore:
+            start = time.perf_counter()
+            if not stream:
+                response = await client.post("/chat/chat-completions", json=body)
+                errors += response.status_code != 200
+                latencies.append(time.perf_counter() - start)
+                return
+            async with client.stream("POST", "/chat/chat-completions/stream", json=body) as response:
+                first_token = None
+                async for line in response.aiter_lines():
+                    if first_token is None and line == "event: token":
+                        first_token = time.perf_counter() - start
+                    elif line == "event: error":
+                        errors += 1
+            latencies.append(time.perf_counter() - start)
+            if first_token is not None:
+                first_token_latencies.append(first_token)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(question) for question in questions))
+    wall = time.perf_counter() - start
+    results = {
+        "queries": len(questions),
+        "errors": errors,
+        "wall_seconds": wall,
+        "queries_per_second": len(questions) / wall,
+        "latency": summarize(latencies),
+    }
+    if stream:
+        results["first_token_latency"] = summarize(first_token_latencies)
+    return results
+
+async def run_benchmark(args, work_dir: Path) -> Dict:
+    import httpx
+    from main import app
+    from api.api_v1.endpoints.upload import UPLOAD_DIR
+    from benchmarks.fake_openai import FakeServer
+    from services.container import get_services
+    from utils.metrics import STAGE_SECONDS
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    STAGE_SECONDS.record_values()
+    files = generate_documents(args, work_dir)
+    questions = generate_questions(args.queries)
+    sampler = MemorySampler()
+    sampler.start()
+    results = {}
+    try:
+        # Served over a real socket: the ASGI test transport buffers responses, hiding time to first token
+        async with app.router.lifespan_context(app):
+            await get_services().warm_up()
+            server = FakeServer(app, args.app_port)
+            await server.start()
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.app_port}", timeout=None) as client:
+                sampler.reset()
+                results["upload"] = await run_uploads(client, files, args.concurrency, args.poll_interval)
+                results["upload"]["stages"] = stage_summaries("upload")
+                results["upload"]["peak_rss_mb"] = sampler.peak / 2 ** 20
+
+                sampler.reset()
+                results["chat"] = await run_chat(client, questions, args.concurrency, args.stream)
+                results["chat"]["stages"] = stage_summaries("chat")
+                results["chat"]["peak_rss_mb"] = sampler.peak / 2 ** 20
+            await server.stop()
+    finally:
+        sampler.stop()
+        for path in files:
+            (UPLOAD_DIR / path.name).unlink(missing_ok=True)
+    # Lifetime peak of the largest extraction worker, which the sampler cannot see
+    results["children_max_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return results
+
+def git_commit() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results into dotted keys, keeping only numbers"""
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f"{prefix}{key}"] = value
+    return values
+
+def compare(baseline: Dict, current: Dict):
+    """Print the throughput, latency percentiles and memory of both runs with the relative change"""
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+    differences = [key for key, value in current["config"].items()
+                   if key not in ("output", "compare") and baseline["config"].get(key) != value]
+    if differences:
+        print(f"Warning: runs differ in {', '.join(differences)}")
+    print(f"{'metric':<44} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key in new:
+        if key not in old or key.endswith((".count", ".mean", ".max")):
+            continue
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{key:<44} {old[key]:>10.2f} {new[key]:>10.2f} {change:>+7.1f}%")
+
+def report(results: Dict):
+    upload, chat = results["upload"], results["chat"]
+    print(f"Upload: {upload['documents']} documents, {upload['pages']} pages, {upload['chunks']} chunks "
+          f"in {upload['wall_seconds']:.2f}s ({upload['pages_per_second']:.1f} pages/s, "
+          f"{upload['chunks_per_second']:.1f} chunks/s), {upload['failed']} failed, "
+          f"peak RSS {upload['peak_rss_mb']:.0f}MB")
+    print(f"Chat: {chat['queries']} queries in {chat['wall_seconds']:.2f}s "
+          f"({chat['queries_per_second']:.1f}/s), {chat['errors']} errors, peak RSS {chat['peak_rss_mb']:.0f}MB")
+    print(f"\n{'pipeline':>8} {'stage':>16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("upload", "request", upload["request_latency"]), ("upload", "job", upload["ingest_latency"]),
+            ("chat", "request", chat["latency"])]
+    if "first_token_latency" in chat:
+        rows.append(("chat", "first token", chat["first_token_latency"]))
+    rows += [("upload", stage, summary) for stage, summary in upload["stages"].items()]
+    rows += [("chat", stage, summary) for stage, summary in chat["stages"].items()]
+    for pipeline, stage, summary in rows:
+        if summary["count"]:
+            print(f"{pipeline:>8} {stage:>16} {summary['count']:>6} {summary['p50']:>9.1f} "
+                  f"{summary['p95']:>9.1f} {summary['p99']:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--layout", choices=("plain", "structured"), default="plain")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--chat-cache", action="store_true", help="keep the chat response cache enabled")
+    parser.add_argument("--vector-store", choices=("pinecone", "local"), default="pinecone")
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--answer-tokens", type=int, default=50)
+    parser.add_argument("--pinecone-latency", type=float, default=0.02)
+    parser.add_argument("--app-port", type=int, default=8790)
+    parser.add_argument("--openai-port", type=int, default=8791)
+    parser.add_argument("--pinecone-port", type=int, default=8792)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--verbose", action="store_true", help="keep the application's INFO logs")
+    parser.add_argument("--output", type=Path, help="defaults to benchmark_results/e2e-<commit>-<time>.json")
+    parser.add_argument("--compare", type=Path, help="an earlier result to compare against")
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    fakes = multiprocessing.Process(target=serve_fakes, daemon=True, args=(
+        args.openai_port, args.pinecone_port, args.openai_latency, args.token_latency,
+        args.answer_tokens, args.pinecone_latency, ready
+    ))
+    fakes.start()
+    try:
+        if not ready.wait(30):
+            sys.exit("Fake servers did not start")
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure_environment(args, os.path.join(work_dir, "data"))
+            results = asyncio.run(run_benchmark(args, Path(work_dir)))
+    finally:
+        fakes.terminate()
+        fakes.join()
+
+    timestamp = datetime.now(timezone.utc)
+    output = {
+        **git_commit(),
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "results": results,
+    }
+    report(results)
+    path = args.output or Path("benchmark_results") / f"e2e-{output['commit']}-{timestamp:%Y%m%dT%H%M%S}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(output, indent=2))
+    print(f"\nWrote {path}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of embedding representations for a batch of chunks: per-vector
+normalization into Python float lists versus decoding base64 responses into one
+float32 matrix normalized in a single operation, plus the storage size and
+accuracy of float16 and int8 quantization.
+
+Run from the app directory:
+    python -m benchmarks.embedding_representation_benchmark --chunks 10000
+"""
+import argparse
+import base64
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+
+from services.embedding_backends import OpenAIEmbeddingBackend
+from utils.quantization import dequantize, normalize_rows, quantize
+
+def legacy_normalize(vector):
+    """The previous per-vector normalization, returning a Python list"""
+    array = np.array(vector)
+    norm = np.linalg.norm(array)
+    if norm == 0:
+        return vector
+    return (array / norm).tolist()
+
+def measure(fn):
+    """Run fn twice, returning its result, untraced wall time and peak traced memory"""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def run(count: int, dimension: int, top_k: int):
+    rng = np.random.default_rng(0)
+    raw = rng.standard_normal((count, dimension)).astype(np.float32)
+    # What the SDK hands back: float lists by default, base64 strings when asked for them
+    list_response = SimpleNamespace(data=[
+        SimpleNamespace(index=i, embedding=row.tolist()) for i, row in enumerate(raw)
+    ])
+    base64_response = SimpleNamespace(data=[
+        SimpleNamespace(index=i, embedding=base64.b64encode(row.tobytes()).decode("ascii"))
+        for i, row in enumerate(raw)
+    ])
+
+    legacy, legacy_time, legacy_peak = measure(
+        lambda: [legacy_normalize(item.embedding) for item in list_response.data]
+    )
+    matrix, matrix_time, matrix_peak = measure(lambda: OpenAIEmbeddingBackend._decode_embeddings(base64_response))
+    _, normalize_time, _ = measure(lambda: normalize_rows(raw.copy()))
+
+    print(f"{count} chunks x {dimension} dimensions")
+    print(f"{'representation':>28} {'time ms':>9} {'peak MB':>9}")
+    print(f"{'per-vector lists':>28} {legacy_time * 1000:>9.1f} {legacy_peak / 2**20:>9.1f}")
+    print(f"{'float32 matrix (decode)':>28} {matrix_time * 1000:>9.1f} {matrix_peak / 2**20:>9.1f}")
+    print(f"{'batched normalize only':>28} {normalize_time * 1000:>9.1f}")
+    assert np.allclose(np.asarray(legacy, dtype=np.float32), matrix, atol=1e-6)
+
+    queries = normalize_rows(rng.standard_normal((100, dimension)).astype(np.float32))
+    exact = np.argsort(-(matrix @ queries.T), axis=0)[:top_k].T
+    print(f"{'storage':>8} {'MB':>9} {'max abs err':>12} {'recall@' + str(top_k):>10}")
+    for dtype in ("float32", "float16", "int8"):
+        codes, scales = quantize(matrix, dtype)
+        size = codes.nbytes + (scales.nbytes if dtype == "int8" else 0)
+        decoded = dequantize(codes, scales)
+        approximate = np.argsort(-(decoded @ queries.T), axis=0)[:top_k].T
+        recall = np.mean([len(set(e) & set(a)) / top_k for e, a in zip(exact, approximate)])
+        print(f"{dtype:>8} {size / 2**20:>9.1f} {np.abs(decoded - matrix).max():>12.2e} {recall:>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    run(args.chunks, args.dimension, args.top_k)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+In-process fake of the OpenAI chat completion and embedding endpoints with
+configurable latency, used by the load tests and benchmarks
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from typing import List, Optional, Union
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+class FakeOpenAIStats:
+    """Tracks request counts and how many requests were in flight at once"""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled_streams = 0
+
+    def enter(self):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def exit(self):
+        self.in_flight -= 1
+
+class EmbeddingRequest(BaseModel):
+    model: str
+    input: Union[str, List[str]]
+    encoding_format: Optional[str] = None
+
+class ChatCompletionRequest(BaseModel):
+    model: str
+    messages: List[dict]
+    max_tokens: int = 1000
+    temperature: float = 0.7
+    stream: bool = False
+
+def fake_embedding(text: str, dimension: int = 1536) -> np.ndarray:
+    """Deterministic pseudo-random float32 embedding derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+
+def create_fake_openai_app(latency: float = 0.2, dimension: int = 1536,
+                           token_latency: float = 0.02, answer_tokens: int = 50) -> FastAPI:
+    """
+    Build a FastAPI app that mimics the subset of the OpenAI API we use. Requests
+    wait `latency` seconds before responding; streamed completions then emit
+    `answer_tokens` tokens, one every `token_latency` seconds
+    """
+    app = FastAPI()
+    app.state.stats = FakeOpenAIStats()
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: EmbeddingRequest):
+        app.state.stats.enter()
+        try:
+            await asyncio.sleep(latency)
+            texts = [request.input] if isinstance(request.input, str) else request.input
+            return {
+                "object": "list",
+                "model": request.model,
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": (
+                            base64.b64encode(fake_embedding(text, dimension).tobytes()).decode("ascii")
+                            if request.encoding_format == "base64"
+                            else fake_embedding(text, dimension).tolist()
+                        )
+                    }
+                    for i, text in enumerate(texts)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}
+            }
+        finally:
+            app.state.stats.exit()
+
+    def completion_chunk(request: ChatCompletionRequest, delta: dict, finish_reason=None) -> str:
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    async def stream_completion(request: ChatCompletionRequest):
+        completed = False
+        try:
+            await asyncio.sleep(latency)
+            yield completion_chunk(request, {"role": "assistant", "content": ""})
+            for i in range(answer_tokens):
+                await asyncio.sleep(token_latency)
+                yield completion_chunk(request, {"content": f"token{i} "})
+            yield completion_chunk(request, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+            completed = True
+        finally:
+            if not completed:
+                app.state.stats.cancelled_streams += 1
+            app.state.stats.exit()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: ChatCompletionRequest):
+        app.state.stats.enter()
+        if request.stream:
+            return StreamingResponse(stream_completion(request), media_type="text/event-stream")
+        try:
+            await asyncio.sleep(latency + token_latency * answer_tokens)
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "This is a fake answer."},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }
+        finally:
+            app.state.stats.exit()
+
+    return app
+
+class FakeServer:
+    """A uvicorn server running on the current event loop"""
+
+    def __init__(self, app: FastAPI, port: int):
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+        )
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        self.server.should_exit = True
+        await self.task
+
+async def start_fake_server(app: FastAPI, port: int) -> FakeServer:
+    """Start a uvicorn server for the given app on the running event loop"""
+    server = FakeServer(app, port)
+    await server.start()
+    return server
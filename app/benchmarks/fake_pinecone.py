@@ -0,0 +1,152 @@
+"""
+In-process stub of the Pinecone data plane REST API (upsert, query, fetch,
+update, list and delete) with configurable latency, request size limit and failure rate, used by
+the benchmarks. Point PINECONE_INDEX_HOST at it to use it from PineconeService
+"""
+import asyncio
+import random
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse
+
+class FakePineconeStats:
+    """Tracks requests, upserted payload and how many requests were in flight at once"""
+
+    def __init__(self):
+        self.requests = 0
+        self.upserts = 0
+        self.vectors = 0
+        self.bytes = 0
+        self.rejected = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def enter(self):
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def exit(self):
+        self.in_flight -= 1
+
+def matches_filter(metadata: Dict, filter: Dict) -> bool:
+    """Evaluate the subset of Pinecone's filter language that PineconeService sends"""
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, part) for part in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, part) for part in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator in ("$lte", "$gte") and (
+                value is None or (value > operand if operator == "$lte" else value < operand)
+            ):
+                return False
+            # A list field matches when any of its items is in the operand
+            if operator == "$in" and not set(value if isinstance(value, list) else [value]) & set(operand):
+                return False
+    return True
+
+def create_fake_pinecone_app(latency: float = 0.05, max_request_bytes: int = 2 * 1024 * 1024,
+                             failure_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    """
+    Build a FastAPI app that mimics the Pinecone data plane. Each request waits
+    `latency` seconds; upserts larger than `max_request_bytes` get 413 and a
+    `failure_rate` fraction of upserts fail with 503
+    """
+    app = FastAPI()
+    app.state.stats = FakePineconeStats()
+    app.state.vectors: Dict[str, Dict] = {}
+    rng = random.Random(seed)
+
+    @app.post("/vectors/upsert")
+    async def upsert(request: Request):
+        stats = app.state.stats
+        stats.enter()
+        try:
+            body = await request.body()
+            await asyncio.sleep(latency)
+            if len(body) > max_request_bytes:
+                stats.rejected += 1
+                return JSONResponse({"code": 3, "message": "Request size exceeds the limit"}, status_code=413)
+            if rng.random() < failure_rate:
+                stats.failed += 1
+                return JSONResponse({"code": 14, "message": "Service unavailable"}, status_code=503)
+            payload = await request.json()
+            for vector in payload["vectors"]:
+                app.state.vectors[vector["id"]] = vector
+            stats.upserts += 1
+            stats.vectors += len(payload["vectors"])
+            stats.bytes += len(body)
+            return {"upsertedCount": len(payload["vectors"])}
+        finally:
+            stats.exit()
+
+    @app.post("/query")
+    async def query(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(latency)
+        filter = payload.get("filter") or {}
+        candidates = [
+            vector for vector in app.state.vectors.values()
+            if matches_filter(vector.get("metadata", {}), filter)
+        ]
+        if not candidates:
+            return {"matches": [], "namespace": ""}
+        matrix = np.asarray([vector["values"] for vector in candidates], dtype=np.float32)
+        scores = matrix @ np.asarray(payload["vector"], dtype=np.float32)
+        top = np.argsort(-scores)[:payload.get("topK", 10)]
+        return {
+            "matches": [
+                {
+                    "id": candidates[i]["id"],
+                    "score": float(scores[i]),
+                    "values": candidates[i]["values"] if payload.get("includeValues") else [],
+                    "metadata": candidates[i].get("metadata") if payload.get("includeMetadata") else None
+                }
+                for i in top
+            ],
+            "namespace": ""
+        }
+
+    @app.get("/vectors/fetch")
+    async def fetch(ids: List[str] = Query(...), namespace: Optional[str] = None):
+        await asyncio.sleep(latency)
+        return {
+            "vectors": {vector_id: app.state.vectors[vector_id] for vector_id in ids if vector_id in app.state.vectors},
+            "namespace": ""
+        }
+
+    @app.post("/vectors/update")
+    async def update(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(latency)
+        vector = app.state.vectors.get(payload["id"])
+        if vector is not None:
+            vector.setdefault("metadata", {}).update(payload.get("setMetadata") or {})
+        return {}
+
+    @app.get("/vectors/list")
+    async def list_ids(prefix: str = "", namespace: Optional[str] = None):
+        await asyncio.sleep(latency)
+        ids = sorted(vector_id for vector_id in app.state.vectors if vector_id.startswith(prefix))
+        return {"vectors": [{"id": vector_id} for vector_id in ids], "namespace": ""}
+
+    @app.post("/vectors/delete")
+    async def delete(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(latency)
+        for vector_id in payload.get("ids") or []:
+            app.state.vectors.pop(vector_id, None)
+        return {}
+
+    return app
@@ -0,0 +1,109 @@
+"""
+Benchmark the CPU-only hashing embedding backend: batch throughput on a single
+thread and spread over a thread or process pool, single-query latency against
+the OpenAI backend served by the fake OpenAI server, and a retrieval sanity
+check where each query is a handful of words sampled from one chunk.
+
+Run from the app directory:
+    python -m benchmarks.local_embedding_benchmark --chunks 20000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from config.main import config
+from benchmarks.fake_openai import create_fake_openai_app, start_fake_server
+from services.embedding_backends import HashingEmbeddingBackend
+
+def synthetic_chunks(count: int, words_per_chunk: int, vocabulary: int, rng: np.random.Generator):
+    """Chunks of Zipf-distributed words, shaped like 500-token document chunks"""
+    words = np.array([f"term{i}" for i in range(vocabulary)])
+    chunks = []
+    for _ in range(count):
+        ranks = np.minimum(rng.zipf(1.3, words_per_chunk), vocabulary) - 1
+        chunks.append(" ".join(words[ranks]))
+    return chunks
+
+def percentile(values, p: float) -> float:
+    return float(np.percentile(values, p) * 1000)
+
+async def throughput(backend: HashingEmbeddingBackend, chunks, batch_size: int) -> float:
+    """Embed every chunk in batches of batch_size and return texts per second"""
+    await backend.embed(chunks[:batch_size])  # start the pool before timing
+    start = time.perf_counter()
+    for i in range(0, len(chunks), batch_size):
+        await backend.embed(chunks[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    await backend.close()
+    return len(chunks) / elapsed
+
+async def query_latencies(backend, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await backend.embed([query])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def recall(matrix: np.ndarray, query_matrix: np.ndarray, targets: np.ndarray, k: int) -> float:
+    """Fraction of queries whose source chunk is among the top k by cosine similarity"""
+    scores = query_matrix @ matrix.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return float(np.mean([target in row for target, row in zip(targets, top)]))
+
+async def run(count: int, batch_size: int, workers: int, dimension: int, latency: float, port: int):
+    rng = np.random.default_rng(0)
+    chunks = synthetic_chunks(count, 350, 20000, rng)
+    print(f"{count} chunks of 350 words, batches of {batch_size}, {workers} workers, {dimension} dimensions")
+
+    print(f"{'executor':>10} {'texts/sec':>10}")
+    for label, kind, pool_workers in [("single", "thread", 1), ("thread", "thread", workers),
+                                      ("process", "process", workers)]:
+        backend = HashingEmbeddingBackend(dimension=dimension, workers=pool_workers, executor=kind)
+        print(f"{label:>10} {await throughput(backend, chunks, batch_size):>10.0f}")
+
+    # Queries are distinct words sampled from one chunk each, a stand-in for a question about that chunk
+    targets = rng.choice(count, size=min(500, count), replace=False)
+    queries = [" ".join(rng.choice(sorted(set(chunks[t].split())), size=12, replace=False)) for t in targets]
+
+    local = HashingEmbeddingBackend(dimension=dimension, workers=workers)
+    matrix = np.vstack([await local.embed(chunks[i:i + batch_size]) for i in range(0, count, batch_size)])
+    query_matrix = await local.embed(queries)
+    local_latencies = await query_latencies(local, queries)
+    await local.close()
+
+    fake_app = create_fake_openai_app(latency=latency, dimension=config.EMBEDDING_DIMENSION)
+    server = await start_fake_server(fake_app, port)
+    config.OPENAI_BASE_URL = f"http://127.0.0.1:{port}/v1"
+    config.OPENAI_API_KEY = config.OPENAI_API_KEY or "fake-key"
+    from services.embedding_backends import OpenAIEmbeddingBackend
+    from services.openai_client import get_openai_client
+    try:
+        remote_latencies = await query_latencies(OpenAIEmbeddingBackend(), queries[:100])
+    finally:
+        await get_openai_client().close()
+        await server.stop()
+
+    print(f"{'backend':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'local':>10} {percentile(local_latencies, 50):>8.2f} {percentile(local_latencies, 95):>8.2f}")
+    print(f"{'openai':>10} {percentile(remote_latencies, 50):>8.2f} {percentile(remote_latencies, 95):>8.2f}"
+          f"  (fake server, {latency * 1000:.0f} ms latency)")
+    print(f"Recall of the source chunk for {len(queries)} 12-word queries: "
+          f"@1 {recall(matrix, query_matrix, targets, 1):.3f}, @5 {recall(matrix, query_matrix, targets, 5):.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=config.INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dimension", type=int, default=config.LOCAL_EMBEDDING_DIMENSION)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+    asyncio.run(run(args.chunks, args.batch_size, args.workers, args.dimension, args.latency, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Cost of recording metrics on the hot path: a histogram observation, a timed
+block and a counter increment, compared with an empty loop, plus the time to
+render a scrape of every stage histogram.
+
+Run from the app directory:
+    python -m benchmarks.metrics_overhead_benchmark --iterations 1000000
+"""
+import argparse
+import time
+
+from utils.metrics import Counter, Histogram, MetricsRegistry
+
+def per_call_ns(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+def run(iterations: int):
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("stage_seconds", "Stage latency", ("pipeline", "stage")))
+    counter = registry.register(Counter("tokens_total", "Tokens", ("direction",)))
+
+    def empty(n):
+        for _ in range(n):
+            pass
+
+    def observe(n):
+        for _ in range(n):
+            histogram.observe(0.0123, "chat", "embed")
+
+    def timed(n):
+        for _ in range(n):
+            with histogram.time("chat", "retrieve"):
+                pass
+
+    def increment(n):
+        for _ in range(n):
+            counter.inc("in", amount=42)
+
+    baseline = per_call_ns(empty, iterations)
+    print(f"{'operation':>22} {'ns/call':>8}")
+    for name, fn in (("histogram.observe", observe), ("histogram.time block", timed), ("counter.inc", increment)):
+        print(f"{name:>22} {per_call_ns(fn, iterations) - baseline:>8.0f}")
+
+    for pipeline, stages in (("upload", 9), ("chat", 7)):
+        for stage in range(stages):
+            histogram.observe(0.5, pipeline, f"stage{stage}")
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"Rendered {len(text.splitlines())} lines in {(time.perf_counter() - start) * 1000:.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=1000000)
+    args = parser.parse_args()
+    run(args.iterations)
+
+if __name__ == "__main__":
+    main()
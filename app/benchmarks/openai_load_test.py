@@ -0,0 +1,61 @@
+"""
+Load test for the async OpenAI client layer against a local fake OpenAI server.
+
+Run from the app directory:
+    python -m benchmarks.openai_load_test --requests 50 --latency 0.5
+
+With a non-blocking client the wall time stays close to a single request's
+latency (up to OPENAI_MAX_CONCURRENCY) instead of growing with the request count.
+"""
+import argparse
+import asyncio
+import time
+
+from config.main import config
+from benchmarks.fake_openai import create_fake_openai_app, start_fake_server
+
+async def run(num_requests: int, latency: float, port: int):
+    fake_app = create_fake_openai_app(latency=latency, token_latency=0)
+    server = await start_fake_server(fake_app, port)
+
+    config.OPENAI_BASE_URL = f"http://127.0.0.1:{port}/v1"
+    config.OPENAI_API_KEY = config.OPENAI_API_KEY or "fake-key"
+    from services.openai_client import get_openai_client
+    client = get_openai_client()
+
+    async def one_request(i: int) -> float:
+        start = time.perf_counter()
+        await client.create_chat_completion(
+            model="gpt-4o-mini-2024-07-18",
+            messages=[{"role": "user", "content": f"Question {i}"}],
+            max_tokens=100,
+            temperature=0.7
+        )
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one_request(i) for i in range(num_requests))))
+    wall_time = time.perf_counter() - start
+
+    stats = fake_app.state.stats
+    print(f"requests:           {num_requests}")
+    print(f"server latency:     {latency:.3f}s")
+    print(f"wall time:          {wall_time:.3f}s")
+    print(f"serial estimate:    {num_requests * latency:.3f}s")
+    print(f"max in flight:      {stats.max_in_flight}")
+    print(f"p50 latency:        {latencies[len(latencies) // 2]:.3f}s")
+    print(f"throughput:         {num_requests / wall_time:.1f} req/s")
+
+    await client.close()
+    await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.latency, args.port))
+
+if __name__ == "__main__":
+    main()
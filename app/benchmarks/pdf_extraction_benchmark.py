@@ -0,0 +1,48 @@
+"""
+Benchmark PDF text extraction throughput against the number of worker processes.
+
+Run from the app directory:
+    python -m benchmarks.pdf_extraction_benchmark --pages 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.synthetic_pdf import generate_pdf
+from services.pdf_extracter import extract_page_texts
+
+async def run(pages: int, pages_per_task: int, max_workers: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "synthetic.pdf"
+        generate_pdf(file_path, pages)
+        print(f"Generated {pages}-page PDF ({os.path.getsize(file_path) / 1e6:.1f} MB)")
+        print(f"{'workers':>8} {'seconds':>10} {'pages/sec':>12} {'speedup':>8}")
+
+        baseline = None
+        workers = 1
+        while workers <= max_workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Warm up the worker processes before timing
+                await extract_page_texts(file_path, executor, pages_per_task)
+                start = time.perf_counter()
+                page_texts = await extract_page_texts(file_path, executor, pages_per_task)
+                elapsed = time.perf_counter() - start
+            assert len(page_texts) == pages
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>10.3f} {pages / elapsed:>12.1f} {baseline / elapsed:>7.2f}x")
+            workers *= 2
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--pages-per-task", type=int, default=25)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    asyncio.run(run(args.pages, args.pages_per_task, args.max_workers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Upsert throughput of PineconeService against a local Pinecone stub server.
+
+The previous single-request upsert is compared with size-aware, concurrent
+batches. The stub enforces Pinecone's 2 MB request limit and can fail a share
+of requests to exercise per-batch retries.
+
+Run from the app directory:
+    python -m benchmarks.pinecone_upsert_benchmark --vectors 5000 --latency 0.1 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from config.main import config
+from benchmarks.fake_pinecone import FakePineconeStats, create_fake_pinecone_app
+from benchmarks.fake_openai import start_fake_server
+
+def chunk_vectors(count: int, dimension: int):
+    """Normalized embeddings with chunk-sized text metadata, as produced during ingestion"""
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((count, dimension)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    text = "lorem ipsum dolor sit amet " * 37
+    return [
+        (f"doc.pdf_chunk_{i}", embedding, {"pdf_name": "doc.pdf", "chunk_index": i, "text": text})
+        for i, embedding in enumerate(embeddings)
+    ]
+
+async def run(count: int, dimension: int, latency: float, failure_rate: float, port: int):
+    fake_app = create_fake_pinecone_app(latency=latency, failure_rate=failure_rate)
+    server = await start_fake_server(fake_app, port)
+    config.PINECONE_INDEX_HOST = f"http://127.0.0.1:{port}"
+    from services.pinecone_service import PineconeService
+    service = PineconeService()
+    vectors = chunk_vectors(count, dimension)
+    stats = fake_app.state.stats
+
+    # Previous behaviour: one request holding every vector. It is run on a thread
+    # here only so the in-process stub server can answer it
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(
+            service.index.upsert,
+            vectors=[(vector_id, embedding.tolist(), metadata) for vector_id, embedding, metadata in vectors],
+            show_progress=False
+        )
+        outcome = "ok"
+    except Exception as e:
+        outcome = f"failed ({type(e).__name__})"
+    print(f"single request:  {time.perf_counter() - start:.2f}s, {outcome}")
+
+    # Size-aware batches sent one after another
+    start = time.perf_counter()
+    for batch in service._split_batches([
+        (vector_id, embedding.tolist(), metadata) for vector_id, embedding, metadata in vectors
+    ]):
+        await service._upsert_batch(batch)
+    elapsed = time.perf_counter() - start
+    print(f"sequential:      {elapsed:.2f}s, {count / elapsed:.0f} vectors/s")
+    stats = fake_app.state.stats = FakePineconeStats()
+
+    start = time.perf_counter()
+    await service.upsert(vectors)
+    elapsed = time.perf_counter() - start
+    print(f"concurrent:      {elapsed:.2f}s, {count / elapsed:.0f} vectors/s, "
+          f"{stats.bytes / elapsed / 2**20:.1f} MB/s")
+    print(f"requests:        {stats.upserts} succeeded, {stats.failed} failed and retried, "
+          f"{stats.rejected} rejected as too large")
+    print(f"max in flight:   {stats.max_in_flight}")
+    print(f"stored vectors:  {len(fake_app.state.vectors)}")
+
+    service.executor.shutdown()
+    await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=5000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    asyncio.run(run(args.vectors, args.dimension, args.latency, args.failure_rate, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Measure application cold start: the time to import the app, to run the
+lifespan startup, until /health/ready first answers 200, and the latency of
+the first chat request, with and without background warm-up.
+
+Every run is a fresh interpreter with an empty data directory, the local
+vector store and a fake OpenAI server, so nothing is cached between runs.
+
+Run from the app directory:
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+async def child():
+    """Runs in the measured interpreter and prints its timings as JSON"""
+    start = time.perf_counter()
+    from main import app
+    import httpx
+    timings = {"import": time.perf_counter() - start}
+
+    async with app.router.lifespan_context(app):
+        timings["startup"] = time.perf_counter() - start
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            while (await client.get("/health/ready")).status_code != 200:
+                await asyncio.sleep(0.01)
+            timings["ready"] = time.perf_counter() - start
+            request_start = time.perf_counter()
+            response = await client.post(
+                "/chat/chat-completions", json={"messages": [{"role": "user", "content": "What is the notice period?"}]}
+            )
+            response.raise_for_status()
+            timings["first_request"] = time.perf_counter() - request_start
+    print(json.dumps(timings))
+
+async def measure(warmup: bool, port: int) -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {
+            **os.environ,
+            "DATA_DIR": data_dir,
+            "VECTOR_STORE": "local",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "fake-key",
+            "STARTUP_WARMUP": "true" if warmup else "false",
+        }
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "benchmarks.startup_benchmark", "--child",
+            env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        stdout, _ = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"Benchmark child exited with {process.returncode}")
+        timings = json.loads(stdout.decode().strip().splitlines()[-1])
+        timings["process"] = time.perf_counter() - start
+    return timings
+
+async def run(runs: int, latency: float, port: int):
+    # Imported here so the measured child does not load FastAPI before timing starts
+    from benchmarks.fake_openai import create_fake_openai_app, start_fake_server
+    fake_app = create_fake_openai_app(latency=latency, token_latency=0)
+    server = await start_fake_server(fake_app, port)
+    try:
+        print(f"{runs} cold starts per mode, fake OpenAI latency {latency * 1000:.0f}ms; median seconds")
+        print(f"{'warm-up':>8} {'import':>8} {'startup':>8} {'ready':>8} {'1st req':>8} {'process':>8}")
+        for warmup in (True, False):
+            results = [await measure(warmup, port) for _ in range(runs)]
+            medians = {key: statistics.median(result[key] for result in results) for key in results[0]}
+            print(f"{'on' if warmup else 'off':>8} {medians['import']:>8.3f} {medians['startup']:>8.3f} "
+                  f"{medians['ready']:>8.3f} {medians['first_request']:>8.3f} {medians['process']:>8.3f}")
+    finally:
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8769)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child())
+    else:
+        asyncio.run(run(args.runs, args.latency, args.port))
+
+if __name__ == "__main__":
+    main()
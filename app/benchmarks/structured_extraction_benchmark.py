@@ -0,0 +1,83 @@
+"""
+Compare the plain-text extraction path (sorted page text, cleaned and chunked
+as one stream) with layout-aware extraction (PyMuPDF dict output with
+headings, tables and section-aware chunks) on a synthetic PDF with a heading
+hierarchy and ruled tables.
+
+Every paragraph of the synthetic PDF ends with a "pageN" marker, so the page
+metadata of each structured chunk is checked against the markers it contains.
+
+Run from the app directory:
+    python -m benchmarks.structured_extraction_benchmark --pages 300
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.synthetic_pdf import generate_structured_pdf
+from services.pdf_extracter import iter_page_texts, iter_structured_blocks
+from services.text_processor import TextProcessorService
+from utils.text_cleaning import clean_text
+
+PAGE_MARKER = re.compile(r"\bpage(\d+)\b")
+
+async def plain_chunks(file_path: Path, executor, text_processor: TextProcessorService):
+    async def cleaned_pages():
+        async for page_text in iter_page_texts(file_path, executor):
+            yield clean_text(page_text)
+    return [chunk async for chunk in text_processor.iter_chunks(cleaned_pages())]
+
+async def structured_chunks(file_path: Path, executor, text_processor: TextProcessorService, counts: dict):
+    async def blocks():
+        async for text, block in iter_structured_blocks(file_path, executor):
+            counts[block["kind"]] = counts.get(block["kind"], 0) + 1
+            yield text, block
+    return [chunk async for chunk in text_processor.iter_section_chunks(blocks())]
+
+async def run(pages: int, workers: int):
+    text_processor = TextProcessorService()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = Path(tmp_dir) / "structured.pdf"
+        generate_structured_pdf(file_path, pages)
+        print(f"Generated {pages}-page PDF ({os.path.getsize(file_path) / 1e6:.1f} MB), {workers} workers")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Warm up the worker processes before timing
+            await plain_chunks(file_path, executor, text_processor)
+
+            start = time.perf_counter()
+            plain = await plain_chunks(file_path, executor, text_processor)
+            plain_time = time.perf_counter() - start
+
+            counts = {}
+            start = time.perf_counter()
+            structured = await structured_chunks(file_path, executor, text_processor, counts)
+            structured_time = time.perf_counter() - start
+
+    print(f"{'path':>12} {'seconds':>9} {'pages/sec':>10} {'chunks':>7}")
+    print(f"{'plain text':>12} {plain_time:>9.2f} {pages / plain_time:>10.1f} {len(plain):>7}")
+    print(f"{'structured':>12} {structured_time:>9.2f} {pages / structured_time:>10.1f} {len(structured):>7}")
+    print(f"Blocks: {counts}")
+
+    sections = {metadata["section"] for _, metadata in structured}
+    misattributed = 0
+    for chunk, metadata in structured:
+        marked = {int(page) for page in PAGE_MARKER.findall(chunk)}
+        if any(not metadata["page"] <= page <= metadata["page_end"] for page in marked):
+            misattributed += 1
+    print(f"{len(sections)} sections; {misattributed} of {len(structured)} chunks have a page outside their page range")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    asyncio.run(run(args.pages, args.workers))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Synthetic PDF generation for benchmarks
+"""
+import random
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+WORDS = (
+    "agreement party clause section payment term notice liability warranty "
+    "delivery invoice schedule annex obligation termination confidential "
+    "the of and to in for with on by under shall be is not any"
+).split()
+
+def generate_paragraph(rng: random.Random, sentences: int = 5) -> str:
+    """Generate a paragraph of random sentences"""
+    text = []
+    for _ in range(sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+        text.append(" ".join(words).capitalize() + ".")
+    return " ".join(text)
+
+def generate_pdf(file_path: Path, pages: int, paragraphs_per_page: int = 6, seed: int = 42) -> Path:
+    """
+    Write a PDF with the given number of text pages, each with a heading and
+    several paragraphs of random text
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Section {page_num + 1}", fontsize=16)
+        body = "\n\n".join(generate_paragraph(rng) for _ in range(paragraphs_per_page))
+        page.insert_textbox(fitz.Rect(72, 100, 540, 770), body, fontsize=10)
+    doc.save(str(file_path))
+    doc.close()
+    return file_path
+
+def generate_structured_pdf(file_path: Path, pages: int, paragraphs_per_page: int = 5,
+                            table_every: int = 4, seed: int = 42) -> Path:
+    """
+    Write a PDF with a heading hierarchy: a chapter heading every ten pages, a
+    section heading on every page and a bold subsection heading before the last
+    paragraphs, plus a ruled table every table_every pages. Every paragraph ends
+    with a "pageN" marker word so extracted chunks can be checked against the
+    page they came from
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        y = 60
+        if page_num % 10 == 0:
+            page.insert_text((72, y + 18), f"Chapter {page_num // 10 + 1}", fontsize=20, fontname="hebo")
+            y += 34
+        page.insert_text((72, y + 14), f"Section {page_num + 1}", fontsize=14, fontname="hebo")
+        y += 26
+        for i in range(paragraphs_per_page):
+            if i == paragraphs_per_page - 2:
+                page.insert_text((72, y + 11), f"Subsection {page_num + 1}.1", fontsize=11, fontname="hebo")
+                y += 20
+            body = f"{generate_paragraph(rng, sentences=3)} page{page_num + 1}"
+            rect = fitz.Rect(72, y, 540, y + 90)
+            page.insert_textbox(rect, body, fontsize=10)
+            y += 96
+        if table_every and page_num % table_every == 0:
+            rows, columns, row_height, column_width = 4, 3, 16, 120
+            top = min(y, 780 - rows * row_height)
+            for r in range(rows + 1):
+                page.draw_line((72, top + r * row_height), (72 + columns * column_width, top + r * row_height))
+            for c in range(columns + 1):
+                page.draw_line((72 + c * column_width, top), (72 + c * column_width, top + rows * row_height))
+            for r in range(rows):
+                for c in range(columns):
+                    cell = f"item{r}" if c == 0 else f"{rng.randint(1, 999)}.00"
+                    page.insert_text((76 + c * column_width, top + r * row_height + 12), cell, fontsize=9)
+    doc.save(str(file_path))
+    doc.close()
+    return file_path
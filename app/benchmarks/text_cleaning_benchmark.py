@@ -0,0 +1,98 @@
+"""
+Throughput of PDF text cleaning: the previous seven-pass clean_text versus the
+single-pass engine in utils.text_cleaning, on synthetic page text. Golden
+inputs are checked against their expected output before timing.
+
+Run from the app directory:
+    python -m benchmarks.text_cleaning_benchmark --pages 2000
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+
+from utils.text_cleaning import clean_text
+
+GOLDEN = [
+    # Paragraph breaks survive; wrapped lines and runs of spaces collapse
+    (
+        "First   paragraph line one\nline two.\n\n\n  Second paragraph.  \n \n Third.",
+        "First paragraph line one line two.\n\nSecond paragraph.\n\nThird."
+    ),
+    # URLs and e-mail addresses are removed
+    (
+        "See https://example.com/a?b=1 or www.example.org, mail jane.doe@example.co.uk now.",
+        "See or mail now."
+    ),
+    # Symbols outside the allowed punctuation become spaces
+    (
+        "Price: $100 • 50% off — (limited) [v2] {x}; ok? yes! \"quoted\" 'single' a-b",
+        "Price: 100 50 off (limited) [v2] {x}; ok? yes! \"quoted\" 'single' a-b"
+    ),
+    # Word characters include digits, underscores and non-ASCII letters
+    ("snake_case Größe 42\tcafé\r\nnaïve", "snake_case Größe 42 café naïve"),
+    # Whitespace-only and empty input
+    (" \n\n \t ", ""),
+    ("", ""),
+    # Form feeds and carriage returns count as whitespace inside a paragraph
+    ("page\x0cbreak\r\n\r\nnext", "page break\n\nnext"),
+]
+
+def legacy_clean_text(text: str) -> str:
+    """The previous implementation, which collapsed every newline before normalizing paragraph breaks"""
+    text = re.sub(r'http[s]?://\S+', '', text)
+    text = re.sub(r'www\.\S+', '', text)
+    text = re.sub(r'[\w\.-]+@[\w\.-]+\.\w+', '', text)
+    text = re.sub(r'[^\w\s.,!?;:\'\"\(\)\[\]\{\}\-]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    return text.strip()
+
+def synthetic_pages(count: int, rng: np.random.Generator):
+    """Page text shaped like PyMuPDF output: wrapped lines, blank lines between paragraphs, some noise"""
+    words = np.array([f"word{i}" for i in range(2000)] + ["•", "—", "©", "https://example.com/x", "a@b.com"])
+    pages = []
+    for _ in range(count):
+        paragraphs = []
+        for _ in range(rng.integers(3, 8)):
+            lines = [" ".join(words[rng.integers(0, len(words), 12)]) for _ in range(rng.integers(2, 10))]
+            paragraphs.append("\n".join(f"  {line}  " for line in lines))
+        pages.append("\n \n".join(paragraphs))
+    return pages
+
+def throughput(fn, pages) -> float:
+    """Clean every page and return MB/s of input text"""
+    size = sum(len(page.encode("utf-8")) for page in pages)
+    start = time.perf_counter()
+    for page in pages:
+        fn(page)
+    return size / (time.perf_counter() - start) / 2**20
+
+def run(count: int):
+    for text, expected in GOLDEN:
+        actual = clean_text(text)
+        assert actual == expected, f"clean_text({text!r}) returned {actual!r}, expected {expected!r}"
+    print(f"{len(GOLDEN)} golden outputs match")
+
+    pages = synthetic_pages(count, np.random.default_rng(0))
+    # Apart from paragraph breaks, the words kept are exactly the previous ones
+    for page in pages:
+        assert clean_text(page).split() == legacy_clean_text(page).split()
+    paragraphs = sum(page.count("\n \n") + 1 for page in pages)
+    legacy_paragraphs = sum(len(legacy_clean_text(page).split("\n\n")) for page in pages)
+    new_paragraphs = sum(len(clean_text(page).split("\n\n")) for page in pages)
+    print(f"{count} pages, {paragraphs} paragraphs")
+    print(f"{'engine':>10} {'MB/s':>8} {'paragraphs kept':>16}")
+    print(f"{'legacy':>10} {throughput(legacy_clean_text, pages):>8.1f} {legacy_paragraphs:>16}")
+    print(f"{'engine':>10} {throughput(clean_text, pages):>8.1f} {new_paragraphs:>16}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.pages)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark recall and query latency of the local vector store's flat and IVF modes.
+
+Run from the app directory:
+    python -m benchmarks.vector_store_benchmark --vectors 200000 --dimension 256 --dtype int8
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+
+from services.local_vector_store import LocalVectorStore
+from utils.quantization import VECTOR_DTYPES
+
+def clustered_vectors(count: int, dimension: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Normalized vectors scattered around random cluster centres, like real embeddings"""
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def percentile(values, p: float) -> float:
+    return float(np.percentile(values, p) * 1000)
+
+async def time_queries(store: LocalVectorStore, queries: np.ndarray, top_k: int):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        matches = await store.query(query.tolist(), top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append({match.id for match in matches})
+    return results, latencies
+
+async def run(count: int, dimension: int, num_queries: int, top_k: int, batch_size: int, dtype: str):
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(count, dimension, clusters=max(1, count // 500), rng=rng)
+    queries = clustered_vectors(num_queries, dimension, clusters=max(1, count // 500), rng=rng)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = LocalVectorStore(directory=tmp_dir, dimension=dimension, index_mode="flat", vector_dtype=dtype)
+        start = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            batch = vectors[offset:offset + batch_size]
+            await store.upsert([
+                (f"vec_{offset + i}", vector, {"pdf_name": f"doc_{(offset + i) % 10}.pdf"})
+                for i, vector in enumerate(batch)
+            ])
+        print(f"Inserted {count} x {dimension} vectors in {time.perf_counter() - start:.2f}s")
+
+        exact, flat_latencies = await time_queries(store, queries, top_k)
+
+        store.index_mode = "ivf"
+        start = time.perf_counter()
+        store.train_ivf()
+        print(f"Trained IVF index in {time.perf_counter() - start:.2f}s")
+        approximate, ivf_latencies = await time_queries(store, queries, top_k)
+
+    recall = np.mean([len(e & a) / len(e) for e, a in zip(exact, approximate)])
+    print(f"{'mode':>6} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(top_k):>10}")
+    print(f"{'flat':>6} {percentile(flat_latencies, 50):>8.2f} {percentile(flat_latencies, 95):>8.2f} {1.0:>10.3f}")
+    print(f"{'ivf':>6} {percentile(ivf_latencies, 50):>8.2f} {percentile(ivf_latencies, 95):>8.2f} {recall:>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dtype", choices=VECTOR_DTYPES, default="float32")
+    args = parser.parse_args()
+    asyncio.run(run(args.vectors, args.dimension, args.queries, args.top_k, args.batch_size, args.dtype))
+
+if __name__ == "__main__":
+    main()
@@ -24,5 +24,117 @@ class Config(Base):
         os.getenv("PINECONE_API_KEY") or "pcsk_5ftniJ_F64PBDZE4rGxoqCPjP3sJ5aLkoB2WHW35WqkeY2DEUyq5pf1wik6SsibX55UvyC"
     )
 
+    # Local storage for caches and manifests
+    DATA_DIR: str = os.getenv("DATA_DIR") or "data"
+
+    # OpenAI client settings
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL") or None
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT") or 60.0)
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES") or 3)
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS") or 100)
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY") or 32)
+    # Requests started per minute across embeddings and completions; 0 disables the limit
+    OPENAI_MAX_REQUESTS_PER_MINUTE: int = int(os.getenv("OPENAI_MAX_REQUESTS_PER_MINUTE") or 0)
+
+    # Embedding backend settings
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND") or "openai"  # "openai" or "local"
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL") or "text-embedding-3-small"
+    LOCAL_EMBEDDING_DIMENSION: int = int(os.getenv("LOCAL_EMBEDDING_DIMENSION") or 1024)
+    LOCAL_EMBEDDING_WORKERS: int = int(os.getenv("LOCAL_EMBEDDING_WORKERS") or os.cpu_count() or 1)
+    LOCAL_EMBEDDING_EXECUTOR: str = os.getenv("LOCAL_EMBEDDING_EXECUTOR") or "process"  # "process" or "thread"
+
+    # Embedding batching settings
+    EMBEDDING_BATCH_MAX_TOKENS: int = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS") or 100000)
+    EMBEDDING_BATCH_MAX_INPUTS: int = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS") or 1000)
+    EMBEDDING_MAX_CONCURRENT_BATCHES: int = int(os.getenv("EMBEDDING_MAX_CONCURRENT_BATCHES") or 4)
+
+    # PDF extraction settings
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS") or os.cpu_count() or 1)
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK") or 25)
+    PDF_DETECT_TABLES: bool = (os.getenv("PDF_DETECT_TABLES") or "true").lower() == "true"
+
+    # Chunking settings
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE") or 1000)
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP") or 100)
+    CHUNK_UNIT: str = os.getenv("CHUNK_UNIT") or "characters"  # "characters" or "tokens"
+
+    # Streaming ingestion settings
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE") or 256)
+
+    # Embedding cache settings
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(DATA_DIR, "embedding_cache.db")
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES") or 500000)
+    EMBEDDING_CACHE_DTYPE: str = os.getenv("EMBEDDING_CACHE_DTYPE") or "float32"  # "float32", "float16" or "int8"
+
+    # Document manifest settings
+    MANIFEST_DB_PATH: str = os.getenv("MANIFEST_DB_PATH") or os.path.join(DATA_DIR, "manifests.db")
+    VECTOR_DELETE_BATCH_SIZE: int = int(os.getenv("VECTOR_DELETE_BATCH_SIZE") or 1000)
+
+    # Chunk store settings
+    CHUNK_STORE_PATH: str = os.getenv("CHUNK_STORE_PATH") or os.path.join(DATA_DIR, "chunks.db")
+
+    # Vector store settings
+    VECTOR_STORE: str = os.getenv("VECTOR_STORE") or "pinecone"  # "pinecone" or "local"
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION") or 1536)  # of EMBEDDING_MODEL
+    LOCAL_VECTOR_STORE_DIR: str = os.getenv("LOCAL_VECTOR_STORE_DIR") or os.path.join(DATA_DIR, "vector_store")
+    LOCAL_INDEX_MODE: str = os.getenv("LOCAL_INDEX_MODE") or "flat"  # "flat" or "ivf"
+    LOCAL_VECTOR_DTYPE: str = os.getenv("LOCAL_VECTOR_DTYPE") or "float32"  # "float32", "float16" or "int8"
+    LOCAL_IVF_MIN_VECTORS: int = int(os.getenv("LOCAL_IVF_MIN_VECTORS") or 50000)
+    LOCAL_IVF_NPROBE: int = int(os.getenv("LOCAL_IVF_NPROBE") or 8)
+
+    # Pinecone settings
+    PINECONE_INDEX_HOST: str = os.getenv("PINECONE_INDEX_HOST") or ""  # skips index lookup when set
+    PINECONE_INDEX_CACHE_PATH: str = os.getenv("PINECONE_INDEX_CACHE_PATH") or os.path.join(DATA_DIR, "pinecone_indexes.json")
+    PINECONE_UPSERT_MAX_BYTES: int = int(os.getenv("PINECONE_UPSERT_MAX_BYTES") or 2 * 1024 * 1024)
+    PINECONE_UPSERT_MAX_VECTORS: int = int(os.getenv("PINECONE_UPSERT_MAX_VECTORS") or 1000)
+    PINECONE_UPSERT_CONCURRENCY: int = int(os.getenv("PINECONE_UPSERT_CONCURRENCY") or 8)
+    PINECONE_UPSERT_RETRIES: int = int(os.getenv("PINECONE_UPSERT_RETRIES") or 3)
+
+    # Hybrid lexical search settings
+    HYBRID_SEARCH_ENABLED: bool = (os.getenv("HYBRID_SEARCH_ENABLED") or "true").lower() == "true"
+    BM25_DB_PATH: str = os.getenv("BM25_DB_PATH") or os.path.join(DATA_DIR, "bm25.db")
+    BM25_SEGMENT_SIZE: int = int(os.getenv("BM25_SEGMENT_SIZE") or 4096)
+    HYBRID_CANDIDATES: int = int(os.getenv("HYBRID_CANDIDATES") or 20)
+    RRF_K: int = int(os.getenv("RRF_K") or 60)
+
+    # Reranking settings
+    RERANK_CANDIDATES: int = int(os.getenv("RERANK_CANDIDATES") or 20)
+    RERANK_MMR_LAMBDA: float = float(os.getenv("RERANK_MMR_LAMBDA") or 0.7)
+    RERANK_OVERLAP_WEIGHT: float = float(os.getenv("RERANK_OVERLAP_WEIGHT") or 0.2)
+    RERANK_POSITION_WEIGHT: float = float(os.getenv("RERANK_POSITION_WEIGHT") or 0.05)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET") or 1500)
+
+    # Prompt assembly settings
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET") or 6000)
+    # Newest turns kept verbatim, summary included; never more than the last 5 messages cost
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET") or 1000)
+    SUMMARY_MODEL: str = os.getenv("SUMMARY_MODEL") or "gpt-4o-mini-2024-07-18"
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS") or 300)
+    SUMMARY_CACHE_MAX_ENTRIES: int = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES") or 1000)
+
+    # Chat response cache settings
+    CHAT_CACHE_ENABLED: bool = (os.getenv("CHAT_CACHE_ENABLED") or "true").lower() == "true"
+    CHAT_CACHE_MAX_ENTRIES: int = int(os.getenv("CHAT_CACHE_MAX_ENTRIES") or 1000)
+    CHAT_CACHE_TTL_SECONDS: float = float(os.getenv("CHAT_CACHE_TTL_SECONDS") or 3600)
+    CHAT_CACHE_SIMILARITY_THRESHOLD: float = float(os.getenv("CHAT_CACHE_SIMILARITY_THRESHOLD") or 0.95)
+
+    # Batch chat settings
+    CHAT_BATCH_MAX_QUESTIONS: int = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS") or 200)
+    CHAT_BATCH_CONCURRENCY: int = int(os.getenv("CHAT_BATCH_CONCURRENCY") or 8)  # completions in flight per batch
+
+    # Ingestion job queue settings
+    JOB_DB_PATH: str = os.getenv("JOB_DB_PATH") or os.path.join(DATA_DIR, "jobs.db")
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS") or 2)
+    INGEST_MAX_ATTEMPTS: int = int(os.getenv("INGEST_MAX_ATTEMPTS") or 3)
+
+    # Startup settings
+    STARTUP_WARMUP: bool = (os.getenv("STARTUP_WARMUP") or "true").lower() == "true"
+
+    # Upload settings
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE") or 1024 * 1024)
+    MAX_UPLOAD_FILE_BYTES: int = int(os.getenv("MAX_UPLOAD_FILE_BYTES") or 512 * 1024 * 1024)
+    MAX_UPLOAD_REQUEST_BYTES: int = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES") or 1024 * 1024 * 1024)
+    MAX_UPLOAD_GLOBAL_BYTES: int = int(os.getenv("MAX_UPLOAD_GLOBAL_BYTES") or 4 * 1024 * 1024 * 1024)
+
 config = Config()
    
\ No newline at end of file
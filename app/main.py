@@ -8,11 +8,28 @@ import certifi
 os.environ['SSL_CERT_FILE'] = certifi.where()
 os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from api.router import api_router
+from api.api_v1.endpoints.upload import UploadLimitMiddleware
+from services.container import get_services
+from utils.metrics import MetricsMiddleware
 
-app = FastAPI(title="PDF Analyzer Chatbot", version="1.0", debug=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the ingestion workers and warm the services up in the background,
+    and release shared client connection pools and worker processes on shutdown
+    """
+    services = get_services()
+    await services.start()
+    yield
+    await services.close()
+
+app = FastAPI(title="PDF Analyzer Chatbot", version="1.0", debug=True, lifespan=lifespan)
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.include_router(api_router)
\ No newline at end of file
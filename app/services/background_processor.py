@@ -1,42 +1,169 @@
 from services.embedding_service import EmbeddingService
-from services.pinecone_service import PineconeService
-import logging
-from typing import List, Dict
+from services.vector_store import get_vector_store
+from services.document_manifest import get_manifest_service
+from services.chat_cache import get_chat_cache
+from services.bm25_index import get_bm25_index
+from services.chunk_store import get_chunk_store
+from utils.metrics import INGESTED, STAGE_SECONDS
 import asyncio
+import logging
+import re
+import time
+from config.main import config
+from typing import AsyncIterator, Callable, List, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 class BackgroundProcessor:
-    def __init__(self):
-        self.embedding_service = EmbeddingService()
-        self.pinecone_service = PineconeService()
+    def __init__(self, embedding_service: Optional[EmbeddingService] = None):
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.vector_store = get_vector_store()
+        self.manifest_service = get_manifest_service()
+        self.chat_cache = get_chat_cache()
+        self.bm25_index = get_bm25_index()
+        self.chunk_store = get_chunk_store()
         logger.info("Initialized BackgroundProcessor")
 
+    async def _embed_and_store(self, records: List[Dict], pdf_name: str, metadata: Dict,
+                               progress: Optional[Callable[..., None]] = None):
+        """
+        Create embeddings batch by batch and store each batch in the chunk store,
+        vector store and BM25 index as soon as it is ready. Chunk text is written
+        first so no vector is ever searchable without it.
+        Each record holds the chunk "text", its "chunk_index", its vector "id" and
+        optionally its own vector "metadata"
+        """
+        texts = [record["text"] for record in records]
+        # The embed stage is the time spent waiting for each embedded batch
+        wait_start = time.perf_counter()
+        async for start, embeddings in self.embedding_service.iter_embedding_batches(texts):
+            STAGE_SECONDS.observe(time.perf_counter() - wait_start, "upload", "embed")
+            batch = records[start:start + len(embeddings)]
+            with STAGE_SECONDS.time("upload", "store"):
+                await asyncio.to_thread(
+                    self.chunk_store.put_many,
+                    pdf_name,
+                    [(record["id"], record["chunk_index"], record["text"]) for record in batch]
+                )
+            with STAGE_SECONDS.time("upload", "upsert"):
+                await self.vector_store.store_embeddings(
+                    embeddings=embeddings,
+                    chunks=[record["text"] for record in batch],
+                    pdf_name=pdf_name,
+                    metadata=metadata,
+                    chunk_indices=[record["chunk_index"] for record in batch],
+                    vector_ids=[record["id"] for record in batch],
+                    chunk_metadata=[record.get("metadata", {}) for record in batch]
+                )
+            with STAGE_SECONDS.time("upload", "index"):
+                await asyncio.to_thread(
+                    self.bm25_index.add_documents,
+                    [(record["id"], pdf_name, record["text"]) for record in batch]
+                )
+            INGESTED.inc("chunks", amount=len(batch))
+            if progress:
+                progress(chunks_embedded=len(batch), vectors_upserted=len(batch))
+            wait_start = time.perf_counter()
+
     async def process_chunks(self, chunks: List[str], pdf_name: str, metadata: Dict):
         """Process chunks in background"""
         try:
             logger.info(f"Starting background processing for {pdf_name}")
-            
-            # Extract only the necessary metadata
-            simplified_metadata = {
-                "total_chars": metadata.get("total_chars", 0),
-                "total_words": metadata.get("total_words", 0),
-                "total_paragraphs": metadata.get("total_paragraphs", 0)
-            }
-            
-            # Create embeddings
-            embeddings = await self.embedding_service.create_embeddings(chunks)
-            
-            # Store in Pinecone with simplified metadata
-            await self.pinecone_service.store_embeddings(
-                embeddings=embeddings,
-                chunks=chunks,
-                pdf_name=pdf_name,
-                metadata=simplified_metadata
-            )
+
+            # Document-level stats are not copied onto every vector; chunk text
+            # goes to the chunk store
+            records = [
+                {"id": f"{pdf_name}_chunk_{i}", "text": chunk, "chunk_index": i}
+                for i, chunk in enumerate(chunks)
+            ]
+            await self._embed_and_store(records, pdf_name, {})
+            await asyncio.to_thread(self.bm25_index.flush)
+            self.chat_cache.invalidate_corpus()
             
             logger.info(f"Completed background processing for {pdf_name}")
             return True
         except Exception as e:
             logger.error(f"Error in background processing: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    async def process_chunk_stream(self, chunks: AsyncIterator[Tuple[str, Dict]], pdf_name: str, file_hash: str,
+                                   metadata: Dict = None, progress: Optional[Callable[..., None]] = None):
+        """
+        Embed and store a stream of (text, metadata) chunks in bounded batches of
+        INGEST_BATCH_SIZE. Chunks get vector IDs addressed by their text and
+        metadata, so on re-ingestion only chunks that are new or have moved to
+        another page or section are embedded and upserted, unchanged chunks that
+        shifted position get their new chunk_index, and vectors of chunks that no
+        longer exist are deleted. The first manifest save of a document also
+        deletes vectors left under the positional IDs used before manifests
+        """
+        try:
+            logger.info(f"Starting streaming processing for {pdf_name}")
+            metadata = metadata or {}
+            first_save = await asyncio.to_thread(self.manifest_service.get_document, pdf_name) is None
+            old_chunk_indices = await asyncio.to_thread(self.manifest_service.get_chunk_indices, pdf_name)
+            manifest_chunks = []
+            occurrences = {}
+            moved = {}
+            batch = []
+            stored = 0
+
+            async for chunk, chunk_metadata in chunks:
+                chunk_hash = self.manifest_service.hash_chunk(chunk, chunk_metadata)
+                occurrence = occurrences.get(chunk_hash, 0)
+                occurrences[chunk_hash] = occurrence + 1
+                record = {
+                    "id": self.manifest_service.chunk_vector_id(pdf_name, chunk_hash, occurrence),
+                    "hash": chunk_hash,
+                    "chunk_index": len(manifest_chunks)
+                }
+                manifest_chunks.append(record)
+                if record["id"] in old_chunk_indices:
+                    if old_chunk_indices[record["id"]] != record["chunk_index"]:
+                        moved[record["id"]] = record["chunk_index"]
+                    continue
+
+                batch.append({**record, "text": chunk, "metadata": chunk_metadata})
+                if len(batch) >= config.INGEST_BATCH_SIZE:
+                    await self._embed_and_store(batch, pdf_name, metadata, progress)
+                    stored += len(batch)
+                    batch = []
+            if batch:
+                await self._embed_and_store(batch, pdf_name, metadata, progress)
+                stored += len(batch)
+
+            if moved:
+                await self.vector_store.update_metadata(
+                    {vector_id: {"chunk_index": chunk_index} for vector_id, chunk_index in moved.items()}
+                )
+                await asyncio.to_thread(self.chunk_store.set_chunk_indices, moved)
+
+            new_vector_ids = {record["id"] for record in manifest_chunks}
+            orphaned_ids = sorted(old_chunk_indices.keys() - new_vector_ids)
+            if first_save:
+                positional_id = re.compile(rf"{re.escape(pdf_name)}_chunk_\d+")
+                orphaned_ids += sorted(
+                    vector_id for vector_id in await self.vector_store.list_ids(f"{pdf_name}_chunk_")
+                    if positional_id.fullmatch(vector_id) and vector_id not in new_vector_ids
+                )
+            if orphaned_ids:
+                await self.vector_store.delete_vectors(orphaned_ids)
+                await asyncio.to_thread(self.bm25_index.delete, orphaned_ids)
+                await asyncio.to_thread(self.chunk_store.delete, orphaned_ids)
+            await asyncio.to_thread(self.bm25_index.flush)
+            version = await asyncio.to_thread(self.manifest_service.save, pdf_name, file_hash, manifest_chunks)
+            # Cached answers cite chunk indices, so moved chunks invalidate them too
+            if stored or orphaned_ids or moved:
+                self.chat_cache.invalidate_corpus()
+
+            logger.info(
+                f"Completed streaming processing for {pdf_name} (version {version}): "
+                f"{len(manifest_chunks)} chunks, {stored} upserted, "
+                f"{len(manifest_chunks) - stored} unchanged ({len(moved)} moved), {len(orphaned_ids)} deleted"
+            )
+            cache = self.embedding_service.cache
+            logger.info(f"Embedding cache: {cache.hits} hits, {cache.misses} misses")
+            return True
+        except Exception as e:
+            logger.error(f"Error in streaming processing: {str(e)}")
+            raise
@@ -0,0 +1,321 @@
+import logging
+import math
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from config.main import config
+
+logger = logging.getLogger(__name__)
+
+# Keeps identifiers such as "AB-1234", "4.2.1" and "ISO_9001" as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+INITIAL_CAPACITY = 1024
+# Number of similar-sized segments merged at once, and the segment count that forces a merge
+MERGE_FACTOR = 8
+MAX_SEGMENTS = 64
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """
+    On-disk BM25 inverted index over chunk text. Added chunks are buffered and
+    written as segments of compact posting lists (int32 doc IDs and uint16 term
+    frequencies per term); the newest segments are merged once they reach a
+    similar size, which also drops deleted documents
+    """
+
+    def __init__(self, path: str = config.BM25_DB_PATH, k1: float = 1.2, b: float = 0.75,
+                 segment_size: int = config.BM25_SEGMENT_SIZE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.segment_size = segment_size
+        self.pending_docs: List[Tuple[int, str, str, int]] = []
+        self.pending_postings = defaultdict(lambda: (array("i"), array("H")))
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY,
+                vector_id TEXT UNIQUE NOT NULL,
+                pdf_name TEXT,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS segments (
+                segment INTEGER PRIMARY KEY,
+                doc_count INTEGER NOT NULL,
+                first_doc INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                doc_ids BLOB NOT NULL,
+                tfs BLOB NOT NULL,
+                PRIMARY KEY (term, segment)
+            ) WITHOUT ROWID;
+            CREATE TEMP TABLE IF NOT EXISTS merged_postings (
+                term TEXT NOT NULL,
+                doc_ids BLOB NOT NULL,
+                tfs BLOB NOT NULL
+            );
+        """)
+        self._load()
+        logger.info(f"Initialized BM25Index at {self.path} with {self.doc_count} documents")
+
+    def _load(self):
+        """Load document lengths, liveness and names into memory"""
+        rows = self.conn.execute("SELECT doc_id, vector_id, pdf_name, length FROM docs").fetchall()
+        self.segments = self.conn.execute("SELECT segment, doc_count, first_doc FROM segments ORDER BY segment").fetchall()
+        # Deleted documents keep their postings until their segment is merged, so
+        # their IDs must not be reused: continue after every ID a segment covers
+        self.next_doc_id = max(
+            max((row[0] for row in rows), default=-1) + 1,
+            max((first_doc + doc_count for _, doc_count, first_doc in self.segments), default=0)
+        )
+        capacity = max(self.next_doc_id, INITIAL_CAPACITY)
+        self.lengths = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.pdf_names = np.empty(capacity, dtype=object)
+        self.vector_to_doc: Dict[str, int] = {}
+        for doc_id, vector_id, pdf_name, length in rows:
+            self.vector_to_doc[vector_id] = doc_id
+            self.lengths[doc_id] = length
+            self.alive[doc_id] = True
+            self.pdf_names[doc_id] = pdf_name
+        self.doc_count = len(rows)
+        self.total_length = int(self.lengths[self.alive].sum())
+
+    def _ensure_capacity(self, capacity: int):
+        if capacity <= len(self.lengths):
+            return
+        extra = max(capacity, 2 * len(self.lengths)) - len(self.lengths)
+        self.lengths = np.concatenate([self.lengths, np.zeros(extra, dtype=np.int32)])
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        self.pdf_names = np.concatenate([self.pdf_names, np.empty(extra, dtype=object)])
+
+    def add_documents(self, documents: Iterable[Tuple[str, str, str]]):
+        """
+        Index chunks, replacing any chunks with the same vector ID. Postings are
+        buffered in memory and written as a segment every BM25_SEGMENT_SIZE
+        chunks, on flush() or before the next search
+        Args:
+            documents (Iterable[Tuple[str, str, str]]): (vector_id, pdf_name, text) tuples
+        """
+        with self.lock:
+            documents = list(documents)
+            self._delete([vector_id for vector_id, _, _ in documents if vector_id in self.vector_to_doc])
+
+            self._ensure_capacity(self.next_doc_id + len(documents))
+            for vector_id, pdf_name, text in documents:
+                doc_id = self.next_doc_id
+                self.next_doc_id += 1
+                tokens = tokenize(text)
+                for term, tf in Counter(tokens).items():
+                    doc_ids, tfs = self.pending_postings[term]
+                    doc_ids.append(doc_id)
+                    tfs.append(tf if tf < 65536 else 65535)
+                self.pending_docs.append((doc_id, vector_id, pdf_name, len(tokens)))
+                self.vector_to_doc[vector_id] = doc_id
+                self.lengths[doc_id] = len(tokens)
+                self.alive[doc_id] = True
+                self.pdf_names[doc_id] = pdf_name
+                self.total_length += len(tokens)
+            self.doc_count += len(documents)
+
+            if len(self.pending_docs) >= self.segment_size:
+                self._flush()
+
+    def _flush(self):
+        if not self.pending_docs:
+            return
+        segment = (self.segments[-1][0] + 1) if self.segments else 0
+        first_doc = self.pending_docs[0][0]
+        self.conn.executemany("INSERT INTO docs (doc_id, vector_id, pdf_name, length) VALUES (?, ?, ?, ?)",
+                              self.pending_docs)
+        self.conn.executemany(
+            "INSERT INTO postings (term, segment, doc_ids, tfs) VALUES (?, ?, ?, ?)",
+            [
+                (term, segment, doc_ids.tobytes(), tfs.tobytes())
+                for term, (doc_ids, tfs) in sorted(self.pending_postings.items())
+            ]
+        )
+        self.conn.execute(
+            "INSERT INTO segments (segment, doc_count, first_doc) VALUES (?, ?, ?)",
+            (segment, len(self.pending_docs), first_doc)
+        )
+        self.segments.append((segment, len(self.pending_docs), first_doc))
+        self.pending_docs = []
+        self.pending_postings.clear()
+        self._merge_segments()
+        self.conn.commit()
+
+    def flush(self):
+        """Write buffered chunks to disk as a new segment"""
+        with self.lock:
+            self._flush()
+
+    def _delete(self, vector_ids: List[str]):
+        if not vector_ids:
+            return
+        self._flush()
+        doc_ids = [self.vector_to_doc.pop(vector_id) for vector_id in vector_ids if vector_id in self.vector_to_doc]
+        if not doc_ids:
+            return
+        self.total_length -= int(self.lengths[doc_ids].sum())
+        self.alive[doc_ids] = False
+        self.doc_count -= len(doc_ids)
+        self.conn.executemany("DELETE FROM docs WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+
+    def delete(self, vector_ids: List[str]):
+        """Remove chunks from the index; their postings are dropped at the next merge"""
+        with self.lock:
+            self._delete(vector_ids)
+            self.conn.commit()
+
+    def _merge_segments(self):
+        """
+        Merge the newest MERGE_FACTOR segments once they are of similar size, so a
+        chunk is rewritten only a logarithmic number of times as the index grows
+        and queries read few posting lists per term
+        """
+        while len(self.segments) >= MERGE_FACTOR:
+            tail = self.segments[-MERGE_FACTOR:]
+            counts = [doc_count for _, doc_count, _ in tail]
+            if max(counts) >= MERGE_FACTOR * min(counts) and len(self.segments) <= MAX_SEGMENTS:
+                return
+            self._merge(tail)
+            self.segments[-MERGE_FACTOR:] = [(tail[0][0], sum(counts), tail[0][2])]
+
+    def _merge(self, segments: List[Tuple[int, int, int]]):
+        """Rewrite adjacent segments as one, dropping postings of deleted documents"""
+        ids = [segment for segment, _, _ in segments]
+        first_doc = segments[0][2]
+        # Segments cover contiguous doc ID ranges, so without deletions in the
+        # range the merged posting list is the concatenation of the blobs
+        has_deletions = not self.alive[first_doc:self.next_doc_id].all()
+        placeholders = ",".join("?" * len(ids))
+        cursor = self.conn.execute(
+            f"SELECT term, doc_ids, tfs FROM postings WHERE segment IN ({placeholders}) ORDER BY term, segment",
+            ids
+        )
+        current_term, id_blobs, tf_blobs = None, [], []
+        merged = []
+
+        def flush():
+            if not has_deletions:
+                merged.append((current_term, b"".join(id_blobs), b"".join(tf_blobs)))
+                return
+            doc_ids = np.frombuffer(b"".join(id_blobs), dtype=np.int32)
+            keep = self.alive[doc_ids]
+            if keep.any():
+                tfs = np.frombuffer(b"".join(tf_blobs), dtype=np.uint16)
+                merged.append((current_term, doc_ids[keep].tobytes(), tfs[keep].tobytes()))
+
+        for term, ids_blob, tfs_blob in cursor:
+            if term != current_term and current_term is not None:
+                flush()
+                id_blobs, tf_blobs = [], []
+                if len(merged) >= 10000:
+                    self.conn.executemany("INSERT INTO merged_postings VALUES (?, ?, ?)", merged)
+                    merged = []
+            current_term = term
+            id_blobs.append(ids_blob)
+            tf_blobs.append(tfs_blob)
+        if current_term is not None:
+            flush()
+        self.conn.executemany("INSERT INTO merged_postings VALUES (?, ?, ?)", merged)
+
+        self.conn.execute(f"DELETE FROM postings WHERE segment IN ({placeholders})", ids)
+        self.conn.execute(
+            "INSERT INTO postings (term, segment, doc_ids, tfs) SELECT term, ?, doc_ids, tfs FROM merged_postings",
+            (ids[0],)
+        )
+        self.conn.execute("DELETE FROM merged_postings")
+        self.conn.execute(f"DELETE FROM segments WHERE segment IN ({placeholders[2:]})", ids[1:])
+        self.conn.execute(
+            "UPDATE segments SET doc_count = ? WHERE segment = ?",
+            (sum(doc_count for _, doc_count, _ in segments), ids[0])
+        )
+
+    def search(self, query: str, top_k: int, pdf_name: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Score chunks against the query with BM25
+        Returns:
+            List[Tuple[str, float]]: (vector_id, score) pairs ordered by descending score
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or top_k <= 0:
+            return []
+        with self.lock:
+            self._flush()
+            if self.doc_count == 0:
+                return []
+            avg_length = self.total_length / self.doc_count
+            rows = self.conn.execute(
+                f"SELECT term, doc_ids, tfs FROM postings WHERE term IN ({','.join('?' * len(terms))})",
+                terms
+            ).fetchall()
+
+            by_term = defaultdict(lambda: ([], []))
+            for term, ids_blob, tfs_blob in rows:
+                by_term[term][0].append(np.frombuffer(ids_blob, dtype=np.int32))
+                by_term[term][1].append(np.frombuffer(tfs_blob, dtype=np.uint16))
+
+            all_ids, all_scores = [], []
+            for doc_ids, tfs in by_term.values():
+                ids = np.concatenate(doc_ids)
+                freqs = np.concatenate(tfs).astype(np.float32)
+                keep = self.alive[ids]
+                if pdf_name is not None:
+                    keep &= self.pdf_names[ids] == pdf_name
+                ids, freqs = ids[keep], freqs[keep]
+                if len(ids) == 0:
+                    continue
+                df = len(ids)
+                idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[ids] / avg_length)
+                all_ids.append(ids)
+                all_scores.append(idf * freqs * (self.k1 + 1) / (freqs + norm))
+            if not all_ids:
+                return []
+
+            unique_ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+            totals = np.bincount(inverse, weights=np.concatenate(all_scores))
+            k = min(top_k, len(unique_ids))
+            top = np.argpartition(-totals, k - 1)[:k]
+            top = top[np.argsort(-totals[top])]
+            top_doc_ids = [int(doc_id) for doc_id in unique_ids[top]]
+            vector_ids = dict(self.conn.execute(
+                f"SELECT doc_id, vector_id FROM docs WHERE doc_id IN ({','.join('?' * len(top_doc_ids))})",
+                top_doc_ids
+            ).fetchall())
+        return [(vector_ids[doc_id], float(score)) for doc_id, score in zip(top_doc_ids, totals[top])]
+
+_bm25_index: Optional[BM25Index] = None
+
+def get_bm25_index() -> BM25Index:
+    """
+    Return the process-wide BM25 index, creating it on first use. Each embedding
+    model gets its own index, like its vector index
+    """
+    # embedding_backends imports this module's tokenizer
+    from services.embedding_backends import get_embedding_backend
+    from services.vector_store import model_store_path
+    global _bm25_index
+    if _bm25_index is None:
+        _bm25_index = BM25Index(model_store_path(config.BM25_DB_PATH, get_embedding_backend().name))
+    return _bm25_index
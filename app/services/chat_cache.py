@@ -0,0 +1,156 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from config.main import config
+from utils.hashing import sha256_text
+
+logger = logging.getLogger(__name__)
+
+class ChatResponseCache:
+    """
+    Two-tier in-memory cache of chat answers: an exact tier keyed on the
+    normalized query and a semantic tier that reuses an answer when a new
+    query embedding is within a cosine threshold of a cached one. Both tiers
+    only match answers given in the same context, the earlier turns of the
+    conversation and the generation parameters, so a follow-up such as "why?"
+    is never answered from another conversation. Entries
+    expire after a TTL and the least recently used are evicted when full. The
+    context also includes a corpus version that every ingestion bumps, since
+    new or changed content may answer any cached question differently
+    """
+
+    def __init__(self, max_entries: int = config.CHAT_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = config.CHAT_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = config.CHAT_CACHE_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self._matrix_contexts = None
+        self.corpus_version = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        logger.info(
+            f"Initialized ChatResponseCache (max entries: {max_entries}, ttl: {ttl_seconds}s, "
+            f"threshold: {similarity_threshold})"
+        )
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Lower-case the query and collapse whitespace"""
+        return " ".join(query.lower().split())
+
+    def context_key(self, history: List[Dict[str, str]], max_tokens: int, temperature: float) -> str:
+        """
+        Hash the conversation turns before the query, the generation parameters and
+        the corpus version. Taken before retrieval, so an answer retrieved from the
+        corpus as it was before an ingestion is cached under a context no later
+        lookup uses
+        """
+        return sha256_text(json.dumps(
+            {"history": [[turn["role"], turn["content"]] for turn in history],
+             "max_tokens": max_tokens, "temperature": temperature, "corpus_version": self.corpus_version},
+            ensure_ascii=False
+        ))
+
+    def _key(self, query: str, context: str) -> str:
+        return sha256_text(f"{context}\n{self.normalize_query(query)}")
+
+    def _remove(self, key: str):
+        if self.entries.pop(key, None) is not None:
+            self._matrix = None
+
+    def _hit(self, key: str) -> Optional[Dict]:
+        """Return a live entry, refreshing its LRU position, or drop it if expired"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] < time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def get_exact(self, query: str, context: str) -> Optional[Dict]:
+        """Look up an answer for the same normalized query in the same context"""
+        entry = self._hit(self._key(query, context))
+        if entry is not None:
+            self.exact_hits += 1
+        return entry
+
+    def get_semantic(self, embedding: List[float], context: str) -> Optional[Dict]:
+        """Look up an answer for the most similar live cached query in the same context above the threshold"""
+        if self.entries:
+            if self._matrix is None:
+                self._matrix_keys = list(self.entries)
+                self._matrix = np.asarray([self.entries[key]["embedding"] for key in self._matrix_keys])
+                self._matrix_contexts = np.asarray([self.entries[key]["context"] for key in self._matrix_keys])
+            scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+            # Expired entries would hide a live match ranked below them
+            expires_at = np.fromiter((self.entries[key]["expires_at"] for key in self._matrix_keys),
+                                     dtype=np.float64, count=len(self._matrix_keys))
+            scores[(self._matrix_contexts != context) | (expires_at < time.monotonic())] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] >= self.similarity_threshold:
+                entry = self._hit(self._matrix_keys[best])
+                if entry is not None:
+                    self.semantic_hits += 1
+                    logger.info(f"Semantic cache hit (similarity {scores[best]:.3f})")
+                    return entry
+        self.misses += 1
+        return None
+
+    def put(self, query: str, context: str, embedding: List[float], answer: str, sources: List[Dict]):
+        """Cache an answer given in a context along with its sources"""
+        key = self._key(query, context)
+        self._remove(key)
+        self.entries[key] = {
+            "answer": answer,
+            "sources": sources,
+            "context": context,
+            "embedding": np.asarray(embedding, dtype=np.float32),
+            "expires_at": time.monotonic() + self.ttl_seconds
+        }
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._matrix = None
+
+    def invalidate_corpus(self):
+        """
+        Bump the corpus version after an ingestion changed the stored vectors and
+        drop every cached answer, since retrieval may now pick other chunks
+        """
+        self.corpus_version += 1
+        stale = len(self.entries)
+        self.entries.clear()
+        self._matrix = None
+        if stale:
+            logger.info(f"Invalidated {stale} cached answers (corpus version {self.corpus_version})")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit counts and the overall hit rate since startup"""
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self.entries)
+        }
+
+_chat_cache: Optional[ChatResponseCache] = None
+
+def get_chat_cache() -> ChatResponseCache:
+    """Return the process-wide chat response cache, creating it on first use"""
+    global _chat_cache
+    if _chat_cache is None:
+        _chat_cache = ChatResponseCache()
+    return _chat_cache
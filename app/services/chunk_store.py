@@ -0,0 +1,92 @@
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config.main import config
+from services.embedding_backends import get_embedding_backend
+from services.vector_store import model_store_path
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 500
+
+class ChunkStore:
+    """
+    SQLite store of chunk text keyed by vector ID, so vectors only carry IDs and
+    small filterable fields and retrieved chunks are looked up locally
+    """
+
+    def __init__(self, path: str = config.CHUNK_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                vector_id TEXT PRIMARY KEY,
+                pdf_name TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                text TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_chunks_pdf_name ON chunks (pdf_name);
+        """)
+        self.conn.commit()
+        logger.info(f"Initialized ChunkStore at {self.path}")
+
+    def put_many(self, pdf_name: str, chunks: List[Tuple[str, int, str]]):
+        """Insert or overwrite (vector_id, chunk_index, text) entries for a document"""
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (vector_id, pdf_name, chunk_index, text) VALUES (?, ?, ?, ?)",
+                [(vector_id, pdf_name, chunk_index, text) for vector_id, chunk_index, text in chunks]
+            )
+            self.conn.commit()
+
+    def set_chunk_indices(self, chunk_indices: Dict[str, int]):
+        """Update the chunk index of existing entries, keyed by vector ID"""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE chunks SET chunk_index = ? WHERE vector_id = ?",
+                [(chunk_index, vector_id) for vector_id, chunk_index in chunk_indices.items()]
+            )
+            self.conn.commit()
+
+    def get_many(self, vector_ids: List[str]) -> Dict[str, str]:
+        """Return the text of each known vector ID; unknown IDs are left out"""
+        found = {}
+        with self.lock:
+            for i in range(0, len(vector_ids), SQLITE_BATCH_SIZE):
+                batch = vector_ids[i:i + SQLITE_BATCH_SIZE]
+                found.update(self.conn.execute(
+                    f"SELECT vector_id, text FROM chunks WHERE vector_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall())
+        return found
+
+    def delete(self, vector_ids: List[str]):
+        """Remove chunks by vector ID"""
+        with self.lock:
+            for i in range(0, len(vector_ids), SQLITE_BATCH_SIZE):
+                batch = vector_ids[i:i + SQLITE_BATCH_SIZE]
+                self.conn.execute(
+                    f"DELETE FROM chunks WHERE vector_id IN ({','.join('?' * len(batch))})", batch
+                )
+            self.conn.commit()
+
+_chunk_store: Optional[ChunkStore] = None
+
+def get_chunk_store() -> ChunkStore:
+    """
+    Return the process-wide chunk store, creating it on first use. Each embedding
+    model gets its own store, like its vector index, so deleting one model's
+    orphaned chunks never removes text another model's index still returns
+    """
+    global _chunk_store
+    if _chunk_store is None:
+        _chunk_store = ChunkStore(model_store_path(config.CHUNK_STORE_PATH, get_embedding_backend().name))
+    return _chunk_store
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from config.main import config
+from services.background_processor import BackgroundProcessor
+from services.bm25_index import BM25Index, get_bm25_index
+from services.chat_cache import ChatResponseCache, get_chat_cache
+from services.chunk_store import ChunkStore, get_chunk_store
+from services.document_manifest import DocumentManifestService, get_manifest_service
+from services.embedding_backends import EmbeddingBackend, close_embedding_backend, get_embedding_backend
+from services.embedding_service import EmbeddingService
+from services.hybrid_search import HybridSearchService
+from services.job_queue import IngestionJobQueue, get_job_queue
+from services.openai_client import OpenAIClientService, close_openai_client, get_openai_client
+from services.pdf_extracter import PDFExtractorService, shutdown_process_pool
+from services.prompt_builder import PromptBuilderService
+from services.reranker import RerankerService
+from services.text_processor import TextProcessorService
+from services.vector_store import VectorStore, close_vector_store, get_vector_store
+from utils.metrics import REGISTRY, CallbackMetric
+
+logger = logging.getLogger(__name__)
+
+# Services a request needs before the application can serve chat and uploads
+READINESS_COMPONENTS = ("embedding_backend", "vector_store", "bm25_index", "chunk_store", "manifest", "chat_cache")
+# Services whose constructors fetch other process-wide services themselves. Those
+# are built first, each under its own lock, so none is created twice by builds
+# running in different threads
+DEPENDENCIES = {
+    "embedding_backend": ("openai_client",),
+    "vector_store": ("embedding_backend",),
+    "manifest": ("embedding_backend",),
+    "bm25_index": ("embedding_backend",),
+    "chunk_store": ("embedding_backend",),
+    "prompt_builder": ("openai_client",),
+    "background_processor": ("embedding_service", "vector_store", "manifest", "chat_cache", "bm25_index", "chunk_store"),
+}
+
+class ServiceContainer:
+    """
+    Holds the application's services and builds each one once, on first use, so
+    importing the API does no I/O and a service that cannot start (for example
+    Pinecone without network) only fails the requests that need it. Request
+    paths use get(), which builds a missing service in a thread so the event
+    loop never waits on a build. The application lifespan starts the ingestion
+    workers, warms the services up in the background and closes whatever was
+    built on shutdown
+    """
+
+    def __init__(self):
+        # Each service is built under its own lock, so a slow build such as
+        # Pinecone's does not hold up the others; this lock only guards the locks
+        self.lock = threading.Lock()
+        self.locks: Dict[str, threading.Lock] = {}
+        self.services: Dict[str, object] = {}
+        self.warmup_task: Optional[asyncio.Task] = None
+
+    def _get(self, name: str, factory: Callable[[], object]):
+        """Return a built service, building it under its lock if needed"""
+        service = self.services.get(name)
+        if service is None:
+            for dependency in DEPENDENCIES.get(name, ()):
+                getattr(self, dependency)
+            with self.lock:
+                lock = self.locks.setdefault(name, threading.Lock())
+            with lock:
+                service = self.services.get(name)
+                if service is None:
+                    start = time.perf_counter()
+                    try:
+                        service = factory()
+                    except Exception as e:
+                        logger.error(f"Error building {name}: {str(e)}")
+                        raise
+                    self.services[name] = service
+                    logger.info(f"Built {name} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return service
+
+    async def get(self, name: str):
+        """
+        Return a service by name from a request path. One that is not built yet
+        is built in a thread, since building may do network or disk I/O
+        """
+        service = self.services.get(name)
+        if service is not None:
+            return service
+        return await asyncio.to_thread(getattr, self, name)
+
+    @property
+    def openai_client(self) -> OpenAIClientService:
+        return self._get("openai_client", get_openai_client)
+
+    @property
+    def embedding_backend(self) -> EmbeddingBackend:
+        return self._get("embedding_backend", get_embedding_backend)
+
+    @property
+    def embedding_service(self) -> EmbeddingService:
+        return self._get("embedding_service", lambda: EmbeddingService(self.embedding_backend))
+
+    @property
+    def vector_store(self) -> VectorStore:
+        return self._get("vector_store", get_vector_store)
+
+    @property
+    def bm25_index(self) -> BM25Index:
+        return self._get("bm25_index", get_bm25_index)
+
+    @property
+    def chunk_store(self) -> ChunkStore:
+        return self._get("chunk_store", get_chunk_store)
+
+    @property
+    def manifest(self) -> DocumentManifestService:
+        return self._get("manifest", get_manifest_service)
+
+    @property
+    def chat_cache(self) -> ChatResponseCache:
+        return self._get("chat_cache", get_chat_cache)
+
+    @property
+    def job_queue(self) -> IngestionJobQueue:
+        return self._get("job_queue", get_job_queue)
+
+    @property
+    def hybrid_search(self) -> HybridSearchService:
+        return self._get("hybrid_search", lambda: HybridSearchService(self.vector_store, self.bm25_index))
+
+    @property
+    def reranker(self) -> RerankerService:
+        return self._get("reranker", RerankerService)
+
+    @property
+    def prompt_builder(self) -> PromptBuilderService:
+        return self._get("prompt_builder", PromptBuilderService)
+
+    @property
+    def text_processor(self) -> TextProcessorService:
+        return self._get("text_processor", TextProcessorService)
+
+    @property
+    def background_processor(self) -> BackgroundProcessor:
+        return self._get("background_processor", lambda: BackgroundProcessor(self.embedding_service))
+
+    @property
+    def pdf_service(self) -> PDFExtractorService:
+        return self._get(
+            "pdf_service",
+            lambda: PDFExtractorService(self.text_processor, self.background_processor, self.job_queue)
+        )
+
+    async def _run_ingestion_job(self, job: Dict, progress: Callable[..., None]):
+        # Building the ingestion services may reach the vector store over the network
+        pdf_service = await self.get("pdf_service")
+        await pdf_service.run_ingestion_job(job, progress)
+
+    async def warm_up(self):
+        """Build the services requests need, off the event loop, so the first request does not pay for it"""
+        start = time.perf_counter()
+        for name in (*READINESS_COMPONENTS, "openai_client", "hybrid_search", "reranker",
+                     "prompt_builder", "background_processor", "pdf_service"):
+            try:
+                await self.get(name)
+            except Exception as e:
+                logger.warning(f"Warm-up of {name} failed ({str(e)}), it will be retried on first use")
+        logger.info(f"Warmed up services in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    async def readiness(self) -> Dict[str, str]:
+        """
+        Check the services requests depend on, building any that are missing
+        Returns:
+            Dict[str, str]: "ok" or the build error for each component, plus
+            "job_queue" telling whether the ingestion workers are running
+        """
+        components = {}
+        for name in READINESS_COMPONENTS:
+            try:
+                await self.get(name)
+                components[name] = "ok"
+            except Exception as e:
+                components[name] = str(e)
+        components["job_queue"] = "ok" if self.job_queue.running else "stopped"
+        return components
+
+    def _cache_lookups(self) -> Dict[Tuple[str, str], float]:
+        # Only the in-memory counters; stats() would also count the cache's rows
+        lookups = {}
+        if "embedding_service" in self.services:
+            cache = self.embedding_service.cache
+            lookups[("embedding", "hit")] = cache.hits
+            lookups[("embedding", "miss")] = cache.misses
+        if "chat_cache" in self.services:
+            cache = self.chat_cache
+            lookups[("chat", "exact_hit")] = cache.exact_hits
+            lookups[("chat", "semantic_hit")] = cache.semantic_hits
+            lookups[("chat", "miss")] = cache.misses
+        return lookups
+
+    def register_metrics(self):
+        """
+        Export queue depths and cache hit counts, read from the services when
+        /metrics is scraped, which renders off the event loop since the queue
+        depths come from SQLite. Services that were never built are left out
+        """
+        REGISTRY.register(CallbackMetric(
+            "pdfchat_ingest_jobs", "Ingestion jobs by status", "gauge", ("status",),
+            lambda: {(status,): count for status, count in self.job_queue.queue_depth().items()}
+            if "job_queue" in self.services else {}
+        ))
+        REGISTRY.register(CallbackMetric(
+            "pdfchat_cache_lookups_total", "Cache lookups by cache and result", "counter", ("cache", "result"),
+            self._cache_lookups
+        ))
+
+    async def start(self):
+        """Start the ingestion workers and, if STARTUP_WARMUP is set, warm the services up in the background"""
+        self.register_metrics()
+        self.job_queue.handler = self._run_ingestion_job
+        await self.job_queue.start()
+        if config.STARTUP_WARMUP:
+            self.warmup_task = asyncio.create_task(self.warm_up())
+
+    async def close(self):
+        """Stop the workers and release the pools and connections of every service that was built"""
+        if self.warmup_task is not None:
+            self.warmup_task.cancel()
+            await asyncio.gather(self.warmup_task, return_exceptions=True)
+        if "job_queue" in self.services:
+            await self.job_queue.stop()
+        await close_vector_store()
+        await close_embedding_backend()
+        await close_openai_client()
+        shutdown_process_pool()
+        self.services.clear()
+
+_services: Optional[ServiceContainer] = None
+
+def get_services() -> ServiceContainer:
+    """Return the process-wide service container; building it does not build any service"""
+    global _services
+    if _services is None:
+        _services = ServiceContainer()
+    return _services
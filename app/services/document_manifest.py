@@ -0,0 +1,162 @@
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.main import config
+from services.embedding_backends import get_embedding_backend
+from utils.hashing import sha256_text
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        pdf_name TEXT NOT NULL,
+        embedding_model TEXT NOT NULL,
+        file_hash TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        chunk_count INTEGER NOT NULL,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (pdf_name, embedding_model)
+    );
+    CREATE TABLE IF NOT EXISTS document_chunks (
+        pdf_name TEXT NOT NULL,
+        embedding_model TEXT NOT NULL,
+        vector_id TEXT NOT NULL,
+        chunk_hash TEXT NOT NULL,
+        chunk_index INTEGER NOT NULL,
+        PRIMARY KEY (pdf_name, embedding_model, vector_id)
+    );
+"""
+
+class DocumentManifestService:
+    """
+    SQLite-backed manifest of ingested documents: file hash, version, embedding
+    model and the hash and vector ID of every chunk, used to diff re-uploads.
+    Manifests are kept per document and embedding model: documents ingested
+    with another model read as not ingested, so switching models re-embeds them
+    into the new model's index without touching the other model's manifest
+    """
+
+    def __init__(self, path: str = config.MANIFEST_DB_PATH, embedding_model: str = config.EMBEDDING_MODEL):
+        self.path = Path(path)
+        self.embedding_model = embedding_model
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Column name -> position in the primary key, 0 for other columns
+        columns = {row[1]: row[5] for row in self.conn.execute("PRAGMA table_info(documents)")}
+        if columns and not columns.get("embedding_model"):
+            self._migrate("embedding_model" in columns)
+        else:
+            self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        logger.info(f"Initialized DocumentManifestService at {self.path} (embedding model: {embedding_model})")
+
+    def _migrate(self, has_model: bool):
+        """Rekey manifests written when they were kept per document only"""
+        # Documents ingested before embedding backends were pluggable used the OpenAI model
+        model = "embedding_model" if has_model else "'text-embedding-3-small'"
+        self.conn.executescript(f"""
+            ALTER TABLE documents RENAME TO documents_old;
+            ALTER TABLE document_chunks RENAME TO document_chunks_old;
+            {SCHEMA}
+            INSERT INTO documents (pdf_name, embedding_model, file_hash, version, chunk_count, updated_at)
+                SELECT pdf_name, {model}, file_hash, version, chunk_count, updated_at FROM documents_old;
+            INSERT INTO document_chunks (pdf_name, embedding_model, vector_id, chunk_hash, chunk_index)
+                SELECT pdf_name, {model}, vector_id, chunk_hash, chunk_index
+                FROM document_chunks_old JOIN documents_old USING (pdf_name);
+            DROP TABLE documents_old;
+            DROP TABLE document_chunks_old;
+        """)
+        logger.info(f"Migrated manifests at {self.path} to per-model keys")
+
+    @staticmethod
+    def chunk_vector_id(pdf_name: str, chunk_hash: str, occurrence: int = 0) -> str:
+        """
+        Build a content-addressed vector ID for a chunk. Repeated chunks within a
+        document get an occurrence suffix so every ID stays unique
+        """
+        vector_id = f"{pdf_name}_chunk_{chunk_hash[:16]}"
+        return f"{vector_id}_{occurrence}" if occurrence else vector_id
+
+    @staticmethod
+    def hash_chunk(chunk: str, metadata: Optional[Dict] = None) -> str:
+        """Hash a chunk's text, together with its metadata if it has any"""
+        if metadata:
+            return sha256_text(f"{json.dumps(metadata, sort_keys=True)}\n{chunk}")
+        return sha256_text(chunk)
+
+    def get_document(self, pdf_name: str) -> Optional[Dict]:
+        """Return the manifest entry for a document, or None if it was never ingested with this embedding model"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file_hash, version, chunk_count, updated_at FROM documents "
+                "WHERE pdf_name = ? AND embedding_model = ?",
+                (pdf_name, self.embedding_model)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "pdf_name": pdf_name,
+            "file_hash": row[0],
+            "version": row[1],
+            "chunk_count": row[2],
+            "updated_at": row[3]
+        }
+
+    def get_chunk_indices(self, pdf_name: str) -> Dict[str, int]:
+        """Return the chunk index of each vector currently stored for a document in this embedding model's index"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT vector_id, chunk_index FROM document_chunks WHERE pdf_name = ? AND embedding_model = ?",
+                (pdf_name, self.embedding_model)
+            ).fetchall()
+        return dict(rows)
+
+    def save(self, pdf_name: str, file_hash: str, chunks: List[Dict]) -> int:
+        """
+        Replace a document's manifest for this embedding model with a new version
+        Args:
+            pdf_name (str): Document name
+            file_hash (str): Hash of the uploaded file
+            chunks (List[Dict]): Chunk entries with "id", "hash" and "chunk_index"
+        Returns:
+            int: The new version number
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT version FROM documents WHERE pdf_name = ? AND embedding_model = ?",
+                (pdf_name, self.embedding_model)
+            ).fetchone()
+            version = (row[0] if row else 0) + 1
+            self.conn.execute(
+                "DELETE FROM document_chunks WHERE pdf_name = ? AND embedding_model = ?",
+                (pdf_name, self.embedding_model)
+            )
+            self.conn.executemany(
+                "INSERT INTO document_chunks (pdf_name, embedding_model, vector_id, chunk_hash, chunk_index) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(pdf_name, self.embedding_model, chunk["id"], chunk["hash"], chunk["chunk_index"]) for chunk in chunks]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(pdf_name, embedding_model, file_hash, version, chunk_count, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (pdf_name, self.embedding_model, file_hash, version, len(chunks), datetime.utcnow().isoformat())
+            )
+            self.conn.commit()
+        logger.info(f"Saved manifest for {pdf_name}: version {version}, {len(chunks)} chunks")
+        return version
+
+_manifest_service: Optional[DocumentManifestService] = None
+
+def get_manifest_service() -> DocumentManifestService:
+    """Return the process-wide document manifest, creating it on first use"""
+    global _manifest_service
+    if _manifest_service is None:
+        _manifest_service = DocumentManifestService(embedding_model=get_embedding_backend().name)
+    return _manifest_service
@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import logging
+import math
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from config.main import config
+from services.bm25_index import tokenize
+from services.openai_client import get_openai_client
+from utils.quantization import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+# Weight of a word bigram relative to a single word in the hashing backend
+BIGRAM_WEIGHT = 0.5
+# Texts per pool task; smaller batches are embedded on a single thread
+LOCAL_EMBEDDING_TASK_SIZE = 64
+
+class EmbeddingBackend(ABC):
+    """
+    A source of normalized float32 embeddings. name identifies the model in the
+    embedding cache, document manifests and vector indexes, so embeddings from
+    different backends are never mixed
+    """
+    name: str
+    dimension: int
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a normalized (len(texts), dimension) float32 matrix"""
+
+    async def close(self):
+        """Release any workers or connections held by the backend"""
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI API"""
+
+    def __init__(self, model: str = config.EMBEDDING_MODEL, dimension: int = config.EMBEDDING_DIMENSION):
+        self.client = get_openai_client()
+        self.name = model
+        self.dimension = dimension
+
+    @staticmethod
+    def _decode_embeddings(response) -> np.ndarray:
+        """
+        Read an embeddings response into one normalized float32 matrix. Embeddings
+        are requested base64-encoded, so they are decoded straight from their raw
+        float32 bytes without building Python float lists
+        """
+        data = sorted(response.data, key=lambda item: item.index)
+        matrix = np.empty((len(data), 0), dtype=np.float32)
+        for i, item in enumerate(data):
+            if isinstance(item.embedding, str):
+                row = np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32)
+            else:
+                row = np.asarray(item.embedding, dtype=np.float32)
+            if i == 0:
+                matrix = np.empty((len(data), len(row)), dtype=np.float32)
+            matrix[i] = row
+        return normalize_rows(matrix)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Request embeddings for a batch. Transient failures are retried by the SDK
+        (OPENAI_MAX_RETRIES); other errors, such as an invalid input, fail at once
+        """
+        response = await self.client.create_embeddings(
+            model=self.name,
+            input=texts,
+            encoding_format="base64"
+        )
+        return self._decode_embeddings(response)
+
+def _feature(token: str, dimension: int, cache: Dict[str, Tuple[int, float]]) -> Tuple[int, float]:
+    """Hash a feature to a bucket and a +1/-1 sign with CRC32, which is stable across processes"""
+    feature = cache.get(token)
+    if feature is None:
+        digest = zlib.crc32(token.encode("utf-8"))
+        feature = cache[token] = (digest % dimension, 1.0 if digest & 0x80000000 else -1.0)
+    return feature
+
+def hash_embed(texts: List[str], dimension: int) -> np.ndarray:
+    """
+    Embed texts by signed feature hashing of their words and word bigrams, with
+    log-scaled term frequencies, into a normalized float32 matrix. Runs in pool
+    workers, so it only depends on its arguments
+    """
+    cache: Dict[str, Tuple[int, float]] = {}
+    cells = []
+    weights = []
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        offset = row * dimension
+        for token in tokens:
+            bucket, sign = _feature(token, dimension, cache)
+            cells.append(offset + bucket)
+            weights.append(sign)
+        for first, second in zip(tokens, tokens[1:]):
+            bucket, sign = _feature(f"{first} {second}", dimension, cache)
+            cells.append(offset + bucket)
+            weights.append(sign * BIGRAM_WEIGHT)
+    counts = np.bincount(
+        np.asarray(cells, dtype=np.int64), weights=np.asarray(weights, dtype=np.float64),
+        minlength=len(texts) * dimension
+    ).reshape(len(texts), dimension)
+    matrix = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+    return normalize_rows(matrix)
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    CPU-only embeddings that need no model or network: words and word bigrams
+    are hashed into a fixed number of dimensions. Large batches are split
+    across a thread or process pool
+    """
+
+    def __init__(self, dimension: int = config.LOCAL_EMBEDDING_DIMENSION,
+                 workers: int = config.LOCAL_EMBEDDING_WORKERS,
+                 executor: str = config.LOCAL_EMBEDDING_EXECUTOR):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown local embedding executor: {executor}")
+        self.name = f"hashing-{dimension}"
+        self.dimension = dimension
+        self.workers = workers
+        self.executor_kind = executor
+        self.executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            pool = ProcessPoolExecutor if self.executor_kind == "process" else ThreadPoolExecutor
+            self.executor = pool(max_workers=self.workers)
+            logger.info(f"Started local embedding {self.executor_kind} pool with {self.workers} workers")
+        return self.executor
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, spreading batches of more than LOCAL_EMBEDDING_TASK_SIZE texts over the pool"""
+        if len(texts) <= LOCAL_EMBEDDING_TASK_SIZE or self.workers <= 1:
+            return await asyncio.to_thread(hash_embed, texts, self.dimension)
+        task_size = max(LOCAL_EMBEDDING_TASK_SIZE, math.ceil(len(texts) / self.workers))
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(executor, hash_embed, texts[start:start + task_size], self.dimension)
+            for start in range(0, len(texts), task_size)
+        ))
+        return np.vstack(parts)
+
+    async def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+_embedding_backend: Optional[EmbeddingBackend] = None
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Return the process-wide embedding backend selected by EMBEDDING_BACKEND, creating it on first use"""
+    global _embedding_backend
+    if _embedding_backend is None:
+        if config.EMBEDDING_BACKEND == "openai":
+            _embedding_backend = OpenAIEmbeddingBackend()
+        elif config.EMBEDDING_BACKEND == "local":
+            _embedding_backend = HashingEmbeddingBackend()
+        else:
+            raise ValueError(f"Unknown embedding backend: {config.EMBEDDING_BACKEND}")
+        logger.info(
+            f"Using {config.EMBEDDING_BACKEND} embedding backend {_embedding_backend.name} "
+            f"({_embedding_backend.dimension} dimensions)"
+        )
+    return _embedding_backend
+
+async def close_embedding_backend():
+    """Release the shared embedding backend's workers if it was created"""
+    global _embedding_backend
+    if _embedding_backend is not None:
+        await _embedding_backend.close()
+        _embedding_backend = None
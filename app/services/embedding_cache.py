@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from config.main import config
+from utils.quantization import VECTOR_DTYPES, decode_vector, encode_vectors
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 500
+
+class EmbeddingCache:
+    """
+    Persistent SQLite cache of embeddings keyed by (model, normalized text hash),
+    bounded to max_entries with least-recently-used eviction. Vectors are stored
+    as float32, float16 or int8 blobs; each row records its own encoding
+    """
+
+    def __init__(self, path: str = config.EMBEDDING_CACHE_PATH,
+                 max_entries: int = config.EMBEDDING_CACHE_MAX_ENTRIES,
+                 dtype: str = config.EMBEDDING_CACHE_DTYPE):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown embedding cache dtype: {dtype}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.dtype = dtype
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(embeddings)")}
+        if "dtype" not in columns:
+            self.conn.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+        logger.info(f"Initialized EmbeddingCache at {self.path} (max entries: {self.max_entries}, dtype: {dtype})")
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Hash text after collapsing whitespace, so formatting-only changes still hit"""
+        return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached float32 embedding for each text, or None where there is none"""
+        hashes = [self.hash_text(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self.lock:
+            unique_hashes = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique_hashes), SQLITE_BATCH_SIZE):
+                batch = unique_hashes[i:i + SQLITE_BATCH_SIZE]
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector, dtype FROM embeddings WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, vector, dtype in rows:
+                    found[text_hash] = decode_vector(vector, dtype)
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, text_hash) for text_hash in found]
+                )
+                self.conn.commit()
+            results = [found.get(text_hash) for text_hash in hashes]
+            hits = sum(1 for result in results if result is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: np.ndarray):
+        """Store a 2-D array of embeddings for texts, evicting the least recently used entries when full"""
+        now = time.time()
+        rows = [
+            (model, self.hash_text(text), blob, self.dtype, now)
+            for text, blob in zip(texts, encode_vectors(embeddings, self.dtype))
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, dtype, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """Delete the least recently used entries beyond max_entries"""
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Evicted {excess} embeddings from cache")
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counts and the hit rate since startup"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries
+        }
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache, creating it on first use"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
@@ -1,54 +1,128 @@
-from openai import OpenAI
+import asyncio
 import logging
+from services.embedding_backends import EmbeddingBackend, get_embedding_backend
+from services.embedding_cache import get_embedding_cache
 from config.main import config
-from typing import List
+from utils.tokens import count_tokens
+from typing import AsyncIterator, List, Optional, Tuple
 from datetime import datetime
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
 class EmbeddingService:
-    def __init__(self):
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
-        self.model = "text-embedding-3-small"
-        logger.info("Initialized EmbeddingService")
+    def __init__(self, backend: Optional[EmbeddingBackend] = None):
+        self.backend = backend or get_embedding_backend()
+        self.model = self.backend.name
+        self.cache = get_embedding_cache()
+        logger.info(f"Initialized EmbeddingService with {self.model}")
 
-    def _normalize_vector(self, vector: List[float]) -> List[float]:
-        """Normalize vector to unit length"""
-        array = np.array(vector)
-        norm = np.linalg.norm(array)
-        if norm == 0:
-            return vector
-        return (array / norm).tolist()
-
-    async def create_embedding(self, text: str) -> List[float]:
-        """Create normalized embedding for a single text"""
+    async def create_embedding(self, text: str) -> np.ndarray:
+        """Create normalized float32 embedding for a single text"""
         try:
             logger.info(f"Creating embedding for text length: {len(text)}")
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=text
-            )
-            embedding = response.data[0].embedding
-            normalized_embedding = self._normalize_vector(embedding)
+            cached = await asyncio.to_thread(self.cache.get_many, self.model, [text])
+            if cached[0] is not None:
+                logger.info("Using cached embedding")
+                return cached[0]
+            embeddings = await self.backend.embed([text])
+            await asyncio.to_thread(self.cache.put_many, self.model, [text], embeddings)
             logger.info("Successfully created normalized embedding")
-            return normalized_embedding
+            return embeddings[0]
         except Exception as e:
             logger.error(f"Error creating embedding: {str(e)}")
             raise
 
-    async def create_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Create normalized embeddings for multiple texts"""
-        try:
-            logger.info(f"Creating embeddings for {len(texts)} chunks")
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=texts
+    def _pack_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """
+        Group consecutive texts into (start, end) ranges that stay within the
+        per-request token and input limits
+        """
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            batch_full = (
+                i - start >= config.EMBEDDING_BATCH_MAX_INPUTS
+                or batch_tokens + tokens > config.EMBEDDING_BATCH_MAX_TOKENS
             )
-            embeddings = [data.embedding for data in response.data]
-            normalized_embeddings = [self._normalize_vector(emb) for emb in embeddings]
-            logger.info(f"Successfully created {len(normalized_embeddings)} normalized embeddings")
-            return normalized_embeddings
+            if batch_full and i > start:
+                batches.append((start, i))
+                start = i
+                batch_tokens = 0
+            batch_tokens += tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    async def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a single batch into a (len(texts), dimension) float32 matrix, serving
+        cached texts from the embedding cache and sending each distinct uncached
+        text to the backend once
+        """
+        cached = await asyncio.to_thread(self.cache.get_many, self.model, texts)
+        missing_texts = {}
+        for text, embedding in zip(texts, cached):
+            if embedding is None:
+                missing_texts.setdefault(self.cache.hash_text(text), text)
+
+        new_embeddings = None
+        if missing_texts:
+            new_embeddings = await self.backend.embed(list(missing_texts.values()))
+            await asyncio.to_thread(self.cache.put_many, self.model, list(missing_texts.values()), new_embeddings)
+            dimension = new_embeddings.shape[1]
+        else:
+            dimension = len(cached[0])
+
+        embeddings = np.empty((len(texts), dimension), dtype=np.float32)
+        rows = {text_hash: i for i, text_hash in enumerate(missing_texts)}
+        for i, (text, embedding) in enumerate(zip(texts, cached)):
+            if embedding is not None:
+                embeddings[i] = embedding
+            else:
+                embeddings[i] = new_embeddings[rows[self.cache.hash_text(text)]]
+        return embeddings
+
+    async def iter_embedding_batches(self, texts: List[str]) -> AsyncIterator[Tuple[int, np.ndarray]]:
+        """
+        Embed texts in token-budgeted batches, running up to
+        EMBEDDING_MAX_CONCURRENT_BATCHES batches at once
+        Args:
+            texts (List[str]): Texts to embed
+        Yields:
+            Tuple[int, np.ndarray]: Start offset of the batch in texts and its
+            normalized float32 embedding matrix, in completion order
+        """
+        batches = self._pack_batches(texts)
+        logger.info(f"Creating embeddings for {len(texts)} chunks in {len(batches)} batches")
+        semaphore = asyncio.Semaphore(config.EMBEDDING_MAX_CONCURRENT_BATCHES)
+
+        async def run_batch(start: int, end: int) -> Tuple[int, np.ndarray]:
+            async with semaphore:
+                return start, await self._embed_batch(texts[start:end])
+
+        tasks = [asyncio.create_task(run_batch(start, end)) for start, end in batches]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def create_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Create normalized embeddings for multiple texts as one (len(texts), dimension) float32 matrix"""
+        try:
+            embeddings = None
+            async for start, batch_embeddings in self.iter_embedding_batches(texts):
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+                embeddings[start:start + len(batch_embeddings)] = batch_embeddings
+            if embeddings is None:
+                embeddings = np.empty((0, self.backend.dimension), dtype=np.float32)
+            logger.info(f"Successfully created {len(embeddings)} normalized embeddings")
+            return embeddings
         except Exception as e:
             logger.error(f"Error creating embeddings: {str(e)}")
             raise
@@ -71,7 +145,7 @@ class EmbeddingService:
                     "timestamp": str(datetime.utcnow())
                 }
                 vector_id = f"{pdf_name}_chunk_{i}"
-                vectors.append((vector_id, embedding, metadata))
+                vectors.append((vector_id, embedding.tolist(), metadata))
             
             # Upsert to Pinecone
             index.upsert(vectors=vectors, namespace=namespace)
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from config.main import config
+from services.bm25_index import BM25Index, get_bm25_index
+from services.vector_store import VectorStore, VectorMatch, get_vector_store
+
+logger = logging.getLogger(__name__)
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    Fuse ranked ID lists by summing 1 / (k + rank) over the lists each ID appears in
+    Returns:
+        Dict[str, float]: Fused scores ordered by descending score
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, vector_id in enumerate(ranking, start=1):
+            scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (k + rank)
+    return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
+
+class HybridSearchService:
+    """
+    Retrieves chunks by fusing dense vector search with BM25 keyword search, so
+    exact matches on part numbers, clause IDs and acronyms are not missed
+    """
+
+    def __init__(self, vector_store: Optional[VectorStore] = None, bm25_index: Optional[BM25Index] = None):
+        self.vector_store = vector_store or get_vector_store()
+        self.bm25_index = bm25_index or get_bm25_index()
+
+    async def search(self, query: str, query_embedding: List[float], top_k: int,
+                     filter: Optional[Dict[str, Any]] = None, include_values: bool = False) -> List[VectorMatch]:
+        """
+        Return the top_k chunks by reciprocal rank fusion of both rankings. Each
+        match keeps its cosine similarity as its score; chunks found only by BM25
+        are fetched from the vector store and scored against the query embedding
+        Args:
+            query (str): The user's query text
+            query_embedding (List[float]): Normalized query embedding
+            top_k (int): Number of matches to return
+            filter (Optional[Dict[str, Any]]): Metadata conditions as in VectorStore.query; BM25 supports "pdf_name" only
+            include_values (bool): Also return each match's embedding
+        Returns:
+            List[VectorMatch]: Matches ordered by fused rank
+        """
+        matches = await self.search_many([query], np.asarray([query_embedding], dtype=np.float32), top_k,
+                                         filter=filter, include_values=include_values)
+        return matches[0]
+
+    async def search_many(self, queries: List[str], query_embeddings: np.ndarray, top_k: int,
+                          filter: Optional[Dict[str, Any]] = None,
+                          include_values: bool = False) -> List[List[VectorMatch]]:
+        """
+        Search for several queries at once: the dense queries go to the vector
+        store as one batch, BM25 runs for all of them in one thread, and the
+        chunks only BM25 found are fetched in one request however many queries
+        ranked them
+        Args:
+            queries (List[str]): Query texts
+            query_embeddings (np.ndarray): (len(queries), dimension) normalized query embeddings
+            top_k (int): Number of matches to return per query
+            filter (Optional[Dict[str, Any]]): Metadata conditions as in VectorStore.query; BM25 supports "pdf_name" only
+            include_values (bool): Also return each match's embedding
+        Returns:
+            List[List[VectorMatch]]: Matches for each query ordered by fused rank
+        """
+        if not config.HYBRID_SEARCH_ENABLED or set(filter or {}) - {"pdf_name"}:
+            return await self.vector_store.query_many(query_embeddings, top_k, filter=filter,
+                                                      include_values=include_values)
+
+        candidates = max(top_k, config.HYBRID_CANDIDATES)
+        pdf_name = (filter or {}).get("pdf_name")
+        dense, lexical = await asyncio.gather(
+            self.vector_store.query_many(query_embeddings, candidates, filter=filter, include_values=include_values),
+            asyncio.to_thread(lambda: [self.bm25_index.search(query, candidates, pdf_name) for query in queries])
+        )
+
+        rankings = []
+        missing = {}
+        for dense_matches, lexical_matches in zip(dense, lexical):
+            fused = reciprocal_rank_fusion(
+                [[match.id for match in dense_matches], [vector_id for vector_id, _ in lexical_matches]],
+                k=config.RRF_K
+            )
+            by_id = {match.id: match for match in dense_matches}
+            top_ids = list(fused)[:top_k]
+            missing.update((vector_id, None) for vector_id in top_ids if vector_id not in by_id)
+            rankings.append((top_ids, by_id))
+
+        fetched = {}
+        if missing:
+            fetched = {match.id: match for match in await self.vector_store.fetch(list(missing), query_embeddings[0])}
+        results = []
+        for (top_ids, by_id), query_embedding in zip(rankings, query_embeddings):
+            matches = []
+            for vector_id in top_ids:
+                if vector_id in by_id:
+                    matches.append(by_id[vector_id])
+                elif vector_id in fetched:
+                    # Fetched once for every query; score it against this one
+                    match = fetched[vector_id]
+                    matches.append(VectorMatch(
+                        id=vector_id,
+                        score=float(match.values @ query_embedding),
+                        metadata=dict(match.metadata),
+                        values=match.values
+                    ))
+            results.append(matches)
+        logger.info(
+            f"Hybrid search for {len(queries)} queries: {sum(map(len, dense))} dense, "
+            f"{sum(map(len, lexical))} lexical candidates, {len(missing)} lexical-only in top {top_k}"
+        )
+        return results
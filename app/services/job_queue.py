@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config.main import config
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_FIELDS = ("pages_extracted", "chunks_embedded", "vectors_upserted")
+# How often idle workers check for jobs whose retry delay has passed
+POLL_INTERVAL_SECONDS = 1.0
+
+class IngestionJobQueue:
+    """
+    Persistent SQLite-backed queue of PDF ingestion jobs processed by a bounded
+    pool of worker tasks. Jobs record their progress, failed jobs are retried
+    with exponential backoff, and jobs interrupted by a restart are requeued.
+    Jobs for the same PDF run one at a time, and a new upload supersedes the
+    jobs still queued for it. Database writes run in worker threads
+    """
+
+    def __init__(self, path: str = config.JOB_DB_PATH, workers: int = config.INGEST_WORKERS,
+                 max_attempts: int = config.INGEST_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.handler: Optional[Callable[[Dict, Callable[..., None]], Awaitable[None]]] = None
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                pdf_name TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                file_hash TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                pages_extracted INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                vectors_upserted INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "file_hash" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN file_hash TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, available_at)")
+        self.conn.commit()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        # Progress of running jobs, written to the database when they finish
+        self._progress: Dict[str, Dict[str, int]] = {}
+        logger.info(f"Initialized IngestionJobQueue at {self.path} with {workers} workers")
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", [*fields.values(), job_id])
+            self.conn.commit()
+
+    def _insert(self, job_id: str, file_path: Path, file_hash: Optional[str]) -> int:
+        """Insert a queued job and supersede the jobs still queued for the same PDF"""
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            superseded = self.conn.execute(
+                "UPDATE jobs SET status = 'superseded', error = ?, updated_at = ? "
+                "WHERE pdf_name = ? AND status = 'queued'",
+                (f"Superseded by job {job_id}", now, file_path.name)
+            ).rowcount
+            self.conn.execute(
+                "INSERT INTO jobs (id, pdf_name, file_path, file_hash, status, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, file_path.name, str(file_path), file_hash, time.time(), now, now)
+            )
+            self.conn.commit()
+        return superseded
+
+    async def enqueue(self, file_path: Path, file_hash: Optional[str] = None) -> Dict:
+        """
+        Add an ingestion job for a saved PDF and wake an idle worker. Jobs still
+        queued for the same PDF are marked superseded, since the file they
+        would read has been replaced
+        """
+        job_id = uuid.uuid4().hex
+        superseded = await asyncio.to_thread(self._insert, job_id, file_path, file_hash)
+        if superseded:
+            logger.info(f"Superseded {superseded} queued ingestion jobs for {file_path.name}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logger.info(f"Queued ingestion job {job_id} for {file_path.name}")
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return a job's status and progress, or None if it does not exist"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop("available_at")
+        job.update(self._progress.get(job_id, {}))
+        return job
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Return the number of jobs per status"""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _claim(self) -> Optional[Dict]:
+        """Mark the oldest available queued job whose PDF has no running job as running and return it"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                "AND pdf_name NOT IN (SELECT pdf_name FROM jobs WHERE status = 'running') "
+                "ORDER BY created_at LIMIT 1",
+                (time.time(),)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (datetime.utcnow().isoformat(), row["id"])
+            )
+            self.conn.commit()
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def _progress_callback(self, job_id: str) -> Callable[..., None]:
+        """Build a callback that adds to a job's in-memory progress counters"""
+        counters = self._progress[job_id]
+        def progress(**increments: int):
+            for name, count in increments.items():
+                if name in PROGRESS_FIELDS:
+                    counters[name] += count
+        return progress
+
+    async def _run_job(self, job: Dict):
+        # Progress restarts from zero on every attempt
+        progress = self._progress[job["id"]] = dict.fromkeys(PROGRESS_FIELDS, 0)
+        try:
+            await asyncio.to_thread(self._update, job["id"], error=None, **progress)
+            await self.handler(job, self._progress_callback(job["id"]))
+            await asyncio.to_thread(self._update, job["id"], status="completed", **progress)
+            logger.info(f"Completed ingestion job {job['id']} for {job['pdf_name']}")
+        except asyncio.CancelledError:
+            # Leave the job for restart recovery
+            raise
+        except Exception as e:
+            if job["attempts"] < self.max_attempts:
+                delay = 2 ** job["attempts"]
+                await asyncio.to_thread(
+                    self._update, job["id"], status="queued", error=str(e), available_at=time.time() + delay, **progress
+                )
+                logger.warning(f"Ingestion job {job['id']} failed ({str(e)}), retrying in {delay}s")
+            else:
+                await asyncio.to_thread(self._update, job["id"], status="failed", error=str(e), **progress)
+                logger.error(f"Ingestion job {job['id']} failed after {job['attempts']} attempts: {str(e)}")
+        finally:
+            self._progress.pop(job["id"], None)
+            # Jobs for the same PDF may be claimable now
+            self._wakeup.set()
+
+    async def _worker(self, worker_id: int):
+        # wait_for can swallow a cancellation that races with the wakeup, so stop() also sets _stopping
+        while not self._stopping:
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self._claim)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info(f"Worker {worker_id} picked up job {job['id']} (attempt {job['attempts']})")
+            await self._run_job(job)
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker pool has been started"""
+        return bool(self._tasks)
+
+    async def start(self):
+        """Requeue jobs interrupted by a restart and start the worker pool"""
+        if self.handler is None:
+            raise RuntimeError("IngestionJobQueue has no handler")
+        with self.lock:
+            recovered = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', available_at = ? WHERE status = 'running'",
+                (time.time(),)
+            ).rowcount
+            self.conn.commit()
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted ingestion jobs")
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; running jobs are requeued on the next start"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+_job_queue: Optional[IngestionJobQueue] = None
+
+def get_job_queue() -> IngestionJobQueue:
+    """Return the process-wide ingestion job queue, creating it on first use"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = IngestionJobQueue()
+    return _job_queue
@@ -0,0 +1,432 @@
+import asyncio
+import json
+import logging
+import math
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from config.main import config
+from services.vector_store import VectorStore, VectorMatch
+from utils.quantization import VECTOR_DTYPES, dequantize, quantize
+
+logger = logging.getLogger(__name__)
+
+INITIAL_CAPACITY = 1024
+# Rows scored per block when assigning vectors to IVF lists or scoring quantized rows
+ASSIGN_BLOCK_SIZE = 65536
+# Upper bound on the (rows x queries) score matrix of a batched query, about 64MB of float32
+QUERY_BLOCK_SCORES = 1 << 24
+FILE_SUFFIXES = {"float32": "f32", "float16": "f16", "int8": "i8"}
+
+class IVFIndex:
+    """
+    Inverted-file index: a spherical k-means coarse quantizer whose centroids
+    partition the stored vectors into lists, so a query only scores the vectors
+    in the nprobe lists closest to it
+    """
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = centroids
+
+    @classmethod
+    def train(cls, sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        """Train centroids on a float32 sample of the stored vectors"""
+        rng = np.random.default_rng(seed)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12)
+        return cls(centroids.astype(np.float32))
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Return the list ID of each vector"""
+        list_ids = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BLOCK_SIZE):
+            block = np.asarray(vectors[start:start + ASSIGN_BLOCK_SIZE], dtype=np.float32)
+            list_ids[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return list_ids
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Return the IDs of the nprobe lists closest to the query"""
+        scores = self.centroids @ query
+        nprobe = min(nprobe, len(scores))
+        return np.argpartition(-scores, nprobe - 1)[:nprobe]
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store. Embeddings live in a memory-mapped matrix, stored as
+    float32 or quantized to float16 or int8 (with a scale per row), and are
+    searched with vectorized cosine top-k, optionally narrowed by an IVF index
+    for large corpora; IDs and metadata are kept in SQLite next to the matrix
+    """
+
+    def __init__(self, directory: str = config.LOCAL_VECTOR_STORE_DIR,
+                 dimension: int = config.EMBEDDING_DIMENSION,
+                 embedding_model: str = config.EMBEDDING_MODEL,
+                 index_mode: str = config.LOCAL_INDEX_MODE,
+                 vector_dtype: str = config.LOCAL_VECTOR_DTYPE):
+        if vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype: {vector_dtype}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dimension = dimension
+        self.embedding_model = embedding_model
+        self.index_mode = index_mode
+        self.vector_dtype = vector_dtype
+        self.vectors_path = self.directory / f"vectors.{FILE_SUFFIXES[vector_dtype]}"
+        self.scales_path = self.directory / "scales.f32"
+        self.centroids_path = self.directory / "centroids.npy"
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.directory / "metadata.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS vectors (
+                row INTEGER PRIMARY KEY,
+                vector_id TEXT UNIQUE NOT NULL,
+                pdf_name TEXT,
+                list_id INTEGER NOT NULL,
+                metadata TEXT NOT NULL
+            );
+        """)
+        self._check_format()
+        self._load()
+        logger.info(
+            f"Initialized LocalVectorStore at {self.directory} with {len(self.id_to_row)} vectors "
+            f"(model: {self.embedding_model}, mode: {self.index_mode}, dtype: {self.vector_dtype})"
+        )
+
+    def _check_format(self):
+        """Refuse to open a store that holds embeddings of a different model, dimension or dtype"""
+        info = dict(self.conn.execute("SELECT key, value FROM info").fetchall())
+        if "dimension" not in info:
+            info = {"dimension": str(self.dimension), "dtype": self.vector_dtype, "embedding_model": self.embedding_model}
+        # Stores created before quantization support hold float32 vectors
+        info.setdefault("dtype", "float32")
+        # Stores created before embedding backends were pluggable hold OpenAI embeddings
+        info.setdefault("embedding_model", "text-embedding-3-small")
+        self.conn.executemany("INSERT OR IGNORE INTO info (key, value) VALUES (?, ?)", list(info.items()))
+        self.conn.commit()
+        if info["embedding_model"] != self.embedding_model:
+            raise ValueError(
+                f"Vector store at {self.directory} holds {info['embedding_model']} embeddings, "
+                f"not {self.embedding_model}"
+            )
+        if int(info["dimension"]) != self.dimension:
+            raise ValueError(
+                f"Vector store at {self.directory} holds {info['dimension']}-dimensional embeddings, "
+                f"not {self.dimension}"
+            )
+        if info["dtype"] != self.vector_dtype:
+            raise ValueError(
+                f"Vector store at {self.directory} holds {info['dtype']} embeddings, not {self.vector_dtype}"
+            )
+
+    def _load(self):
+        """Rebuild the in-memory row bookkeeping from SQLite and map the matrix"""
+        rows = self.conn.execute("SELECT row, vector_id, pdf_name, list_id FROM vectors").fetchall()
+        self.count = max((row[0] for row in rows), default=-1) + 1
+        self.capacity = 0
+        self.matrix = None
+        self.scales = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.pdf_names = np.empty(0, dtype=object)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self._ensure_capacity(max(self.count, INITIAL_CAPACITY))
+
+        self.id_to_row: Dict[str, int] = {}
+        for row, vector_id, pdf_name, list_id in rows:
+            self.id_to_row[vector_id] = row
+            self.alive[row] = True
+            self.pdf_names[row] = pdf_name
+            self.assignments[row] = list_id
+        self.free_rows = [int(row) for row in np.flatnonzero(~self.alive[:self.count])]
+
+        self.ivf = None
+        self.ivf_trained_size = 0
+        if self.centroids_path.exists():
+            self.ivf = IVFIndex(np.load(self.centroids_path))
+            self.ivf_trained_size = len(self.id_to_row)
+
+    def _ensure_capacity(self, capacity: int):
+        """Grow the memory-mapped matrix and row arrays to hold at least capacity rows"""
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(capacity, self.capacity * 2)
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        self.matrix = self._map(self.vectors_path, np.dtype(self.vector_dtype), (new_capacity, self.dimension))
+        if self.vector_dtype == "int8":
+            if self.scales is not None:
+                self.scales.flush()
+                del self.scales
+            self.scales = self._map(self.scales_path, np.dtype(np.float32), (new_capacity,))
+        self.alive = np.concatenate([self.alive, np.zeros(new_capacity - self.capacity, dtype=bool)])
+        self.pdf_names = np.concatenate([self.pdf_names, np.empty(new_capacity - self.capacity, dtype=object)])
+        self.assignments = np.concatenate([
+            self.assignments, np.full(new_capacity - self.capacity, -1, dtype=np.int32)
+        ])
+        self.capacity = new_capacity
+
+    @staticmethod
+    def _map(path: Path, dtype: np.dtype, shape: Tuple[int, ...]) -> np.memmap:
+        """Memory-map a file as an array of the given shape, growing the file if needed"""
+        size = int(np.prod(shape)) * dtype.itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _vectors(self, rows) -> np.ndarray:
+        """Return the given rows (an index array or slice) as a float32 matrix"""
+        return dequantize(self.matrix[rows], self.scales[rows] if self.scales is not None else None)
+
+    def _scores(self, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """
+        Cosine scores against the query of the given rows, or of every row when
+        rows is None. A (dimension, n) matrix of queries gives (rows, n) scores
+        """
+        if self.vector_dtype == "float32":
+            return self.matrix[:self.count] @ query if rows is None else self.matrix[rows] @ query
+        # Decode quantized rows block by block to bound the float32 working set
+        count = self.count if rows is None else len(rows)
+        scores = np.empty((count, *query.shape[1:]), dtype=np.float32)
+        for start in range(0, count, ASSIGN_BLOCK_SIZE):
+            end = min(start + ASSIGN_BLOCK_SIZE, count)
+            block = slice(start, end) if rows is None else rows[start:end]
+            scores[start:end] = self._vectors(block) @ query
+        return scores
+
+    def _upsert(self, vectors: List[Tuple[str, np.ndarray, Dict]]):
+        with self.lock:
+            embeddings = np.stack([np.asarray(embedding, dtype=np.float32) for _, embedding, _ in vectors])
+            if embeddings.ndim != 2 or embeddings.shape[1] != self.dimension:
+                raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got shape {embeddings.shape}")
+
+            rows = []
+            for vector_id, _, _ in vectors:
+                row = self.id_to_row.get(vector_id)
+                if row is None:
+                    if self.free_rows:
+                        row = self.free_rows.pop()
+                    else:
+                        row = self.count
+                        self.count += 1
+                    self.id_to_row[vector_id] = row
+                rows.append(row)
+            self._ensure_capacity(self.count)
+
+            rows = np.asarray(rows)
+            list_ids = self.ivf.assign(embeddings) if self.ivf is not None else np.full(len(rows), -1)
+            codes, scales = quantize(embeddings, self.vector_dtype)
+            self.matrix[rows] = codes
+            self.matrix.flush()
+            if self.scales is not None:
+                self.scales[rows] = scales
+                self.scales.flush()
+            self.alive[rows] = True
+            self.assignments[rows] = list_ids
+            for row, (_, _, metadata) in zip(rows, vectors):
+                self.pdf_names[row] = metadata.get("pdf_name")
+
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors (row, vector_id, pdf_name, list_id, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (int(row), vector_id, metadata.get("pdf_name"), int(list_id), json.dumps(metadata))
+                    for row, list_id, (vector_id, _, metadata) in zip(rows, list_ids, vectors)
+                ]
+            )
+            self.conn.commit()
+
+            size = len(self.id_to_row)
+            if (self.index_mode == "ivf" and size >= config.LOCAL_IVF_MIN_VECTORS
+                    and size >= 2 * self.ivf_trained_size):
+                self.train_ivf()
+
+    async def upsert(self, vectors: List[Tuple[str, np.ndarray, Dict]]):
+        """Insert or overwrite vectors, reusing rows freed by deletes"""
+        await asyncio.to_thread(self._upsert, vectors)
+
+    def _delete(self, vector_ids: List[str]):
+        with self.lock:
+            rows = [self.id_to_row.pop(vector_id) for vector_id in vector_ids if vector_id in self.id_to_row]
+            self.alive[rows] = False
+            self.pdf_names[rows] = None
+            self.assignments[rows] = -1
+            self.free_rows.extend(rows)
+            self.conn.executemany("DELETE FROM vectors WHERE vector_id = ?", [(vector_id,) for vector_id in vector_ids])
+            self.conn.commit()
+
+    async def delete_vectors(self, vector_ids: List[str]):
+        """Delete vectors by ID"""
+        try:
+            await asyncio.to_thread(self._delete, vector_ids)
+            logger.info(f"Deleted {len(vector_ids)} vectors")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting vectors: {str(e)}")
+            raise
+
+    def _update_metadata(self, updates: Dict[str, Dict[str, Any]]):
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE vectors SET metadata = json_patch(metadata, ?) WHERE vector_id = ?",
+                [(json.dumps(metadata), vector_id) for vector_id, metadata in updates.items()]
+            )
+            self.conn.commit()
+
+    async def update_metadata(self, updates: Dict[str, Dict[str, Any]]):
+        """Merge metadata fields into existing vectors"""
+        await asyncio.to_thread(self._update_metadata, updates)
+
+    def _list_ids(self, prefix: str) -> List[str]:
+        with self.lock:
+            return [vector_id for vector_id in self.id_to_row if vector_id.startswith(prefix)]
+
+    async def list_ids(self, prefix: str) -> List[str]:
+        """Return the IDs of stored vectors that start with prefix"""
+        return await asyncio.to_thread(self._list_ids, prefix)
+
+    def train_ivf(self):
+        """(Re)train the IVF index on the current vectors and reassign every row"""
+        with self.lock:
+            rows = np.flatnonzero(self.alive[:self.count])
+            if len(rows) == 0:
+                return
+            nlist = max(1, int(math.sqrt(len(rows))))
+            logger.info(f"Training IVF index with {nlist} lists on {len(rows)} vectors")
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(rows, size=min(len(rows), nlist * 64), replace=False))
+            self.ivf = IVFIndex.train(self._vectors(sample_rows), nlist)
+            list_ids = np.empty(len(rows), dtype=np.int32)
+            for start in range(0, len(rows), ASSIGN_BLOCK_SIZE):
+                block_rows = rows[start:start + ASSIGN_BLOCK_SIZE]
+                list_ids[start:start + len(block_rows)] = self.ivf.assign(self._vectors(block_rows))
+            self.assignments[rows] = list_ids
+            self.ivf_trained_size = len(rows)
+            np.save(self.centroids_path, self.ivf.centroids)
+            self.conn.executemany(
+                "UPDATE vectors SET list_id = ? WHERE row = ?",
+                [(int(list_id), int(row)) for row, list_id in zip(rows, list_ids)]
+            )
+            self.conn.commit()
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Mask of rows that are alive and pass the filter"""
+        mask = self.alive[:self.count].copy()
+        for key, value in (filter or {}).items():
+            if key == "pdf_name":
+                mask &= self.pdf_names[:self.count] == value
+                continue
+            # Other fields are matched in the stored metadata: a page against each
+            # chunk's page range, a section against its heading path or any one heading
+            if key == "page":
+                condition = "json_extract(metadata, '$.page') <= ? AND json_extract(metadata, '$.page_end') >= ?"
+                params = (value, value)
+            elif key == "section":
+                condition = ("json_extract(metadata, '$.section') = ? OR EXISTS "
+                             "(SELECT 1 FROM json_each(metadata, '$.headings') WHERE json_each.value = ?)")
+                params = (value, value)
+            else:
+                condition = "json_extract(metadata, ?) = ?"
+                params = (f"$.{key}", value)
+            rows = [row for row, in self.conn.execute(f"SELECT row FROM vectors WHERE {condition}", params)]
+            key_mask = np.zeros(self.count, dtype=bool)
+            key_mask[rows] = True
+            mask &= key_mask
+        return mask
+
+    @staticmethod
+    def _top(rows: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """The top_k (row, score) pairs by descending score"""
+        k = min(top_k, len(rows))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(score)) for row, score in zip(rows[top], scores[top])]
+
+    def _query_many(self, vectors: np.ndarray, top_k: int, filter: Optional[Dict[str, Any]],
+                    include_values: bool = False) -> List[List[VectorMatch]]:
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        with self.lock:
+            mask = self._filter_mask(filter)
+            rankings = []
+            if self.index_mode == "ivf" and self.ivf is not None:
+                # Each query scores only the rows in its own probed lists
+                for query in queries:
+                    probed = self.ivf.probe(query, config.LOCAL_IVF_NPROBE)
+                    rows = np.flatnonzero(mask & np.isin(self.assignments[:self.count], probed))
+                    rankings.append(self._top(rows, self._scores(rows, query), top_k))
+            else:
+                # Score blocks of queries against the candidate rows in one matrix product
+                every_row = mask.all()
+                rows = np.arange(self.count) if every_row else np.flatnonzero(mask)
+                block = max(1, QUERY_BLOCK_SCORES // max(1, len(rows)))
+                for start in range(0, len(queries), block):
+                    scores = self._scores(None if every_row else rows, queries[start:start + block].T)
+                    rankings.extend(self._top(rows, scores[:, i], top_k) for i in range(scores.shape[1]))
+
+            # Read the ID, metadata and values of each row once, however many queries matched it
+            top_rows = sorted({row for ranking in rankings for row, _ in ranking})
+            if not top_rows:
+                return [[] for _ in rankings]
+            stored = {
+                row: (vector_id, metadata)
+                for row, vector_id, metadata in self.conn.execute(
+                    f"SELECT row, vector_id, metadata FROM vectors WHERE row IN ({','.join('?' * len(top_rows))})",
+                    top_rows
+                ).fetchall()
+            }
+            values = dict(zip(top_rows, self._vectors(top_rows))) if include_values else {}
+
+        return [
+            [
+                VectorMatch(id=stored[row][0], score=score, metadata=json.loads(stored[row][1]), values=values.get(row))
+                for row, score in ranking
+            ]
+            for ranking in rankings
+        ]
+
+    async def query(self, vector: List[float], top_k: int,
+                    filter: Optional[Dict[str, Any]] = None, include_values: bool = False) -> List[VectorMatch]:
+        """Cosine top-k over the stored (normalized) embeddings, off the event loop"""
+        return (await asyncio.to_thread(self._query_many, [vector], top_k, filter, include_values))[0]
+
+    async def query_many(self, vectors: np.ndarray, top_k: int, filter: Optional[Dict[str, Any]] = None,
+                         include_values: bool = False) -> List[List[VectorMatch]]:
+        """Cosine top-k for a batch of queries, scored together in one pass over the stored embeddings"""
+        return await asyncio.to_thread(self._query_many, vectors, top_k, filter, include_values)
+
+    def _fetch(self, vector_ids: List[str], vector: List[float]) -> List[VectorMatch]:
+        with self.lock:
+            found = [vector_id for vector_id in vector_ids if vector_id in self.id_to_row]
+            if not found:
+                return []
+            rows = [self.id_to_row[vector_id] for vector_id in found]
+            values = self._vectors(rows)
+            scores = values @ np.asarray(vector, dtype=np.float32)
+            stored = dict(self.conn.execute(
+                f"SELECT vector_id, metadata FROM vectors WHERE vector_id IN ({','.join('?' * len(found))})",
+                found
+            ).fetchall())
+
+        return [
+            VectorMatch(id=vector_id, score=float(score), metadata=json.loads(stored[vector_id]), values=row_values)
+            for vector_id, score, row_values in zip(found, scores, values)
+        ]
+
+    async def fetch(self, vector_ids: List[str], vector: List[float]) -> List[VectorMatch]:
+        """Look up vectors by ID and score them against the query, off the event loop"""
+        return await asyncio.to_thread(self._fetch, vector_ids, vector)
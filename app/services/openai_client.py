@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, List, Optional, Union
+
+import httpx
+from config.main import config
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """
+    Token bucket that lets requests start at a steady rate per minute, with
+    bursts of up to a second's worth; waiting callers are served in order
+    """
+
+    def __init__(self, requests_per_minute: int):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class OpenAIClientService:
+    """
+    Shared async OpenAI client with a pooled HTTP connection, a bounded number of
+    in-flight requests, an optional request rate limit, request timeouts and
+    retries with exponential backoff
+    """
+
+    def __init__(self):
+        # Imported here so importing the API does not pay for loading the SDK
+        from openai import AsyncOpenAI
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=config.OPENAI_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(config.OPENAI_TIMEOUT)
+        )
+        # The SDK retries connection errors, 408/409/429 and 5xx responses
+        # with exponential backoff and jitter
+        self.client = AsyncOpenAI(
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL,
+            timeout=config.OPENAI_TIMEOUT,
+            max_retries=config.OPENAI_MAX_RETRIES,
+            http_client=self.http_client
+        )
+        self.semaphore = asyncio.Semaphore(config.OPENAI_MAX_CONCURRENCY)
+        self.rate_limiter = (
+            RateLimiter(config.OPENAI_MAX_REQUESTS_PER_MINUTE) if config.OPENAI_MAX_REQUESTS_PER_MINUTE > 0 else None
+        )
+        logger.info(
+            f"Initialized OpenAIClientService (max concurrency: {config.OPENAI_MAX_CONCURRENCY}, "
+            f"max connections: {config.OPENAI_MAX_CONNECTIONS}, "
+            f"max requests per minute: {config.OPENAI_MAX_REQUESTS_PER_MINUTE or 'unlimited'})"
+        )
+
+    async def _wait_for_rate_limit(self):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+
+    async def create_embeddings(self, model: str, input: Union[str, List[str]], **kwargs):
+        """Create embeddings without blocking the event loop"""
+        async with self.semaphore:
+            await self._wait_for_rate_limit()
+            return await self.client.embeddings.create(model=model, input=input, **kwargs)
+
+    async def create_chat_completion(self, **kwargs):
+        """Create a chat completion without blocking the event loop"""
+        async with self.semaphore:
+            await self._wait_for_rate_limit()
+            return await self.client.chat.completions.create(**kwargs)
+
+    async def stream_chat_completion(self, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream a chat completion, yielding content deltas as they arrive. Closing
+        the generator closes the upstream response, cancelling the generation
+        """
+        async with self.semaphore:
+            await self._wait_for_rate_limit()
+            stream = await self.client.chat.completions.create(stream=True, **kwargs)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+    async def close(self):
+        """Close the underlying connection pool"""
+        await self.client.close()
+
+_openai_client: Optional[OpenAIClientService] = None
+
+def get_openai_client() -> OpenAIClientService:
+    """Return the process-wide OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = OpenAIClientService()
+    return _openai_client
+
+async def close_openai_client():
+    """Close the shared OpenAI client if it was created"""
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
@@ -1,24 +1,254 @@
 from pathlib import Path
 import fitz  # PyMuPDF
-from typing import Dict, Optional
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 import logging
-import re
+from config.main import config
 from services.text_processor import TextProcessorService
 from services.background_processor import BackgroundProcessor
+from services.job_queue import IngestionJobQueue, get_job_queue
+from utils.hashing import sha256_file
+from utils.metrics import INGESTED, STAGE_SECONDS
+from utils.text_cleaning import clean_text
 import asyncio
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TEXT_FLAGS = (
+    fitz.TEXT_PRESERVE_LIGATURES |
+    fitz.TEXT_PRESERVE_WHITESPACE |
+    fitz.TEXT_PRESERVE_SPANS |
+    fitz.TEXT_DEHYPHENATE
+)
+
+# Headings are short blocks set noticeably larger than the body text, or in bold
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 200
+HEADING_MAX_LINES = 3
+# Heading paths longer than this are truncated in chunk metadata
+SECTION_MAX_CHARS = 256
+# Pages with fewer vector drawings than this cannot hold a ruled table
+TABLE_MIN_DRAWINGS = 4
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared extraction process pool, creating it on first use"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=config.PDF_EXTRACT_WORKERS)
+        logger.info(f"Started PDF extraction pool with {config.PDF_EXTRACT_WORKERS} workers")
+    return _process_pool
+
+def shutdown_process_pool():
+    """Stop the shared extraction process pool if it was started"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+def _count_pages(file_path: str) -> int:
+    """Return the number of pages in a PDF (runs in a worker process)"""
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) from a PDF (runs in a worker process)"""
+    with fitz.open(file_path) as doc:
+        return [doc[page_num].get_text(sort=True, flags=TEXT_FLAGS) for page_num in range(start, end)]
+
+def _timed_clean(text: str, timings: Dict[str, float]) -> str:
+    """clean_text, adding the time it takes to timings["clean"]"""
+    start = time.perf_counter()
+    text = clean_text(text)
+    timings["clean"] += time.perf_counter() - start
+    return text
+
+def _table_blocks(page: fitz.Page, timings: Dict[str, float]) -> List[Tuple[fitz.Rect, str]]:
+    """
+    Find ruled tables on a page and render each as one row per line with cells
+    separated by " | ". Table detection is slow, so it only runs on pages with
+    enough vector drawings to contain a ruled table, clipped to the area those
+    drawings cover, which makes it about 40x faster than on the whole page
+    """
+    if not config.PDF_DETECT_TABLES:
+        return []
+    drawings = page.get_cdrawings()
+    if len(drawings) < TABLE_MIN_DRAWINGS:
+        return []
+    # Rect union skips the zero-height rects of straight lines, so take the bounds directly
+    x0, y0, x1, y1 = zip(*(drawing["rect"] for drawing in drawings))
+    clip = fitz.Rect(min(x0) - 1, min(y0) - 1, max(x1) + 1, max(y1) + 1)
+    tables = []
+    for table in page.find_tables(clip=clip).tables:
+        rows = [
+            " | ".join(_timed_clean(cell or "", timings) for cell in row)
+            for row in table.extract()
+        ]
+        tables.append((fitz.Rect(table.bbox), "\n".join(row for row in rows if row.strip(" |"))))
+    return tables
+
+def _extract_page_layout(page: fitz.Page, timings: Dict[str, float]) -> List[Tuple[str, str, float]]:
+    """
+    Turn a page's text blocks into (kind, text, rank) tuples in reading order.
+    kind is "heading", "text" or "table"; rank is a heading's font size, with
+    bold breaking ties, and orders headings into a hierarchy. Time spent
+    cleaning text is added to timings["clean"]
+    """
+    blocks = [block for block in page.get_text("dict", flags=TEXT_FLAGS)["blocks"] if block["type"] == 0]
+    tables = _table_blocks(page, timings)
+
+    # The font size covering the most characters is the body text size
+    sizes = {}
+    for block in blocks:
+        for line in block["lines"]:
+            for span in line["spans"]:
+                size = round(span["size"], 1)
+                sizes[size] = sizes.get(size, 0) + len(span["text"])
+    body_size = max(sizes, key=sizes.get, default=0)
+
+    items = [(rect.y0, rect.x0, ("table", text, 0.0)) for rect, text in tables if text]
+    for block in blocks:
+        rect = fitz.Rect(block["bbox"])
+        # Text inside a table region is already part of the table
+        centre = fitz.Point((rect.x0 + rect.x1) / 2, (rect.y0 + rect.y1) / 2)
+        if any(table_rect.contains(centre) for table_rect, _ in tables):
+            continue
+        spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        if not spans:
+            continue
+        # Lines of a block are wrapped lines of one paragraph
+        text = _timed_clean(
+            " ".join("".join(span["text"] for span in line["spans"]) for line in block["lines"]), timings
+        )
+        if not text:
+            continue
+        size = max(span["size"] for span in spans)
+        bold = all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans)
+        is_heading = (
+            len(text) <= HEADING_MAX_CHARS and len(block["lines"]) <= HEADING_MAX_LINES
+            and (size >= body_size * HEADING_SIZE_RATIO or (bold and size >= body_size))
+        )
+        kind = "heading" if is_heading else "text"
+        items.append((rect.y0, rect.x0, (kind, text, size + (0.5 if bold else 0.0) if is_heading else 0.0)))
+
+    items.sort(key=lambda item: (round(item[0]), item[1]))
+    return [item for _, _, item in items]
+
+def _extract_layout_range(file_path: str, start: int, end: int) -> List[Tuple[List[Tuple[str, str, float]], float, float]]:
+    """
+    Extract the layout blocks of pages [start, end) from a PDF (runs in a worker
+    process). Each page comes with the seconds spent extracting and cleaning it,
+    since metrics recorded in a worker process would never be exported
+    """
+    pages = []
+    with fitz.open(file_path) as doc:
+        for page_num in range(start, end):
+            timings = {"clean": 0.0}
+            page_start = time.perf_counter()
+            blocks = _extract_page_layout(doc[page_num], timings)
+            pages.append((blocks, time.perf_counter() - page_start - timings["clean"], timings["clean"]))
+    return pages
+
+async def _iter_page_ranges(file_path: Path, executor: Executor, extract: Callable[[str, int, int], List],
+                            pages_per_task: int, max_pending: Optional[int]) -> AsyncIterator:
+    """Yield extract's per-page results in document order, extracting page ranges in parallel"""
+    loop = asyncio.get_running_loop()
+    page_count = await loop.run_in_executor(executor, _count_pages, str(file_path))
+    starts = iter(range(0, page_count, pages_per_task))
+    pending = deque()
+    try:
+        while True:
+            while max_pending is None or len(pending) < max_pending:
+                start = next(starts, None)
+                if start is None:
+                    break
+                end = min(start + pages_per_task, page_count)
+                pending.append(loop.run_in_executor(executor, extract, str(file_path), start, end))
+            if not pending:
+                break
+            for page in await pending.popleft():
+                yield page
+    finally:
+        for future in pending:
+            future.cancel()
+
+async def iter_page_texts(file_path: Path, executor: Executor,
+                          pages_per_task: int = config.PDF_PAGES_PER_TASK,
+                          max_pending: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Yield the text of every page of a PDF in document order. The document is
+    split into page ranges that the executor's workers extract in parallel,
+    with at most max_pending ranges in flight so memory stays bounded
+    Args:
+        file_path (Path): PDF to extract
+        executor (Executor): Executor that runs the extraction
+        pages_per_task (int): Number of pages handed to a worker at a time
+        max_pending (Optional[int]): Maximum ranges in flight, unbounded if None
+    Yields:
+        str: Page texts in document order
+    """
+    async for page_text in _iter_page_ranges(file_path, executor, _extract_page_range, pages_per_task, max_pending):
+        yield page_text
+
+async def extract_page_texts(file_path: Path, executor: Executor,
+                             pages_per_task: int = config.PDF_PAGES_PER_TASK) -> List[str]:
+    """
+    Extract the text of every page of a PDF, splitting the document into page
+    ranges that the executor's workers extract in parallel
+    Args:
+        file_path (Path): PDF to extract
+        executor (Executor): Executor that runs the extraction
+        pages_per_task (int): Number of pages handed to a worker at a time
+    Returns:
+        List[str]: Page texts in document order
+    """
+    return [page_text async for page_text in iter_page_texts(file_path, executor, pages_per_task)]
+
+async def iter_structured_blocks(file_path: Path, executor: Executor,
+                                 pages_per_task: int = config.PDF_PAGES_PER_TASK,
+                                 max_pending: Optional[int] = None) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Yield the cleaned paragraphs, headings and tables of a PDF in reading order,
+    each with its 1-based "page", the "section" it belongs to (the path of
+    enclosing headings joined with " > ") and those "headings" as a list. A
+    heading starts a new section and is yielded as that section's first block.
+    Pages are extracted in parallel as in iter_page_texts
+    Yields:
+        Tuple[str, Dict]: Block text and its {"page", "section", "headings", "kind"} metadata
+    """
+    headings: List[Tuple[float, str]] = []
+    page_number = 0
+    async for blocks, extract_seconds, clean_seconds in _iter_page_ranges(
+        file_path, executor, _extract_layout_range, pages_per_task, max_pending
+    ):
+        STAGE_SECONDS.observe(extract_seconds, "upload", "extract")
+        STAGE_SECONDS.observe(clean_seconds, "upload", "clean")
+        page_number += 1
+        for kind, text, rank in blocks:
+            if kind == "heading":
+                while headings and headings[-1][0] <= rank:
+                    headings.pop()
+                headings.append((rank, text))
+            names = [heading for _, heading in headings]
+            section = " > ".join(names)[:SECTION_MAX_CHARS]
+            yield text, {"page": page_number, "section": section, "headings": names, "kind": kind}
+
 class PDFExtractorService:
     """Service class for handling PDF text extraction"""
     
-    def __init__(self):
+    def __init__(self, text_processor: Optional[TextProcessorService] = None,
+                 background_processor: Optional[BackgroundProcessor] = None,
+                 job_queue: Optional[IngestionJobQueue] = None):
         self.upload_dir = Path("uploads")
         self.upload_dir.mkdir(exist_ok=True)
-        self.text_processor = TextProcessorService()
-        self.background_processor = BackgroundProcessor()
+        self.text_processor = text_processor or TextProcessorService()
+        self.background_processor = background_processor or BackgroundProcessor()
+        self.job_queue = job_queue or get_job_queue()
         logger.info(f"PDFExtractorService initialized with upload dir: {self.upload_dir}")
 
     async def extract_text_from_pdf(self, file_path: Path) -> str:
@@ -27,32 +257,12 @@ class PDFExtractorService:
         """
         try:
             logger.info(f"Attempting to extract text from: {file_path}")
-            doc = fitz.open(file_path)
-            text = ""
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                
-                # Get text with more detailed parameters
-                text += page.get_text(
-                    sort=True, 
-                    flags=fitz.TEXT_PRESERVE_LIGATURES | 
-                          fitz.TEXT_PRESERVE_WHITESPACE |
-                          fitz.TEXT_PRESERVE_SPANS |
-                          fitz.TEXT_DEHYPHENATE 
-                )
-                text += "\n\n"
-                
-                if page_num % 10 == 0:
-                    logger.info(f"Processed {page_num + 1} pages of {len(doc)}")
-            
-            doc.close()
-            logger.info(f"Successfully extracted text from: {file_path}")
+            page_texts = await extract_page_texts(file_path, get_process_pool())
+            text = "\n\n".join(page_texts)
+            logger.info(f"Successfully extracted {len(page_texts)} pages from: {file_path}")
             
             # Clean the extracted text
-            text = self.clean_text(text)
-            
-            return text.strip()
+            return self.clean_text(text)
             
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
@@ -60,64 +270,94 @@ class PDFExtractorService:
 
     def clean_text(self, text: str) -> str:
         """
-        Clean the extracted text by removing special characters, URLs, and normalizing whitespace
+        Clean the extracted text by removing special characters, URLs, and normalizing
+        whitespace while keeping paragraph breaks
         """
         try:
-            # Remove URLs
-            text = re.sub(r'http[s]?://\S+', '', text)
-            text = re.sub(r'www\.\S+', '', text)
-            
-            # Remove email addresses
-            text = re.sub(r'[\w\.-]+@[\w\.-]+\.\w+', '', text)
-            
-            # Replace special characters and symbols
-            text = re.sub(r'[^\w\s.,!?;:\'\"\(\)\[\]\{\}\-]', ' ', text)
-            
-            # Normalize whitespace
-            text = re.sub(r'\s+', ' ', text)  # Replace multiple spaces with single space
-            text = re.sub(r'\n\s*\n', '\n\n', text)  # Normalize paragraph breaks
-            
-            # Remove leading/trailing whitespace from each line
-            text = '\n'.join(line.strip() for line in text.split('\n'))
-            
-            return text.strip()
-            
+            return clean_text(text)
         except Exception as e:
             logger.error(f"Error cleaning text: {str(e)}")
             return text
 
-    async def process_pdf(self, file_path: Path) -> Dict[str, Optional[str]]:
+    async def ingest_pdf(self, file_path: Path, progress: Optional[Callable[..., None]] = None,
+                         file_hash: Optional[str] = None):
         """
-        Process a PDF file and extract its text content
+        Stream a PDF through layout extraction, cleaning, section-aware chunking,
+        embedding and storage page by page, so memory use does not grow with the
+        document size. Chunks carry the page and section they come from.
+        progress, if given, is called with counter increments such as pages_extracted=1
         """
         try:
-            logger.info(f"Processing PDF file: {file_path}")
-            
-            # Extract and clean text
-            extracted_text = await self.extract_text_from_pdf(file_path)
-            
-            # Create chunks
-            chunk_result = await self.text_processor.process_and_chunk_text(extracted_text)
-            
-            # Create simplified stats
+            progress = progress or (lambda **counts: None)
+            if file_hash is None:
+                file_hash = await asyncio.to_thread(sha256_file, file_path)
+            document = await asyncio.to_thread(
+                self.background_processor.manifest_service.get_document, file_path.name
+            )
+            if document and document["file_hash"] == file_hash:
+                logger.info(f"{file_path.name} is unchanged since version {document['version']}, skipping ingestion")
+                return
+
             stats = {
-                "total_chars": len(extracted_text),
-                "total_words": len(extracted_text.split()),
-                "total_paragraphs": len(extracted_text.split('\n\n'))
+                "total_pages": 0,
+                "total_chars": 0,
+                "total_words": 0,
+                "total_paragraphs": 0,
+                "total_headings": 0,
+                "total_tables": 0
             }
 
-            # Start background processing
-            asyncio.create_task(
-                self.background_processor.process_chunks(
-                    chunks=chunk_result["chunks"],
+            async def structured_blocks() -> AsyncIterator[Tuple[str, Dict]]:
+                async for text, block in iter_structured_blocks(
+                    file_path, get_process_pool(), max_pending=config.PDF_EXTRACT_WORKERS
+                ):
+                    if block["page"] > stats["total_pages"]:
+                        progress(pages_extracted=block["page"] - stats["total_pages"])
+                        INGESTED.inc("pages", amount=block["page"] - stats["total_pages"])
+                        stats["total_pages"] = block["page"]
+                    stats["total_chars"] += len(text)
+                    stats["total_words"] += len(text.split())
+                    stats["total_paragraphs"] += block["kind"] == "text"
+                    stats["total_headings"] += block["kind"] == "heading"
+                    stats["total_tables"] += block["kind"] == "table"
+                    yield text, block
+
+            with STAGE_SECONDS.time("upload", "total"):
+                await self.background_processor.process_chunk_stream(
+                    chunks=self.text_processor.iter_section_chunks(structured_blocks()),
                     pdf_name=file_path.name,
-                    metadata=stats
+                    file_hash=file_hash,
+                    progress=progress
                 )
-            )
+            logger.info(f"Ingested {file_path.name}: {stats}")
+            
+        except Exception as e:
+            logger.error(f"Error ingesting PDF {file_path.name}: {str(e)}")
+            raise
+
+    async def run_ingestion_job(self, job: Dict, progress: Callable[..., None]):
+        """Job queue handler that ingests the job's PDF"""
+        await self.ingest_pdf(Path(job["file_path"]), progress, file_hash=job["file_hash"])
+
+    async def process_pdf(self, file_path: Path, file_hash: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """
+        Validate a PDF file and queue a job that streams its content into the vector store
+        """
+        try:
+            logger.info(f"Processing PDF file: {file_path}")
+            
+            # Open the document once up front so unreadable files fail the request
+            loop = asyncio.get_running_loop()
+            page_count = await loop.run_in_executor(get_process_pool(), _count_pages, str(file_path))
+
+            # Queue background processing
+            job = await self.job_queue.enqueue(file_path, file_hash)
             
             return {
                 "filename": file_path.name,
                 "status": "success",
+                "pages": page_count,
+                "job_id": job["id"],
                 "message": "PDF processed, embeddings being generated in background"
             }
             
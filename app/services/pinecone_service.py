@@ -1,27 +1,69 @@
 from pinecone import Pinecone, ServerlessSpec
+import asyncio
+import json
+import time
+import numpy as np
 import logging
-from typing import List, Dict, Any
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
 from config.main import config
-import json
+from services.vector_store import VectorStore, VectorMatch
 
 logger = logging.getLogger(__name__)
 
-class PineconeService:
-    def __init__(self):
-        self.pc = Pinecone(api_key=config.PINECONE_API_KEY)
-        self.index_name = "knowledgebase"
-        self._init_index()
-        self.index = self.pc.Index(self.index_name)
+# Upper bound on the JSON size of one embedding value, e.g. "-0.012345678901234567, "
+JSON_BYTES_PER_VALUE = 23
+# JSON framing around each vector: keys, quotes and braces
+JSON_BYTES_PER_VECTOR = 64
+
+def pinecone_filter(filter: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Translate a VectorStore.query filter into Pinecone's metadata filter language"""
+    if not filter:
+        return None
+    conditions = []
+    for key, value in filter.items():
+        if key == "page":
+            conditions += [{"page": {"$lte": value}}, {"page_end": {"$gte": value}}]
+        elif key == "section":
+            conditions.append({"$or": [{"section": {"$eq": value}}, {"headings": {"$in": [value]}}]})
+        else:
+            conditions.append({key: {"$eq": value}})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+class PineconeService(VectorStore):
+    def __init__(self, index_name: str = "knowledgebase", dimension: int = config.EMBEDDING_DIMENSION):
+        self.pc = Pinecone(api_key=config.PINECONE_API_KEY, pool_threads=config.PINECONE_UPSERT_CONCURRENCY)
+        # Keep one pooled HTTP connection per concurrent request
+        self.pc.openapi_config.connection_pool_maxsize = max(
+            self.pc.openapi_config.connection_pool_maxsize, config.PINECONE_UPSERT_CONCURRENCY
+        )
+        self.index_name = index_name
+        self.dimension = dimension
+        self.index = self.pc.Index(host=config.PINECONE_INDEX_HOST or self._resolve_index_host())
+        # Blocking SDK calls run here rather than on the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.PINECONE_UPSERT_CONCURRENCY, thread_name_prefix="pinecone"
+        )
+        self.semaphore = asyncio.Semaphore(config.PINECONE_UPSERT_CONCURRENCY)
         logger.info(f"Initialized PineconeService with index: {self.index_name}")
 
+    async def _run(self, fn, *args, **kwargs):
+        """Run a blocking SDK call on the Pinecone thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+
+    async def close(self):
+        """Stop the Pinecone thread pool"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
     def _init_index(self):
-        """Initialize Pinecone index if it doesn't exist"""
+        """Create the Pinecone index if it doesn't exist and return its description"""
         try:
             if self.index_name not in self.pc.list_indexes().names():
                 self.pc.create_index(
                     name=self.index_name,
-                    dimension=1536,
+                    dimension=self.dimension,
                     metric="cosine",
                     spec=ServerlessSpec(
                         cloud='aws',
@@ -29,10 +71,33 @@ class PineconeService:
                     )
                 )
                 logger.info(f"Created new Pinecone index: {self.index_name}")
+            description = self.pc.describe_index(self.index_name)
+            if description.dimension != self.dimension:
+                raise ValueError(
+                    f"Pinecone index {self.index_name} holds {description.dimension}-dimensional embeddings, "
+                    f"not {self.dimension}"
+                )
+            return description
         except Exception as e:
             logger.error(f"Error initializing Pinecone index: {str(e)}")
             raise
 
+    def _resolve_index_host(self) -> str:
+        """
+        Return the data-plane host of the index. Hosts are cached with their index
+        dimension in PINECONE_INDEX_CACHE_PATH, so restarts make no control-plane calls
+        """
+        cache_path = Path(config.PINECONE_INDEX_CACHE_PATH)
+        cache = json.loads(cache_path.read_text()) if cache_path.exists() else {}
+        entry = cache.get(self.index_name)
+        if entry and entry["dimension"] == self.dimension:
+            return entry["host"]
+        description = self._init_index()
+        cache[self.index_name] = {"host": description.host, "dimension": description.dimension}
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(json.dumps(cache))
+        return description.host
+
     def _sanitize_metadata(self, metadata: Dict[str, Any]) -> Dict[str, Any]:
         """
         Sanitize metadata to ensure it's compatible with Pinecone
@@ -51,33 +116,134 @@ class PineconeService:
                 sanitized[key] = str(value)
         return sanitized
 
-    async def store_embeddings(self, embeddings: List[List[float]], chunks: List[str], 
-                             pdf_name: str, metadata: Dict):
-        """Store embeddings with metadata in Pinecone"""
+    @staticmethod
+    def _payload_size(vector: Tuple[str, List[float], Dict]) -> int:
+        """Estimate the bytes a vector adds to an upsert request body"""
+        vector_id, values, metadata = vector
+        return (
+            len(vector_id.encode("utf-8")) + JSON_BYTES_PER_VALUE * len(values)
+            + len(json.dumps(metadata)) + JSON_BYTES_PER_VECTOR
+        )
+
+    def _split_batches(self, vectors: List[Tuple[str, List[float], Dict]]) -> List[List[Tuple]]:
+        """Split vectors into requests within PINECONE_UPSERT_MAX_BYTES and PINECONE_UPSERT_MAX_VECTORS"""
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for vector in vectors:
+            size = self._payload_size(vector)
+            if batch and (batch_bytes + size > config.PINECONE_UPSERT_MAX_BYTES
+                          or len(batch) >= config.PINECONE_UPSERT_MAX_VECTORS):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(vector)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _upsert_batch(self, batch: List[Tuple[str, List[float], Dict]]) -> int:
+        """Upsert one request's worth of vectors, retrying with exponential backoff; returns the retries used"""
+        async with self.semaphore:
+            for attempt in range(config.PINECONE_UPSERT_RETRIES + 1):
+                try:
+                    # Vectors are already (str, list of floats, sanitized dict), so skip the
+                    # SDK's per-value type checking, which costs more than the request itself
+                    await self._run(self.index.upsert, vectors=batch, show_progress=False, _check_type=False)
+                    return attempt
+                except Exception as e:
+                    if attempt == config.PINECONE_UPSERT_RETRIES:
+                        raise
+                    delay = 0.5 * 2 ** attempt
+                    logger.warning(f"Upsert of {len(batch)} vectors failed ({str(e)}), retrying in {delay}s")
+                    await asyncio.sleep(delay)
+
+    async def upsert(self, vectors: List[Tuple[str, np.ndarray, Dict]]):
+        """
+        Upsert vectors with sanitized metadata, split into requests bounded by
+        payload size and vector count that are sent concurrently
+        """
+        # Pinecone's request format takes embeddings as lists of floats
+        vectors = [
+            (vector_id, np.asarray(embedding, dtype=np.float32).tolist(), self._sanitize_metadata(vector_metadata))
+            for vector_id, embedding, vector_metadata in vectors
+        ]
+        start = time.perf_counter()
+        batches = self._split_batches(vectors)
+        retries = await asyncio.gather(*(self._upsert_batch(batch) for batch in batches))
+        elapsed = time.perf_counter() - start
+        payload_mb = sum(self._payload_size(vector) for vector in vectors) / (1024 * 1024)
+        logger.info(
+            f"Upserted {len(vectors)} vectors in {len(batches)} requests ({sum(retries)} retries) "
+            f"in {elapsed:.2f}s: {len(vectors) / elapsed:.0f} vectors/s, {payload_mb / elapsed:.1f} MB/s"
+        )
+
+    async def delete_vectors(self, vector_ids: List[str]):
+        """Delete vectors by ID in batches of VECTOR_DELETE_BATCH_SIZE"""
         try:
-            vectors = []
-            for i, (embedding, chunk) in enumerate(zip(embeddings, chunks)):
-                # Create base metadata
-                vector_metadata = {
-                    "pdf_name": pdf_name,
-                    "chunk_index": i,
-                    "text": chunk,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "total_chars": metadata.get("total_chars", 0),
-                    "total_words": metadata.get("total_words", 0),
-                    "total_paragraphs": metadata.get("total_paragraphs", 0)
-                }
-                
-                # Sanitize metadata
-                vector_metadata = self._sanitize_metadata(vector_metadata)
-                
-                vector_id = f"{pdf_name}_chunk_{i}"
-                vectors.append((vector_id, embedding, vector_metadata))
-
-            self.index.upsert(vectors=vectors)
-            logger.info(f"Stored {len(vectors)} embeddings for PDF: {pdf_name}")
+            for i in range(0, len(vector_ids), config.VECTOR_DELETE_BATCH_SIZE):
+                await self._run(self.index.delete, ids=vector_ids[i:i + config.VECTOR_DELETE_BATCH_SIZE])
+            logger.info(f"Deleted {len(vector_ids)} vectors")
             return True
             
         except Exception as e:
-            logger.error(f"Error storing embeddings: {str(e)}")
-            raise 
\ No newline at end of file
+            logger.error(f"Error deleting vectors: {str(e)}")
+            raise
+
+    async def _update_one(self, vector_id: str, metadata: Dict[str, Any]):
+        async with self.semaphore:
+            await self._run(self.index.update, id=vector_id, set_metadata=self._sanitize_metadata(metadata))
+
+    async def update_metadata(self, updates: Dict[str, Dict[str, Any]]):
+        """Update metadata one vector per request, PINECONE_UPSERT_CONCURRENCY requests at a time"""
+        try:
+            await asyncio.gather(*(self._update_one(vector_id, metadata) for vector_id, metadata in updates.items()))
+            logger.info(f"Updated metadata of {len(updates)} vectors")
+        except Exception as e:
+            logger.error(f"Error updating vector metadata: {str(e)}")
+            raise
+
+    async def list_ids(self, prefix: str) -> List[str]:
+        """List vector IDs by prefix off the event loop, following pagination"""
+        return await self._run(lambda: [vector_id for page in self.index.list(prefix=prefix) for vector_id in page])
+
+    async def query(self, vector: List[float], top_k: int,
+                    filter: Optional[Dict[str, Any]] = None, include_values: bool = False) -> List[VectorMatch]:
+        """Query the index off the event loop"""
+        results = await self._run(
+            self.index.query,
+            vector=np.asarray(vector, dtype=np.float32).tolist(),
+            top_k=top_k,
+            include_metadata=True,
+            include_values=include_values,
+            filter=pinecone_filter(filter)
+        )
+        return [
+            VectorMatch(
+                id=match.id,
+                score=match.score,
+                metadata=match.metadata or {},
+                values=np.asarray(match.values, dtype=np.float32) if include_values else None
+            )
+            for match in results.matches
+        ]
+
+    async def fetch(self, vector_ids: List[str], vector: List[float]) -> List[VectorMatch]:
+        """Fetch vectors by ID off the event loop and score them against the query"""
+        if not vector_ids:
+            return []
+        results = await self._run(self.index.fetch, ids=vector_ids)
+        query = np.asarray(vector, dtype=np.float32)
+        matches = []
+        for vector_id in vector_ids:
+            if vector_id not in results.vectors:
+                continue
+            values = np.asarray(results.vectors[vector_id].values, dtype=np.float32)
+            matches.append(VectorMatch(
+                id=vector_id,
+                score=float(values @ query),
+                metadata=results.vectors[vector_id].metadata or {},
+                values=values
+            ))
+        return matches
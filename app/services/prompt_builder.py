@@ -0,0 +1,223 @@
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config.main import config
+from constants.prompts import CONTEXT_PROMPT, GENERAL_PROMPT, SUMMARY_PROMPT
+from services.openai_client import get_openai_client
+from utils.hashing import sha256_text
+from utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Longest chunk overlap searched for when merging neighbouring chunks
+MAX_CHUNK_OVERLAP_CHARS = 400
+# Messages the previous prompt construction sent verbatim, the baseline savings are measured against
+BASELINE_HISTORY_MESSAGES = 5
+SUMMARY_HEADER = "\n\nSummary of the earlier conversation:\n"
+
+@dataclass
+class PromptResult:
+    """Assembled completion messages and the token accounting behind them"""
+    messages: List[Dict[str, str]]
+    stats: Dict[str, int] = field(default_factory=dict)
+
+def message_tokens(message: Dict[str, str]) -> int:
+    """Tokens a chat message contributes to the prompt"""
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+def strip_overlap(previous: str, current: str, max_chars: int = MAX_CHUNK_OVERLAP_CHARS) -> str:
+    """Drop the longest prefix of current that previous ends with"""
+    for size in range(min(len(previous), len(current), max_chars), 0, -1):
+        if previous.endswith(current[:size]):
+            return current[size:]
+    return current
+
+class PromptBuilderService:
+    """
+    Assembles completion messages within a token budget. The system prompt and
+    latest user message are always kept; retrieved context gets up to
+    CONTEXT_TOKEN_BUDGET with the text neighbouring chunks share merged away;
+    conversation history keeps the newest turns verbatim within
+    HISTORY_TOKEN_BUDGET, and never more than the last BASELINE_HISTORY_MESSAGES
+    messages cost, with older turns compacted into a running summary that is
+    cached across requests
+    """
+
+    def __init__(self, prompt_budget: int = config.PROMPT_TOKEN_BUDGET,
+                 context_budget: int = config.CONTEXT_TOKEN_BUDGET,
+                 history_budget: int = config.HISTORY_TOKEN_BUDGET,
+                 summary_max_entries: int = config.SUMMARY_CACHE_MAX_ENTRIES):
+        self.prompt_budget = prompt_budget
+        self.context_budget = context_budget
+        self.history_budget = history_budget
+        self.summary_max_entries = summary_max_entries
+        self.summaries: "OrderedDict[str, str]" = OrderedDict()
+        self.template_tokens = count_tokens(CONTEXT_PROMPT.format(context="")) + MESSAGE_OVERHEAD_TOKENS
+        self.openai_client = get_openai_client()
+
+    def available_context_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Context budget left after the system prompt and the latest user message"""
+        reserved = self.template_tokens + message_tokens(messages[-1])
+        return max(0, min(self.context_budget, self.prompt_budget - reserved))
+
+    @staticmethod
+    def citation(chunk: Dict) -> str:
+        """Label a passage with its document and, when known, its pages and section"""
+        label = chunk.get("pdf_name", "")
+        if "page" in chunk:
+            page_end = chunk.get("page_end", chunk["page"])
+            label += f", p. {chunk['page']}" if page_end == chunk["page"] else f", pp. {chunk['page']}-{page_end}"
+        if chunk.get("section"):
+            label += f", {chunk['section']}"
+        return f"[{label}]"
+
+    @staticmethod
+    def merge_chunks(chunks: List[Dict]) -> List[str]:
+        """
+        Order chunks by document and position, dropping repeated chunks and the
+        overlap between consecutive chunks of the same document
+        Args:
+            chunks (List[Dict]): Chunks with "text", "pdf_name" and "chunk_index", and
+                optionally "page", "page_end" and "section"
+        Returns:
+            List[str]: Context passages, consecutive chunks joined into one, each
+            headed by its citation
+        """
+        passages = []
+        seen = set()
+        previous = None
+        for chunk in sorted(chunks, key=lambda c: (c.get("pdf_name", ""), c.get("chunk_index", 0))):
+            key = (chunk.get("pdf_name"), chunk.get("chunk_index"))
+            if key in seen:
+                continue
+            seen.add(key)
+            text = chunk.get("text", "")
+            if (previous is not None and previous.get("pdf_name") == chunk.get("pdf_name")
+                    and previous.get("chunk_index", 0) + 1 == chunk.get("chunk_index", 0)):
+                passage = passages[-1]
+                passage["text"] += strip_overlap(passage["text"], text)
+                if "page" in chunk:
+                    passage["page_end"] = chunk.get("page_end", chunk["page"])
+            else:
+                passages.append({**chunk, "text": text})
+            previous = chunk
+        return [f"{PromptBuilderService.citation(passage)}\n{passage['text']}" for passage in passages]
+
+    def _summary_key(self, messages: List[Dict[str, str]]) -> str:
+        return sha256_text(json.dumps([[m["role"], m["content"]] for m in messages]))
+
+    async def _summarize(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Summarize older turns, extending the cached summary of the longest
+        already-summarized prefix so each turn is only summarized once
+        """
+        key = self._summary_key(messages)
+        if key in self.summaries:
+            self.summaries.move_to_end(key)
+            return self.summaries[key]
+
+        previous_summary, start = "", 0
+        for end in range(len(messages) - 1, 0, -1):
+            cached = self.summaries.get(self._summary_key(messages[:end]))
+            if cached is not None:
+                previous_summary, start = cached, end
+                break
+
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages[start:])
+        try:
+            response = await self.openai_client.create_chat_completion(
+                model=config.SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Summary so far:\n{previous_summary}\n\nNew turns:\n{transcript}"}
+                ],
+                max_tokens=config.SUMMARY_MAX_TOKENS,
+                temperature=0
+            )
+            summary = response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"Error summarizing conversation history: {str(e)}")
+            return previous_summary or None
+
+        self.summaries[key] = summary
+        while len(self.summaries) > self.summary_max_entries:
+            self.summaries.popitem(last=False)
+        return summary
+
+    @staticmethod
+    def _fit_history(messages: List[Dict[str, str]], budget: int):
+        """
+        Return the newest messages, at most BASELINE_HISTORY_MESSAGES, that fit the
+        budget (at least one) and their token count
+        """
+        kept = []
+        used = 0
+        for message in reversed(messages):
+            tokens = message_tokens(message)
+            if kept and (used + tokens > budget or len(kept) == BASELINE_HISTORY_MESSAGES):
+                break
+            kept.insert(0, message)
+            used += tokens
+        return kept, used
+
+    async def build(self, messages: List[Dict[str, str]], chunks: List[Dict]) -> PromptResult:
+        """
+        Build the completion messages for a conversation and its retrieved chunks
+        Args:
+            messages (List[Dict[str, str]]): Conversation so far, ending with the latest user message
+            chunks (List[Dict]): Retrieved chunks with "text", "pdf_name" and "chunk_index"
+        Returns:
+            PromptResult: Messages plus prompt tokens and tokens saved against the
+            previous construction, which pasted every chunk and the last
+            BASELINE_HISTORY_MESSAGES messages verbatim
+        """
+        raw_context = "\n\n".join(chunk.get("text", "") for chunk in chunks)
+        if chunks:
+            passages = self.merge_chunks(chunks)
+            system_prompt = CONTEXT_PROMPT.format(context="\n\n".join(passages))
+            naive_system_tokens = count_tokens(CONTEXT_PROMPT.format(context=raw_context))
+        else:
+            system_prompt = GENERAL_PROMPT
+            naive_system_tokens = count_tokens(GENERAL_PROMPT)
+        system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+        # Keep the newest turns verbatim while they fit, always including the
+        # latest message; if older turns do not fit, reserve room for their summary
+        # when the latest message leaves enough, otherwise drop them as before.
+        # History, summary included, never costs more than the previous construction's
+        baseline_history_tokens = sum(message_tokens(m) for m in messages[-BASELINE_HISTORY_MESSAGES:])
+        history_budget = min(self.history_budget, baseline_history_tokens, self.prompt_budget - system_tokens)
+        summary_reserve = config.SUMMARY_MAX_TOKENS + count_tokens(SUMMARY_HEADER)
+        kept, used = self._fit_history(messages, history_budget)
+        summarize = len(kept) < len(messages) and message_tokens(messages[-1]) + summary_reserve <= history_budget
+        if summarize:
+            kept, used = self._fit_history(messages, history_budget - summary_reserve)
+        older = messages[:len(messages) - len(kept)]
+
+        summary_tokens = 0
+        if summarize:
+            summary = await self._summarize(older)
+            if summary:
+                summary_message = SUMMARY_HEADER + summary
+                summary_tokens = count_tokens(summary_message)
+                system_prompt += summary_message
+
+        result_messages = [{"role": "system", "content": system_prompt}] + [
+            {"role": m["role"], "content": m["content"]} for m in kept
+        ]
+        prompt_tokens = system_tokens + summary_tokens + used
+        naive_tokens = naive_system_tokens + MESSAGE_OVERHEAD_TOKENS + baseline_history_tokens
+        stats = {
+            "prompt_tokens": prompt_tokens,
+            "context_tokens_saved": naive_system_tokens + MESSAGE_OVERHEAD_TOKENS - system_tokens,
+            "history_tokens_saved": baseline_history_tokens - used - summary_tokens,
+            "tokens_saved": naive_tokens - prompt_tokens,
+            "turns_summarized": len(older) if summary_tokens else 0
+        }
+        logger.info(f"Assembled prompt: {stats}")
+        return PromptResult(messages=result_messages, stats=stats)
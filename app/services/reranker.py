@@ -0,0 +1,88 @@
+import logging
+import math
+from typing import List
+
+import numpy as np
+from config.main import config
+from services.bm25_index import tokenize
+from services.vector_store import VectorMatch
+from utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+class RerankerService:
+    """
+    CPU-only reranking of over-fetched retrieval candidates. Relevance blends the
+    cosine score with query term overlap and a prior for early chunks; chunks are
+    then picked by maximal marginal relevance (MMR) until the context token budget
+    is spent, so near-duplicate chunks do not crowd out other relevant ones
+    """
+
+    def __init__(self, mmr_lambda: float = config.RERANK_MMR_LAMBDA,
+                 overlap_weight: float = config.RERANK_OVERLAP_WEIGHT,
+                 position_weight: float = config.RERANK_POSITION_WEIGHT):
+        self.mmr_lambda = mmr_lambda
+        self.overlap_weight = overlap_weight
+        self.position_weight = position_weight
+
+    def _relevance(self, query: str, candidates: List[VectorMatch]) -> np.ndarray:
+        """Blend cosine score, term overlap and chunk position into one relevance score per candidate"""
+        cosine = np.array([match.score for match in candidates], dtype=np.float32)
+        query_terms = set(tokenize(query))
+        if query_terms:
+            overlap = np.array([
+                len(query_terms.intersection(tokenize(match.metadata.get("text", "")))) / len(query_terms)
+                for match in candidates
+            ], dtype=np.float32)
+        else:
+            overlap = np.zeros(len(candidates), dtype=np.float32)
+        # Opening chunks tend to hold titles, abstracts and definitions
+        position = np.array([
+            1.0 / (1.0 + math.log1p(int(match.metadata.get("chunk_index", 0))))
+            for match in candidates
+        ], dtype=np.float32)
+        return cosine + self.overlap_weight * overlap + self.position_weight * position
+
+    def rerank(self, query: str, candidates: List[VectorMatch], token_budget: int) -> List[VectorMatch]:
+        """
+        Select candidates by MMR until no remaining candidate fits the token budget
+        Args:
+            query (str): The user's query text
+            candidates (List[VectorMatch]): Retrieval results; embeddings in "values" enable the diversity term
+            token_budget (int): Maximum total tokens of the selected chunks' text
+        Returns:
+            List[VectorMatch]: Selected matches in selection order
+        """
+        if not candidates:
+            return []
+        relevance = self._relevance(query, candidates)
+        tokens = np.array([
+            match.metadata.get("token_count") or count_tokens(match.metadata.get("text", ""))
+            for match in candidates
+        ])
+
+        if all(match.values is not None for match in candidates):
+            embeddings = np.stack([np.asarray(match.values, dtype=np.float32) for match in candidates])
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+            similarity = embeddings @ embeddings.T
+        else:
+            similarity = np.zeros((len(candidates), len(candidates)), dtype=np.float32)
+
+        available = tokens <= token_budget
+        redundancy = np.zeros(len(candidates), dtype=np.float32)
+        selected = []
+        remaining = token_budget
+        while available.any():
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(available, mmr, -np.inf)))
+            selected.append(best)
+            remaining -= tokens[best]
+            redundancy = np.maximum(redundancy, similarity[best])
+            available &= tokens <= remaining
+            available[best] = False
+
+        logger.info(
+            f"Reranked {len(candidates)} candidates into {len(selected)} chunks "
+            f"using {token_budget - remaining}/{token_budget} tokens"
+        )
+        return [candidates[i] for i in selected]
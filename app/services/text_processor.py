@@ -1,6 +1,10 @@
-from typing import List
+from bisect import bisect_right
+from typing import AsyncIterator, Dict, List, Tuple
 import logging
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from config.main import config
+from utils.metrics import STAGE_SECONDS
+from utils.text_chunking import TextChunker
+from utils.tokens import CHARS_PER_TOKEN, count_tokens
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -9,17 +13,24 @@ logger = logging.getLogger(__name__)
 class TextProcessorService:
     """Service for processing and chunking text"""
     
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # Characters per chunk
-            chunk_overlap=100,  # Overlap between chunks
-            length_function=len,
-            separators=["\n\n", "\n", ".", "!", "?", " ", ""]  # Priority order for splitting
+    def __init__(self, chunk_size: int = config.CHUNK_SIZE, chunk_overlap: int = config.CHUNK_OVERLAP,
+                 chunk_unit: str = config.CHUNK_UNIT):
+        if chunk_unit not in ("characters", "tokens"):
+            raise ValueError(f"Unknown chunk unit: {chunk_unit}")
+        self.chunk_size = chunk_size  # Characters or tokens per chunk
+        self.chunk_overlap = chunk_overlap  # Overlap between chunks
+        self.chunk_unit = chunk_unit
+        self.chunker = TextChunker(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            length_function=count_tokens if chunk_unit == "tokens" else None
         )
+        # Characters buffered before an incremental split, enough for about two chunks
+        self.buffer_size = 2 * chunk_size * (CHARS_PER_TOKEN if chunk_unit == "tokens" else 1)
     
     async def create_chunks(self, text: str) -> List[str]:
         """
-        Split text into chunks using LangChain's text splitter
+        Split text into chunks of up to chunk_size characters or tokens
         Args:
             text (str): Preprocessed text to be chunked
         Returns:
@@ -29,14 +40,12 @@ class TextProcessorService:
             logger.info("Starting text chunking process")
             
             # Create chunks
-            chunks = self.text_splitter.split_text(text)
-            chunk_sizes = [len(chunk) for chunk in chunks]
-            avg_size = sum(chunk_sizes) / len(chunks)
-            size_variance = sum((size - avg_size) ** 2 for size in chunk_sizes) / len(chunks)
+            chunks = self.chunker.split_text(text)
             
             # Log chunking results
             logger.info(f"Successfully created {len(chunks)} chunks")
-            logger.info(f"Average chunk size: {sum(len(chunk) for chunk in chunks) / len(chunks):.2f} characters")
+            if chunks:
+                logger.info(f"Average chunk size: {sum(map(len, chunks)) / len(chunks):.2f} characters")
             
             return chunks
             
@@ -44,6 +53,93 @@ class TextProcessorService:
             logger.error(f"Error during text chunking: {str(e)}")
             raise
 
+    async def iter_chunks(self, texts: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Incrementally chunk a stream of texts such as PDF pages. Each split keeps its
+        last chunk back and re-splits it together with the next text, so chunk
+        overlap is preserved across text boundaries
+        Args:
+            texts (AsyncIterator[str]): Preprocessed texts in document order
+        Yields:
+            str: Text chunks in document order
+        """
+        buffer = ""
+        async for text in texts:
+            if not text:
+                continue
+            buffer = f"{buffer}\n\n{text}" if buffer else text
+            if len(buffer) < self.buffer_size:
+                continue
+            chunks = self.chunker.split_text(buffer)
+            for chunk in chunks[:-1]:
+                yield chunk
+            buffer = chunks[-1] if chunks else ""
+        if buffer:
+            for chunk in self.chunker.split_text(buffer):
+                yield chunk
+
+    def _locate_chunks(self, buffer: str, spans: List[Tuple[int, int]], pages: List[Tuple[int, int]],
+                       section: Dict) -> List[Tuple[int, str, Dict]]:
+        """
+        Slice each chunk's (start, end) span out of the buffer it was split from
+        and build its metadata from the (offset, page) starts of the buffer's
+        blocks and the section's metadata
+        """
+        offsets = [offset for offset, _ in pages]
+        return [(start, buffer[start:end], {
+            "page": pages[bisect_right(offsets, start) - 1][1],
+            "page_end": pages[bisect_right(offsets, end - 1) - 1][1],
+            **section
+        }) for start, end in spans]
+
+    def _split_section(self, buffer: str, pages: List[Tuple[int, int]], section: Dict) -> List[Tuple[int, str, Dict]]:
+        """Split a section buffer into located chunks, timing it as the "chunk" stage of ingestion"""
+        with STAGE_SECONDS.time("upload", "chunk"):
+            return self._locate_chunks(buffer, self.chunker.split_spans(buffer), pages, section)
+
+    async def iter_section_chunks(self, blocks: AsyncIterator[Tuple[str, Dict]]) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Chunk a stream of structured blocks such as PDF paragraphs, headings and
+        tables without letting a chunk cross a section boundary. Within a section,
+        blocks are chunked incrementally as in iter_chunks
+        Args:
+            blocks (AsyncIterator[Tuple[str, Dict]]): Block texts in document order with
+                their "page", "section" and optionally "headings"
+        Yields:
+            Tuple[str, Dict]: Chunk text and its "page", "page_end", "section" and "headings"
+        """
+        buffer = ""
+        pages: List[Tuple[int, int]] = []
+        section: Dict = {}
+        async for text, block in blocks:
+            if not text:
+                continue
+            if block["section"] != section.get("section") and buffer:
+                for _, chunk, metadata in self._split_section(buffer, pages, section):
+                    yield chunk, metadata
+                buffer = ""
+                pages = []
+            section = {key: block[key] for key in ("section", "headings") if key in block}
+            pages.append((len(buffer) + 2 if buffer else 0, block["page"]))
+            buffer = f"{buffer}\n\n{text}" if buffer else text
+            if len(buffer) < self.buffer_size:
+                continue
+            located = self._split_section(buffer, pages, section)
+            if not located:
+                buffer = ""
+                pages = []
+                continue
+            for _, chunk, metadata in located[:-1]:
+                yield chunk, metadata
+            # Keep the last chunk back, shifting the page starts to its offset
+            start = located[-1][0]
+            buffer = buffer[start:]
+            pages = [(offset - start, page) for offset, page in pages if offset > start]
+            pages.insert(0, (0, located[-1][2]["page"]))
+        if buffer:
+            for _, chunk, metadata in self._split_section(buffer, pages, section):
+                yield chunk, metadata
+
     async def process_and_chunk_text(self, text: str) -> dict:
         """
         Process text and return chunks with metadata
@@ -57,10 +153,11 @@ class TextProcessorService:
             chunks = await self.create_chunks(text)
             
             # Create metadata about chunks
+            chunk_sizes = [len(chunk) for chunk in chunks]
             metadata = {
                 "total_chunks": len(chunks),
-                "chunk_sizes": [len(chunk) for chunk in chunks],
-                "average_chunk_size": sum(len(chunk) for chunk in chunks) / len(chunks)
+                "chunk_sizes": chunk_sizes,
+                "average_chunk_size": sum(chunk_sizes) / len(chunks) if chunks else 0.0
             }
             
             return {
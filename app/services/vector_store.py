@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from config.main import config
+from services.embedding_backends import get_embedding_backend
+from utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class VectorMatch:
+    """A single query result from a vector store"""
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    values: Optional[np.ndarray] = None
+
+class VectorStore(ABC):
+    """Interface shared by the Pinecone and in-process vector store backends"""
+
+    def _prepare_vectors(self, embeddings: np.ndarray, chunks: List[str], pdf_name: str,
+                         metadata: Dict, chunk_indices: Optional[List[int]] = None,
+                         vector_ids: Optional[List[str]] = None,
+                         chunk_metadata: Optional[List[Dict]] = None) -> List[Tuple[str, np.ndarray, Dict]]:
+        """
+        Build (id, embedding row, metadata) tuples for a document's chunks. Chunk text
+        lives in the chunk store, so metadata only holds small filterable fields:
+        the shared metadata plus each chunk's own, such as its page and section
+        """
+        if chunk_indices is None:
+            chunk_indices = list(range(len(chunks)))
+        if vector_ids is None:
+            vector_ids = [f"{pdf_name}_chunk_{i}" for i in chunk_indices]
+        if chunk_metadata is None:
+            chunk_metadata = [{}] * len(chunks)
+
+        vectors = []
+        for vector_id, i, embedding, chunk, own_metadata in zip(
+            vector_ids, chunk_indices, embeddings, chunks, chunk_metadata
+        ):
+            vector_metadata = {
+                "pdf_name": pdf_name,
+                "chunk_index": i,
+                "token_count": count_tokens(chunk),
+                **metadata,
+                **own_metadata
+            }
+            vectors.append((vector_id, embedding, vector_metadata))
+        return vectors
+
+    async def store_embeddings(self, embeddings: np.ndarray, chunks: List[str],
+                               pdf_name: str, metadata: Dict, chunk_indices: Optional[List[int]] = None,
+                               vector_ids: Optional[List[str]] = None, chunk_metadata: Optional[List[Dict]] = None):
+        """Store a document's chunk embeddings, a (len(chunks), dimension) float32 matrix, with metadata"""
+        try:
+            vectors = self._prepare_vectors(
+                embeddings, chunks, pdf_name, metadata, chunk_indices, vector_ids, chunk_metadata
+            )
+            await self.upsert(vectors)
+            logger.info(f"Stored {len(vectors)} embeddings for PDF: {pdf_name}")
+            return True
+        except Exception as e:
+            logger.error(f"Error storing embeddings: {str(e)}")
+            raise
+
+    @abstractmethod
+    async def upsert(self, vectors: List[Tuple[str, np.ndarray, Dict]]):
+        """Insert or overwrite (id, float32 embedding, metadata) tuples"""
+
+    @abstractmethod
+    async def delete_vectors(self, vector_ids: List[str]):
+        """Delete vectors by ID"""
+
+    @abstractmethod
+    async def update_metadata(self, updates: Dict[str, Dict[str, Any]]):
+        """Set metadata fields of existing vectors, keyed by vector ID; fields not given are kept"""
+
+    @abstractmethod
+    async def list_ids(self, prefix: str) -> List[str]:
+        """Return the IDs of stored vectors that start with prefix"""
+
+    @abstractmethod
+    async def query(self, vector: List[float], top_k: int,
+                    filter: Optional[Dict[str, Any]] = None, include_values: bool = False) -> List[VectorMatch]:
+        """
+        Return the top_k most similar vectors by cosine similarity
+        Args:
+            vector (List[float]): Normalized query embedding
+            top_k (int): Number of matches to return
+            filter (Optional[Dict[str, Any]]): Metadata conditions, e.g. {"pdf_name": "a.pdf"}. Fields
+                match exactly, except "page", which matches chunks whose page to page_end range covers
+                it, and "section", which matches the full heading path or any one heading in it
+            include_values (bool): Also return each match's embedding
+        Returns:
+            List[VectorMatch]: Matches ordered by descending score
+        """
+
+    async def query_many(self, vectors: np.ndarray, top_k: int, filter: Optional[Dict[str, Any]] = None,
+                         include_values: bool = False) -> List[List[VectorMatch]]:
+        """
+        Run several queries with the same top_k and filter. Stores that can score
+        them together override this; by default they run concurrently
+        Args:
+            vectors (np.ndarray): (n, dimension) normalized query embeddings
+        Returns:
+            List[List[VectorMatch]]: Matches for each query, in the order of vectors
+        """
+        return list(await asyncio.gather(
+            *(self.query(vector, top_k, filter=filter, include_values=include_values) for vector in vectors)
+        ))
+
+    @abstractmethod
+    async def fetch(self, vector_ids: List[str], vector: List[float]) -> List[VectorMatch]:
+        """
+        Look up vectors by ID, with their embeddings, and score them against a query embedding
+        Args:
+            vector_ids (List[str]): IDs to fetch; unknown IDs are skipped
+            vector (List[float]): Normalized query embedding
+        Returns:
+            List[VectorMatch]: Matches in the order of vector_ids
+        """
+
+    async def close(self):
+        """Release any threads or connections held by the store"""
+
+def model_suffix(model: str) -> str:
+    """Name suffix that gives an embedding model its own stores; EMBEDDING_MODEL keeps the original names"""
+    if model == config.EMBEDDING_MODEL:
+        return ""
+    return "-" + re.sub(r"[^a-z0-9]+", "-", model.lower()).strip("-")
+
+def model_store_path(path: str, model: str) -> str:
+    """Path of a file-backed store for an embedding model, suffixed before the extension"""
+    path = Path(path)
+    return str(path.with_name(path.stem + model_suffix(model) + path.suffix))
+
+_vector_store: Optional[VectorStore] = None
+
+def get_vector_store() -> VectorStore:
+    """
+    Return the process-wide vector store selected by VECTOR_STORE, creating it on
+    first use. Each embedding model gets its own index; EMBEDDING_MODEL keeps the
+    original index name so existing data stays in place
+    """
+    global _vector_store
+    if _vector_store is None:
+        backend = get_embedding_backend()
+        suffix = model_suffix(backend.name)
+        if config.VECTOR_STORE == "local":
+            from services.local_vector_store import LocalVectorStore
+            _vector_store = LocalVectorStore(
+                directory=config.LOCAL_VECTOR_STORE_DIR + suffix,
+                dimension=backend.dimension,
+                embedding_model=backend.name
+            )
+        elif config.VECTOR_STORE == "pinecone":
+            from services.pinecone_service import PineconeService
+            _vector_store = PineconeService(index_name="knowledgebase" + suffix, dimension=backend.dimension)
+        else:
+            raise ValueError(f"Unknown vector store: {config.VECTOR_STORE}")
+    return _vector_store
+
+async def close_vector_store():
+    """Close the shared vector store if it was created"""
+    global _vector_store
+    if _vector_store is not None:
+        await _vector_store.close()
+        _vector_store = None
@@ -0,0 +1,19 @@
+"""
+Content hashing helpers
+"""
+import hashlib
+from pathlib import Path
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def sha256_file(file_path: Path) -> str:
+    """Hash a file in fixed-size blocks without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def sha256_text(text: str) -> str:
+    """Hash text encoded as UTF-8"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
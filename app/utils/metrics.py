@@ -0,0 +1,200 @@
+"""
+Minimal in-process Prometheus metrics: counters and histograms updated on the
+hot path, and callback metrics read from services when /metrics is scraped,
+rendered in the Prometheus text exposition format. Recording a value is a
+bisect and a few increments under an uncontended lock.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-minute ingestion
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """A monotonically increasing count per label set"""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in values]
+
+class Histogram:
+    """Observations counted into cumulative buckets per label set, with their sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # Per label set: a count per bucket plus one for +Inf, then the sum
+        self.values: Dict[Labels, List[float]] = {}
+        # Every observed value per label set, kept only when record_values() was called
+        self.recorded: Optional[Dict[Labels, List[float]]] = None
+
+    def record_values(self):
+        """Also keep every observed value, for benchmarks that need exact percentiles"""
+        with self.lock:
+            self.recorded = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0.0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+            if self.recorded is not None:
+                self.recorded.setdefault(labels, []).append(value)
+
+    def time(self, *labels: str) -> "_Timer":
+        """Observe the duration of a with block in seconds"""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            values = [(labels, list(counts)) for labels, counts in self.values.items()]
+        lines = []
+        for labels, counts in values:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels((*self.labelnames, 'le'), (*labels, le))} "
+                    f"{_format_value(cumulative)}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{label_text} {_format_value(cumulative)}")
+        return lines
+
+class _Timer:
+    """Context manager behind Histogram.time; a class is several times cheaper than a generator"""
+
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+class CallbackMetric:
+    """A gauge or counter whose values are read from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, type: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Labels, float]]):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in self.callback().items()]
+
+class MetricsRegistry:
+    """Metrics by name; registering a name again replaces the earlier metric"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+# Stages are "save", "extract", "clean", "chunk", "embed", "store" (chunk store),
+# "upsert" (vector store), "index" (BM25) and "total" for the "upload" pipeline,
+# "embed", "retrieve", "rerank", "prompt", "llm_first_token", "llm" and "total"
+# for "chat", and "embed", "retrieve", "rerank", "prompt", "llm" and "total"
+# (the whole batch) for "batch"
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "pdfchat_stage_seconds", "Time spent in each stage of upload ingestion and chat", ("pipeline", "stage")
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "pdfchat_http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "pdfchat_llm_tokens_total", "Tokens sent to (in) and generated by (out) the chat model", ("direction",)
+))
+INGESTED = REGISTRY.register(Counter(
+    "pdfchat_ingested_total", "Pages and chunks processed by ingestion", ("unit",)
+))
+
+class MetricsMiddleware:
+    """ASGI middleware that records the latency and status of every HTTP request by route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, scope["method"], getattr(route, "path", "other"), status
+            )
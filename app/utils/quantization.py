@@ -0,0 +1,55 @@
+"""
+Compact encodings of normalized float32 embeddings
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row of a float32 matrix to unit length in place, leaving zero rows as they are"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode the rows of a float32 matrix as dtype
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The codes and a float32 scale per row; int8
+        codes use a per-row scale of max(|row|) / 127, other dtypes a scale of 1
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.ones(len(matrix), dtype=np.float32)
+    if dtype == "float32":
+        return matrix, scales
+    if dtype == "float16":
+        return matrix.astype(np.float16), scales
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unknown vector dtype: {dtype}")
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Decode quantized rows back to a float32 matrix; int8 codes need their scales"""
+    matrix = np.asarray(codes, dtype=np.float32)
+    if codes.dtype == np.int8:
+        matrix *= np.asarray(scales, dtype=np.float32)[:, None]
+    return matrix
+
+def encode_vectors(matrix: np.ndarray, dtype: str) -> List[bytes]:
+    """Serialize each row as bytes; int8 rows are prefixed with their float32 scale"""
+    codes, scales = quantize(matrix, dtype)
+    if dtype == "int8":
+        return [scale.tobytes() + row.tobytes() for scale, row in zip(scales, codes)]
+    return [row.tobytes() for row in codes]
+
+def decode_vector(blob: bytes, dtype: str) -> np.ndarray:
+    """Deserialize a row written by encode_vectors into a float32 vector"""
+    if dtype == "int8":
+        scale = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(blob, dtype=dtype).astype(np.float32, copy=False)
@@ -0,0 +1,144 @@
+"""
+Recursive text chunking over offsets into the source text. Produces the same
+chunks as LangChain's RecursiveCharacterTextSplitter with its default settings
+(each separator kept at the start of the piece that follows it, chunks
+stripped of surrounding whitespace), but finds separators by scanning between
+offsets and only slices the text for the chunks it returns
+"""
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from operator import sub
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# Paragraphs, then lines, then sentences, then words, then characters
+DEFAULT_SEPARATORS = ("\n\n", "\n", ".", "!", "?", " ", "")
+
+Span = Tuple[int, int]
+
+class TextChunker:
+    """
+    Splits text into chunks of at most chunk_size units, characters by default
+    or whatever length_function counts (such as tokens), with consecutive chunks
+    sharing up to chunk_overlap units. Text is split at the first separator
+    that occurs in it, and pieces still too long are split again at the next
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, separators: Sequence[str] = DEFAULT_SEPARATORS,
+                 length_function: Optional[Callable[[str], int]] = None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Chunk overlap ({chunk_overlap}) is larger than chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+        self.length_function = length_function
+        # Pieces are joined with an empty string, which some length functions still count
+        self.join_length = 0 if length_function is None else length_function("")
+
+    @staticmethod
+    def _boundaries(text: str, start: int, end: int, separator: str) -> List[int]:
+        """
+        Offsets at which [start, end) splits into pieces before each occurrence
+        of separator, ending with end; an empty leading piece is dropped
+        """
+        if start >= end:
+            return [start]
+        if not separator:
+            return list(range(start, end + 1))
+        find = text.find
+        step = len(separator)
+        bounds = [start]
+        position = find(separator, start, end)
+        if position == start:
+            position = find(separator, start + step, end)
+        while position >= 0:
+            bounds.append(position)
+            position = find(separator, position + step, end)
+        bounds.append(end)
+        return bounds
+
+    @staticmethod
+    def _append_stripped(text: str, start: int, end: int, spans: List[Span]):
+        """Append [start, end) without its leading and trailing whitespace, unless nothing is left"""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            spans.append((start, end))
+
+    def _merge(self, text: str, bounds: List[int], positions: List[int], first: int, last: int,
+               spans: List[Span]):
+        """
+        Join pieces first to last (exclusive) into chunks of up to chunk_size,
+        starting each chunk with the previous one's trailing pieces that fit in
+        chunk_overlap. positions[i] is the size of the pieces before piece i,
+        each counted with a join, so the size of a window of pieces is a
+        difference of positions and every chunk boundary is found by bisection
+        """
+        chunk_size = self.chunk_size
+        join = self.join_length
+        lo = first
+        search_from = first + 2
+        while True:
+            # The first piece hi that does not fit after the pieces lo to hi - 1
+            end = bisect_right(positions, positions[lo] + chunk_size + join, search_from, last + 1)
+            if end > last:
+                break
+            hi = end - 1
+            self._append_stripped(text, bounds[lo], bounds[hi], spans)
+            # Drop pieces from the front until the rest fit in the overlap and leave room for piece hi
+            threshold = max(positions[hi] - join - self.chunk_overlap, positions[hi + 1] - join - chunk_size)
+            lo = min(hi, bisect_left(positions, threshold, lo, hi))
+            search_from = hi + 2
+        if last > lo:
+            self._append_stripped(text, bounds[lo], bounds[last], spans)
+
+    def _split(self, text: str, start: int, end: int, separators: Tuple[str, ...], spans: List[Span]):
+        separator = separators[-1]
+        remaining: Tuple[str, ...] = ()
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) >= 0:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+
+        bounds = self._boundaries(text, start, end, separator)
+        if self.length_function is None:
+            # Character offsets already are cumulative piece sizes
+            lengths = list(map(sub, bounds[1:], bounds))
+            positions = bounds
+        else:
+            lengths = [self.length_function(text[bounds[i]:bounds[i + 1]]) for i in range(len(bounds) - 1)]
+            positions = [0, *accumulate(length + self.join_length for length in lengths)]
+        if max(lengths, default=0) < self.chunk_size:
+            self._merge(text, bounds, positions, 0, len(lengths), spans)
+            return
+
+        # Runs of pieces shorter than a chunk are merged; longer pieces are split again
+        first = 0
+        for i, length in enumerate(lengths):
+            if length < self.chunk_size:
+                continue
+            if i > first:
+                self._merge(text, bounds, positions, first, i, spans)
+            if remaining:
+                self._split(text, bounds[i], bounds[i + 1], remaining, spans)
+            else:
+                # A single character at least chunk_size long is kept as it is
+                spans.append((bounds[i], bounds[i + 1]))
+            first = i + 1
+        if len(lengths) > first:
+            self._merge(text, bounds, positions, first, len(lengths), spans)
+
+    def split_spans(self, text: str) -> List[Span]:
+        """Return the (start, end) offsets of each chunk in text, in order"""
+        spans: List[Span] = []
+        self._split(text, 0, len(text), self.separators, spans)
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        """Return the chunks of text, in order"""
+        return [text[start:end] for start, end in self.split_spans(text)]
@@ -0,0 +1,44 @@
+"""
+Cleaning of extracted PDF text with precompiled patterns that keeps paragraph boundaries
+"""
+import re
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+# E-mail addresses are found from their "@" and expanded backwards, so text
+# without one is never scanned character by character for a local part
+EMAIL_DOMAIN_PATTERN = re.compile(r"@[\w.-]+\.\w+")
+EMAIL_LOCAL_PATTERN = re.compile(r"[\w.-]+$")
+MAX_EMAIL_LOCAL_PART = 64
+# Runs of symbols outside the allowed punctuation
+SYMBOL_PATTERN = re.compile(r"[^\w\s.,!?;:'\"()\[\]{}\-]+")
+# A line break followed by only whitespace up to the next line break
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+def remove_emails(text: str) -> str:
+    """Replace e-mail addresses with a space"""
+    pieces = []
+    last = 0
+    for match in EMAIL_DOMAIN_PATTERN.finditer(text):
+        local = EMAIL_LOCAL_PATTERN.search(text, max(last, match.start() - MAX_EMAIL_LOCAL_PART), match.start())
+        if local is None:
+            continue
+        pieces.append(text[last:local.start()])
+        pieces.append(" ")
+        last = match.end()
+    pieces.append(text[last:])
+    return "".join(pieces)
+
+def clean_text(text: str) -> str:
+    """
+    Remove URLs, e-mail addresses and special characters, collapse whitespace
+    within paragraphs to single spaces and separate paragraphs with exactly
+    one blank line, so "\\n\\n" still marks paragraph boundaries for chunking.
+    The URL and e-mail patterns only run when the text can contain a match
+    """
+    if "://" in text or "www." in text:
+        text = URL_PATTERN.sub(" ", text)
+    if "@" in text:
+        text = remove_emails(text)
+    text = SYMBOL_PATTERN.sub(" ", text)
+    paragraphs = (" ".join(paragraph.split()) for paragraph in PARAGRAPH_BREAK.split(text))
+    return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
@@ -0,0 +1,35 @@
+"""
+Local token counting helpers
+"""
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is listed in requirements.txt
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Rough characters per token for English text, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = DEFAULT_ENCODING):
+    """Load a tiktoken encoding once, returning None when it is unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"Could not load tokenizer {encoding_name}, falling back to estimates: {str(e)}")
+        return None
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """Count tokens in text, estimating ~4 characters per token without a tokenizer"""
+    encoding = get_encoding(encoding_name)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))